@@ -4,12 +4,17 @@ Admin tool to manage subscriptions
 Use this to manually upgrade users after they subscribe via Buy Me a Coffee
 """
 
+import os
 import sys
 from src.subscription.subscription_manager import SubscriptionManager
+from src.subscription.sqlite_store import SqliteSubscriptionManager
 
 
 def main():
-    manager = SubscriptionManager()
+    if os.getenv("SUBSCRIPTION_STORE", "json") == "sqlite":
+        manager = SqliteSubscriptionManager()
+    else:
+        manager = SubscriptionManager()
 
     print("=" * 60)
     print("  📰 News Bot - Subscription Admin Tool")
@@ -71,14 +76,13 @@ def main():
             print("Premium Users:")
             print(f"{'=' * 60}")
 
-            count = 0
-            for user_id, data in manager.subscriptions.items():
-                if data.get("tier") == "premium":
-                    count += 1
-                    print(f"User ID: {user_id}")
-                    print(f"  Expires: {data.get('expires_at', 'N/A')}")
-                    print(f"  Upgraded: {data.get('upgraded_at', 'N/A')}")
-                    print()
+            premium_users = manager.get_premium_users()
+            count = len(premium_users)
+            for user_id, data in premium_users.items():
+                print(f"User ID: {user_id}")
+                print(f"  Expires: {data.get('expires_at', 'N/A')}")
+                print(f"  Upgraded: {data.get('upgraded_at', 'N/A')}")
+                print()
 
             if count == 0:
                 print("No premium users found")
@@ -98,8 +102,7 @@ def main():
                     ).lower()
 
                     if confirm == "y":
-                        manager.subscriptions[user_id_str]["tier"] = "free"
-                        manager._save_subscriptions()
+                        manager.downgrade_to_free(user_id)
                         print(f"✅ Premium access removed for user {user_id}")
                     else:
                         print("❌ Cancelled")
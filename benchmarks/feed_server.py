@@ -0,0 +1,129 @@
+"""
+Feed Server - Local HTTP stand-in for the RSS feeds and article pages
+
+Serves the files under `fixtures/` over HTTP on 127.0.0.1, so benchmarks and
+load tests exercise the real network code paths (feedparser, requests) with
+no internet access. Every response can be delayed by `latency` seconds plus
+up to `jitter`, and a `failure_rate` fraction of requests answer 503, drawn
+from a seeded RNG so runs are repeatable.
+
+    with FeedServer(latency=0.05, failure_rate=0.1) as server:
+        url = server.url("feeds/bbc_general.xml")
+"""
+
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+CONTENT_TYPES = {
+    ".xml": "application/rss+xml; charset=utf-8",
+    ".html": "text/html; charset=utf-8",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+
+class FeedServer:
+    def __init__(
+        self,
+        fixtures_dir: Path = FIXTURES_DIR,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        port: int = 0,
+    ):
+        self.fixtures_dir = Path(fixtures_dir)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.port = port
+
+        self.requests = 0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._files: Dict[str, bytes] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _load(self):
+        # Everything is read once up front so disk I/O never shows up in timings
+        for path in self.fixtures_dir.rglob("*"):
+            if path.is_file():
+                self._files["/" + path.relative_to(self.fixtures_dir).as_posix()] = (
+                    path.read_bytes()
+                )
+        self._files.setdefault("/robots.txt", b"User-agent: *\nAllow: /\n")
+
+    def _roll(self) -> tuple:
+        """(delay, fail) for one request"""
+        with self._rng_lock:
+            self.requests += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        return delay, fail
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                delay, fail = server._roll()
+                if delay:
+                    time.sleep(delay)
+
+                body = server._files.get(self.path.split("?", 1)[0])
+                if fail or body is None:
+                    self.send_error(503 if fail else 404)
+                    return
+
+                self.send_response(200)
+                suffix = Path(self.path.split("?", 1)[0]).suffix
+                self.send_header(
+                    "Content-Type", CONTENT_TYPES.get(suffix, "text/plain")
+                )
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def start(self) -> "FeedServer":
+        self._load()
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="feed-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FeedServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
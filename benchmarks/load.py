@@ -0,0 +1,403 @@
+"""
+Load - Synthetic users driving the bot's handlers end to end
+
+Thousands of simulated users open /news, pick a source and a category, then
+/search, with random think time in between. Each action is a real `Update`
+built from Telegram's JSON and processed by the real `Application`, handlers
+and update processor; only the edges are replaced: Bot API calls go to
+`FakeTelegramAPI` (an in-process `BaseRequest`, with optional latency) and
+feeds come from the local `FeedServer`.
+
+    python -m benchmarks.load --users 2000 --ramp-up 30 --output load.json
+
+The report is one JSON document: throughput, per-action and overall
+p50/p95/p99 latency, Bot API call counts, "slow down" replies, handler
+errors and the event loop lag seen while the load ran. Updates answered with
+"slow down" are counted per action and kept out of the latency figures; a run
+where some action was throttled every time fails, since it measured nothing.
+The defaults stay within the bot's global fetch budget.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application  # noqa: E402
+from telegram.request import BaseRequest, RequestData  # noqa: E402
+
+from benchmarks.feed_server import FeedServer  # noqa: E402
+from benchmarks.run import git_commit, local_fetcher_class  # noqa: E402
+from benchmarks.stats import summarize  # noqa: E402
+from src.utils.rate_limiter import RateLimiter  # noqa: E402
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "News Bot",
+    "username": "load_news_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": True,
+}
+
+# Free-tier paths through the bot; every source here is a free one
+CATEGORIES = [("bbc", "general"), ("bbc", "world"), ("guardian", "general")]
+KEYWORDS = ["election", "climate", "market", "football", "ai", "storm"]
+
+
+class FakeTelegramAPI(BaseRequest):
+    """Answers Bot API calls in-process, like a Telegram that never fails
+
+    Every call waits `latency` seconds and succeeds. Calls are counted by
+    method, as are the texts the bot sends for rate limits and errors; rate
+    limit replies are also counted per chat or callback query they answer.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.rate_limited = 0
+        self.rate_limited_replies: Counter = Counter()
+        self.errors = 0
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, parameters: Dict) -> Dict:
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(parameters.get("chat_id", 0)), "type": "private"},
+            "from": BOT_USER,
+            "text": parameters.get("text", ""),
+        }
+
+    def _result(self, method: str, parameters: Dict):
+        text = str(parameters.get("text", ""))
+        if text.startswith("⏳"):
+            self.rate_limited += 1
+            key = parameters.get("callback_query_id") or parameters.get("chat_id")
+            self.rate_limited_replies[str(key)] += 1
+        elif text.startswith("❌ An error occurred"):
+            self.errors += 1
+
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "sendPhoto"):
+            return self._message(parameters)
+        if method == "editMessageText" and "chat_id" in parameters:
+            return self._message(parameters)
+        return True
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        self.calls[api_method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        parameters = request_data.parameters if request_data else {}
+        result = self._result(api_method, parameters)
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+
+class SimulatedUsers:
+    """Builds the updates a user would send and times how each is handled
+
+    Updates answered with "slow down" are counted in `rate_limited` instead
+    of `timings`, so the latencies are those of real handler work.
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        telegram_api: FakeTelegramAPI,
+        think_time: float,
+        rng: random.Random,
+    ):
+        self.application = application
+        self.telegram_api = telegram_api
+        self.think_time = think_time
+        self.rng = rng
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.failures: Counter = Counter()
+        self.rate_limited: Counter = Counter()
+        self._update_ids = itertools.count(1)
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> Dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"Load {user_id}"}
+
+    def _chat_message(self, user_id: int, text: str, sender: Dict) -> Dict:
+        return {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": sender,
+            "text": text,
+        }
+
+    def command(self, user_id: int, text: str) -> Update:
+        command = text.split()[0]
+        message = self._chat_message(user_id, text, self._user(user_id))
+        message["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(command)}
+        ]
+        return Update.de_json(
+            {"update_id": next(self._update_ids), "message": message},
+            self.application.bot,
+        )
+
+    def callback(self, user_id: int, data: str) -> Update:
+        return Update.de_json(
+            {
+                "update_id": next(self._update_ids),
+                "callback_query": {
+                    "id": str(next(self._ids)),
+                    "from": self._user(user_id),
+                    "chat_instance": str(user_id),
+                    "data": data,
+                    "message": self._chat_message(
+                        user_id, "Choose a news source:", BOT_USER
+                    ),
+                },
+            },
+            self.application.bot,
+        )
+
+    async def _act(self, action: str, update: Update):
+        if update.callback_query:
+            key = update.callback_query.id
+        else:
+            key = str(update.effective_chat.id)
+        limited = self.telegram_api.rate_limited_replies[key]
+        start = time.perf_counter()
+        try:
+            await self.application.update_processor.process_update(
+                update, self.application.process_update(update)
+            )
+        except Exception:
+            self.failures[action] += 1
+            return
+        elapsed = time.perf_counter() - start
+        if self.telegram_api.rate_limited_replies[key] > limited:
+            self.rate_limited[action] += 1
+        else:
+            self.timings[action].append(elapsed)
+
+    async def _think(self):
+        if self.think_time:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+
+    async def session(self, user_id: int, delay: float):
+        """One user's /news -> source -> category -> /search visit"""
+        await asyncio.sleep(delay)
+        source, category = self.rng.choice(CATEGORIES)
+
+        await self._act("news_command", self.command(user_id, "/news"))
+        await self._think()
+        await self._act("button_callback", self.callback(user_id, f"source_{source}"))
+        await self._think()
+        await self._act(
+            "button_callback",
+            self.callback(user_id, f"category_{source}_{category}"),
+        )
+        await self._think()
+        keyword = self.rng.choice(KEYWORDS)
+        await self._act("search_command", self.command(user_id, f"/search {keyword}"))
+
+    @property
+    def updates(self) -> int:
+        return (
+            sum(len(t) for t in self.timings.values())
+            + sum(self.failures.values())
+            + sum(self.rate_limited.values())
+        )
+
+    def throttled_actions(self) -> List[str]:
+        """Actions that were rate limited every single time"""
+        return sorted(
+            action
+            for action, count in self.rate_limited.items()
+            if count and not self.timings.get(action)
+        )
+
+
+async def run_load(args: argparse.Namespace, server: FeedServer) -> Dict:
+    # Imported late: the bot reads its environment and ./data when created
+    import telegram_bot
+    from src.utils.update_processor import PerChatUpdateProcessor
+
+    # The bot builds its own fetcher; have it build the local subclass, and
+    # leave the real NewsSourceFetcher (and every other user of it) untouched
+    fetcher_class = telegram_bot.NewsSourceFetcher
+    telegram_bot.NewsSourceFetcher = local_fetcher_class(server)
+    try:
+        bot = telegram_bot.TelegramNewsBot()
+    finally:
+        telegram_bot.NewsSourceFetcher = fetcher_class
+    if args.no_rate_limit:
+        bot.rate_limiter = RateLimiter(
+            tier_limits={"free": (1000.0, 1000.0), "premium": (1000.0, 1000.0)},
+            global_rate=1e6,
+            global_burst=1e6,
+        )
+    if args.send_rate:
+        bot.message_scheduler.global_bucket.rate = args.send_rate
+        bot.message_scheduler.global_bucket.capacity = args.send_rate
+
+    telegram_api = FakeTelegramAPI(latency=args.api_latency)
+    application = (
+        Application.builder()
+        .token("123456:LOAD-TEST")
+        .request(telegram_api)
+        .get_updates_request(FakeTelegramAPI())
+        .concurrent_updates(PerChatUpdateProcessor(args.max_concurrent))
+        .build()
+    )
+    telegram_bot.add_handlers(application, bot)
+
+    users = SimulatedUsers(
+        application, telegram_api, args.think_time, random.Random(args.seed)
+    )
+    await application.initialize()
+    await bot.post_init(application)
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                users.session(1000 + user, args.ramp_up * user / max(1, args.users - 1))
+                for user in range(args.users)
+            )
+        )
+        duration = time.perf_counter() - start
+        loop_lag = bot.loop_monitor.stats()
+    finally:
+        await bot.shutdown(application)
+        await application.shutdown()
+
+    everything = [t for timings in users.timings.values() for t in timings]
+    actions = sorted(set(users.timings) | set(users.rate_limited))
+    return {
+        "duration_s": round(duration, 3),
+        "updates": users.updates,
+        "updates_per_sec": round(users.updates / duration, 1) if duration else 0.0,
+        "results": [
+            {
+                **summarize("all", everything, sum(users.failures.values())),
+                "rate_limited": sum(users.rate_limited.values()),
+            }
+        ]
+        + [
+            {
+                **summarize(action, users.timings[action], users.failures[action]),
+                "rate_limited": users.rate_limited[action],
+            }
+            for action in actions
+        ],
+        "throttled_actions": users.throttled_actions(),
+        "telegram_api": {
+            "calls": dict(telegram_api.calls),
+            "rate_limited": telegram_api.rate_limited,
+            "errors": telegram_api.errors,
+        },
+        "event_loop_lag": loop_lag,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    # Every /search spends the global fetch budget (20/s); 200 users over a
+    # minute stay inside it, so the searches measured are real ones
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--ramp-up", type=float, default=60.0, help="seconds")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds")
+    parser.add_argument("--api-latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--feed-latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--feed-failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrent", type=int, default=64)
+    parser.add_argument("--send-rate", type=float, help="messages/second")
+    parser.add_argument("--no-rate-limit", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("HF_TOKEN", "load-test")
+    logging.basicConfig(level=logging.WARNING)
+
+    server = FeedServer(
+        latency=args.feed_latency, failure_rate=args.feed_failure_rate, seed=args.seed
+    )
+    cwd = os.getcwd()
+    # The bot keeps its stores under ./data and prints progress; run it in a
+    # scratch directory and keep stdout for the report
+    with tempfile.TemporaryDirectory() as tmp, server:
+        os.chdir(tmp)
+        try:
+            with open(os.devnull, "w") as devnull:
+                with contextlib.redirect_stdout(devnull):
+                    result = asyncio.run(run_load(args, server))
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **result,
+        "feed_server": {"requests": server.requests, "failures": server.failures},
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    if report["throttled_actions"]:
+        print(
+            "Every update was rate limited for: "
+            + ", ".join(report["throttled_actions"])
+            + " (spread users out with --ramp-up or use --no-rate-limit)",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
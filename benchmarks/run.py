@@ -0,0 +1,330 @@
+"""
+Benchmarks - Timings of the fetch, search, parse and subscription hot paths
+
+Everything runs offline: feeds and article pages come from the fixtures in
+`benchmarks/fixtures`, served by `FeedServer` on 127.0.0.1 with optional
+latency and failures, and subscription stores live in a temp directory.
+
+    python -m benchmarks.run --iterations 50 --latency 0.02 --output bench.json
+    python -m benchmarks.run --baseline bench.json  # exit 1 on regressions
+
+Results are one JSON document (per-benchmark min/mean/p50/p95/p99/max in
+milliseconds, plus the run's configuration and commit) so runs can be kept
+and compared over time. `--record` refreshes the feed fixtures from the live
+feeds when a network is available.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.feed_server import FIXTURES_DIR, FeedServer  # noqa: E402
+from benchmarks.stats import summarize  # noqa: E402
+from src.getter.newsGetter import NewsGetter, NewsGetterError  # noqa: E402
+from src.parser.newsParser import NewsParser  # noqa: E402
+from src.source.newsSourceFetcher import (  # noqa: E402
+    NewsSourceFetcher,
+    NewsSourceFetcherError,
+)
+from src.subscription.sqlite_store import SqliteSubscriptionManager  # noqa: E402
+from src.subscription.subscription_manager import SubscriptionManager  # noqa: E402
+
+# source -> category -> fixture; aljazeera's two categories share one URL,
+# as they do live
+FIXTURE_FEEDS = {
+    "bbc": {"general": "feeds/bbc_general.xml", "world": "feeds/bbc_world.xml"},
+    "guardian": {"general": "feeds/guardian_general.xml"},
+    "techcrunch": {"general": "feeds/techcrunch_general.xml"},
+    "aljazeera": {
+        "general": "feeds/aljazeera_all.xml",
+        "news": "feeds/aljazeera_all.xml",
+    },
+}
+
+
+def local_feeds(server: FeedServer) -> Dict[str, Dict[str, str]]:
+    """RSS_FEEDS-shaped mapping onto the stand-in server's fixtures"""
+    return {
+        source: {category: server.url(path) for category, path in categories.items()}
+        for source, categories in FIXTURE_FEEDS.items()
+    }
+
+
+def local_fetcher_class(server: FeedServer) -> type:
+    """NewsSourceFetcher subclass whose RSS_FEEDS point at the stand-in server"""
+    return type(
+        "LocalNewsSourceFetcher",
+        (NewsSourceFetcher,),
+        {"RSS_FEEDS": local_feeds(server)},
+    )
+
+
+def local_fetcher(server: FeedServer, **kwargs) -> NewsSourceFetcher:
+    """A NewsSourceFetcher whose RSS_FEEDS point at the stand-in server"""
+    return local_fetcher_class(server)(**kwargs)
+
+
+def measure(
+    name: str,
+    func: Callable,
+    iterations: int,
+    setup: Optional[Callable] = None,
+    errors: tuple = (Exception,),
+    warmup: int = 1,
+) -> Dict:
+    """Time `func(setup())` per iteration; only `func` is timed"""
+    timings, failures = [], 0
+    for i in range(warmup + iterations):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        try:
+            func(argument) if setup else func()
+        except errors:
+            if i >= warmup:
+                failures += 1
+            continue
+        if i >= warmup:
+            timings.append(time.perf_counter() - start)
+    return summarize(name, timings, failures)
+
+
+def bench_fetcher(server: FeedServer, iterations: int) -> List[Dict]:
+    results = [
+        measure(
+            "fetch_news_articles.cold",
+            lambda fetcher: fetcher.fetch_news_articles("bbc", "general"),
+            iterations,
+            setup=lambda: local_fetcher(server),
+            errors=(NewsSourceFetcherError,),
+        ),
+        measure(
+            "search_across_sources.cold",
+            lambda fetcher: fetcher.search_across_sources(
+                "election", sources=list(FIXTURE_FEEDS)
+            ),
+            iterations,
+            setup=lambda: local_fetcher(server),
+        ),
+    ]
+
+    # Reads between scheduled polls are served from the fetcher's cache
+    cached = local_fetcher(server, min_poll_interval=3600)
+    results.append(
+        measure(
+            "fetch_news_articles.cached",
+            lambda: cached.fetch_news_articles("bbc", "general"),
+            iterations * 10,
+            errors=(NewsSourceFetcherError,),
+        )
+    )
+    return results
+
+
+def bench_parser(server: FeedServer, iterations: int) -> List[Dict]:
+    parser = NewsParser()
+    results = []
+    for name in ("short", "long"):
+        html = (FIXTURES_DIR / "articles" / f"{name}.html").read_text()
+        results.append(
+            measure(
+                f"parse_article.{name}",
+                lambda html=html: parser.parse_article(html),
+                iterations * 10,
+            )
+        )
+
+    url = server.url("articles/long.html")
+    results.append(
+        measure(
+            "fetch_html+parse_article.long",
+            lambda: parser.parse_article(NewsGetter(url=url).fetch_html()),
+            iterations,
+            errors=(NewsGetterError,),
+        )
+    )
+    return results
+
+
+def bench_subscriptions(users: int, iterations: int, dirty: int = 100) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            "json": SubscriptionManager(f"{tmp}/subscriptions.json"),
+            "sqlite": SqliteSubscriptionManager(
+                f"{tmp}/subscriptions.db", import_from=None
+            ),
+        }
+        for kind, manager in stores.items():
+            for user_id in range(users):
+                manager.get_user_context(user_id)
+            manager.flush()
+
+            reads = iter(range(10**9))
+            results.append(
+                measure(
+                    f"subscriptions.{kind}.get_user_context",
+                    lambda: manager.get_user_context(next(reads) % users),
+                    iterations * 10,
+                )
+            )
+            writes = iter(range(10**9))
+            results.append(
+                measure(
+                    f"subscriptions.{kind}.reserve_usage",
+                    lambda: manager.reserve_usage(next(writes) % users, 1),
+                    iterations * 10,
+                )
+            )
+            upgrades = iter(range(10**9))
+            results.append(
+                measure(
+                    f"subscriptions.{kind}.upgrade_to_premium",
+                    lambda: manager.upgrade_to_premium(next(upgrades) % users),
+                    iterations,
+                )
+            )
+            # A flush only writes dirty users, so dirty some before each one;
+            # the SQLite store commits every write and has nothing to flush
+            if kind == "json":
+                bumps = iter(range(10**9))
+                results.append(
+                    measure(
+                        f"subscriptions.{kind}.flush.{dirty}_dirty",
+                        lambda _: manager.flush(),
+                        iterations,
+                        setup=lambda: [
+                            manager.increment_usage(next(bumps) % users)
+                            for _ in range(dirty)
+                        ],
+                    )
+                )
+            manager.close()
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict], baseline: Dict, tolerance: float) -> List[Dict]:
+    """Benchmarks whose p50 is more than `tolerance` slower than the baseline"""
+    previous = {result["name"]: result for result in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if not before or not before["p50_ms"]:
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1
+        result["p50_change"] = round(change, 3)
+        if change > tolerance:
+            regressions.append(
+                {"name": result["name"], "before": before["p50_ms"], "change": change}
+            )
+    return regressions
+
+
+def record_fixtures():
+    """Overwrite the feed fixtures with the live feeds they stand in for"""
+    import requests
+
+    for source, categories in FIXTURE_FEEDS.items():
+        for category, path in categories.items():
+            url = NewsSourceFetcher.RSS_FEEDS[source][category]
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            (FIXTURES_DIR / path).write_bytes(response.content)
+            print(f"Recorded {url} -> {path}", file=sys.stderr)
+
+
+BENCHMARKS = ("fetcher", "parser", "subscriptions")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON output to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--record", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixtures()
+        return 0
+
+    server = FeedServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    results = []
+    # The code under test prints progress; keep stdout for the report
+    with server, open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            if "fetcher" in args.only:
+                results += bench_fetcher(server, args.iterations)
+            if "parser" in args.only:
+                results += bench_parser(server, args.iterations)
+            if "subscriptions" in args.only:
+                results += bench_subscriptions(args.users, args.iterations)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "iterations": args.iterations,
+            "users": args.users,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "failure_rate": args.failure_rate,
+            "seed": args.seed,
+        },
+        "server": {"requests": server.requests, "failures": server.failures},
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+"""
+Stats - Latency summaries shared by the benchmark and load test reports
+"""
+
+import math
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(name: str, timings: List[float], errors: int = 0) -> Dict:
+    """Millisecond latency summary of successful calls, timed in seconds"""
+    timings = sorted(timings)
+    total = sum(timings)
+    return {
+        "name": name,
+        "iterations": len(timings) + errors,
+        "errors": errors,
+        "min_ms": round(timings[0] * 1000, 3) if timings else 0.0,
+        "mean_ms": round(total / len(timings) * 1000, 3) if timings else 0.0,
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3) if timings else 0.0,
+        "ops_per_sec": round(len(timings) / total, 1) if total else 0.0,
+    }
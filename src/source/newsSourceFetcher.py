@@ -3,8 +3,14 @@ Fetches news articles using RSS feeds - much more reliable than web scraping
 Updated with working RSS feeds as of 2024/2025
 """
 
+import calendar
+import hashlib
+import re
+import threading
+import time
 import feedparser
-from typing import List, Dict, Optional
+from dataclasses import dataclass, field
+from typing import Callable, List, Dict, Optional, Tuple
 from datetime import datetime
 
 
@@ -14,6 +20,98 @@ class NewsSourceFetcherError(Exception):
     pass
 
 
+@dataclass
+class FeedDelta:
+    """What changed in one feed since it was last parsed
+
+    `new` and `changed` hold full article dicts, `removed` the IDs of articles
+    that dropped out of the feed. `initial` is set on the first parse of a
+    feed, when every article counts as new.
+    """
+
+    source: str
+    category: str
+    new: List[Dict] = field(default_factory=list)
+    changed: List[Dict] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    initial: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.new or self.changed or self.removed)
+
+
+class FeedSchedule:
+    """Adaptive poll interval of one feed URL
+
+    Keeps an exponentially weighted moving average (EWMA) of the time
+    between new items and polls about once per expected item, within
+    [min_interval, max_interval]. A feed that stays quiet for longer than
+    its average gap is polled less and less often, and the feed's own `ttl`
+    and the server's Cache-Control max-age are never undercut.
+    """
+
+    def __init__(
+        self, min_interval: float = 120.0, max_interval: float = 3600.0, alpha=0.3
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.alpha = alpha
+
+        self.mean_gap: Optional[float] = None
+        self.interval = min_interval
+        self.last_poll: Optional[float] = None
+        self.last_new: Optional[float] = None
+        self.next_poll = 0.0
+        # Validators for conditional requests (HTTP 304 when unchanged)
+        self.etag: Optional[str] = None
+        self.modified: Optional[str] = None
+
+    def is_due(self, now: float) -> bool:
+        return now >= self.next_poll
+
+    def observe(
+        self,
+        now: float,
+        new_items: int,
+        published: List[float] = (),
+        ttl: float = 0.0,
+        max_age: float = 0.0,
+    ) -> float:
+        """Record a successful poll and schedule the next one
+
+        On the first poll every item is new, so the gap is estimated from
+        the entries' publish times instead. Returns the new interval.
+        """
+        if self.last_poll is None:
+            stamps = sorted(ts for ts in published if 0 < ts <= now)
+            if len(stamps) >= 2:
+                self.mean_gap = (stamps[-1] - stamps[0]) / (len(stamps) - 1)
+                self.last_new = stamps[-1]
+        elif new_items:
+            sample = (now - self.last_poll) / new_items
+            if self.mean_gap is None:
+                self.mean_gap = sample
+            else:
+                self.mean_gap += self.alpha * (sample - self.mean_gap)
+            self.last_new = now
+
+        gap = self.mean_gap if self.mean_gap is not None else self.min_interval
+        if self.last_new is not None:
+            # Quiet for longer than usual: the feed has probably slowed down
+            gap = max(gap, now - self.last_new)
+
+        interval = min(max(gap, self.min_interval), self.max_interval)
+        self.interval = max(interval, ttl, max_age)
+        self.last_poll = now
+        self.next_poll = now + self.interval
+        return self.interval
+
+    def failed(self, now: float):
+        """Back off after a failed poll"""
+        self.interval = min(self.interval * 2, self.max_interval)
+        self.next_poll = now + self.interval
+
+
 class NewsSourceFetcher:
     """Fetches news articles from various sources using RSS feeds"""
 
@@ -82,6 +180,241 @@ class NewsSourceFetcher:
         },
     }
 
+    def __init__(
+        self, min_poll_interval: float = 120.0, max_poll_interval: float = 3600.0
+    ) -> None:
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+
+        # Some categories share a URL; each URL is fetched once for all of them
+        self._feeds_by_url: Dict[str, List[Tuple[str, str]]] = {}
+        for source, categories in self.RSS_FEEDS.items():
+            for category, url in categories.items():
+                self._feeds_by_url.setdefault(url, []).append((source, category))
+
+        self._schedules: Dict[str, FeedSchedule] = {}
+        # (source, category) -> articles of the last successful fetch
+        self._articles: Dict[Tuple[str, str], List[Dict]] = {}
+        # URL -> lock, so concurrent readers of a stale feed fetch it once
+        self._url_locks: Dict[str, threading.Lock] = {}
+        self._url_locks_lock = threading.Lock()
+
+        # Called with a FeedDelta for every parsed feed that changed, so
+        # caches and indexes only process new, changed and removed entries
+        self._ingest_listeners: List[Callable] = []
+        # (source, category) -> {article ID: content hash} of the last parse
+        self._feed_state: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self._feed_state_lock = threading.Lock()
+
+    def add_ingest_listener(self, listener: Callable) -> None:
+        """Registers a callback that receives the FeedDelta of every parse"""
+        self._ingest_listeners.append(listener)
+
+    def _notify_ingest(self, delta: FeedDelta):
+        for listener in self._ingest_listeners:
+            try:
+                listener(delta)
+            except Exception as e:
+                print(f"   ⚠ Ingest listener failed: {e}")
+
+    @staticmethod
+    def _content_hash(article: Dict) -> str:
+        content = "\x1f".join(
+            [
+                article["title"],
+                article["summary"],
+                article["link"],
+                article["published"],
+            ]
+        )
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def _compute_delta(
+        self, source: str, category: str, articles: List[Dict]
+    ) -> FeedDelta:
+        """Diff a fresh parse against the feed's previous one by GUID/link"""
+        current = {}
+        for article in articles:
+            current.setdefault(article["id"], self._content_hash(article))
+
+        with self._feed_state_lock:
+            previous = self._feed_state.get((source, category))
+            self._feed_state[(source, category)] = current
+
+        delta = FeedDelta(source, category, initial=previous is None)
+        previous = previous or {}
+        seen = set()
+        for article in articles:
+            article_id = article["id"]
+            if article_id in seen:
+                continue
+            seen.add(article_id)
+
+            if article_id not in previous:
+                delta.new.append(article)
+            elif previous[article_id] != current[article_id]:
+                delta.changed.append(article)
+        delta.removed = [
+            article_id for article_id in previous if article_id not in current
+        ]
+        return delta
+
+    @staticmethod
+    def article_id(entry: Dict) -> str:
+        """Stable short ID for a feed entry, from its GUID or link"""
+        key = entry.get("id") or entry.get("link") or entry.get("title", "")
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def published_timestamp(entry: Dict) -> float:
+        """Publish time of a feed entry as a UTC epoch, 0.0 if it has none"""
+        parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+        if not parsed:
+            return 0.0
+        try:
+            return float(calendar.timegm(parsed))
+        except (TypeError, ValueError, OverflowError):
+            return 0.0
+
+    def _build_articles(self, entries: List, source: str, category: str) -> List[Dict]:
+        """Article dicts of one feed's parsed entries"""
+        articles = []
+        for entry in entries:
+            # Get summary/description
+            summary = entry.get("summary", "")
+            if not summary:
+                summary = entry.get("description", "")
+            if not summary:
+                summary = entry.get("content", [{}])[0].get("value", "")
+
+            article = {
+                "id": self.article_id(entry),
+                "title": entry.get("title", "No title"),
+                "summary": summary,
+                "link": entry.get("link", ""),
+                "published": entry.get("published") or entry.get("updated", ""),
+                "published_ts": self.published_timestamp(entry),
+                "source": source,
+                "category": category,
+            }
+            articles.append(article)
+        return articles
+
+    @staticmethod
+    def cache_hints(feed) -> Tuple[float, float]:
+        """(ttl, max-age) in seconds from a parsed feed and its response"""
+        try:
+            # RSS <ttl> is in minutes
+            ttl = float(feed.feed.get("ttl", 0)) * 60
+        except (TypeError, ValueError):
+            ttl = 0.0
+
+        headers = {key.lower(): value for key, value in feed.get("headers", {}).items()}
+        match = re.search(r"max-age=(\d+)", headers.get("cache-control", ""))
+        max_age = float(match.group(1)) if match else 0.0
+        return ttl, max_age
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._url_locks_lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    def schedule(self, url: str) -> FeedSchedule:
+        """Adaptive poll schedule of a feed URL"""
+        schedule = self._schedules.get(url)
+        if schedule is None:
+            schedule = self._schedules.setdefault(
+                url, FeedSchedule(self.min_poll_interval, self.max_poll_interval)
+            )
+        return schedule
+
+    def due_feeds(self, now: Optional[float] = None) -> List[str]:
+        """Feed URLs whose next poll is due"""
+        now = time.time() if now is None else now
+        return [url for url in self._feeds_by_url if self.schedule(url).is_due(now)]
+
+    def next_poll_time(self) -> float:
+        """Earliest scheduled poll across all feed URLs"""
+        return min(self.schedule(url).next_poll for url in self._feeds_by_url)
+
+    def needs_fetch(self, source: str, category: str = "general") -> bool:
+        """Whether reading a feed now would fetch it rather than use the cache"""
+        url = self.RSS_FEEDS.get(source.lower(), {}).get(category.lower())
+        if url is None:
+            return False
+        if any(feed not in self._articles for feed in self._feeds_by_url[url]):
+            return True
+        return self.schedule(url).is_due(time.time())
+
+    def refresh_feed(self, url: str, force: bool = True) -> int:
+        """
+        Fetches a feed URL for every (source, category) that uses it
+
+        Without `force` nothing is fetched while the URL's schedule is not
+        due yet. Ingest listeners get a FeedDelta per (source, category).
+
+        Returns:
+            Number of new articles found
+        """
+        feeds = self._feeds_by_url.get(url, [])
+        schedule = self.schedule(url)
+
+        with self._url_lock(url):
+            cached = all(feed in self._articles for feed in feeds)
+            if not force and cached and not schedule.is_due(time.time()):
+                return 0
+
+            print(f"   📡 Fetching from: {url}")
+            try:
+                feed = feedparser.parse(
+                    url, etag=schedule.etag, modified=schedule.modified
+                )
+            except Exception as e:
+                schedule.failed(time.time())
+                if cached:
+                    print(f"   ⚠ Serving cached articles, fetch failed: {e}")
+                    return 0
+                raise NewsSourceFetcherError(f"Error fetching {url}: {e}")
+            now = time.time()
+            ttl, max_age = self.cache_hints(feed)
+
+            # Not modified since the last fetch
+            if feed.get("status") == 304 and cached:
+                schedule.observe(now, 0, ttl=ttl, max_age=max_age)
+                return 0
+
+            # Check for feed errors
+            if hasattr(feed, "bozo_exception"):
+                print(f"   ⚠ Feed warning: {feed.bozo_exception}")
+
+            if not feed.entries:
+                schedule.failed(now)
+                if cached:
+                    return 0
+                raise NewsSourceFetcherError(
+                    f"No articles found in {url}. "
+                    f"The RSS feed might be temporarily unavailable."
+                )
+
+            schedule.etag = feed.get("etag")
+            schedule.modified = feed.get("modified")
+
+            new_ids = set()
+            published = []
+            for source, category in feeds:
+                articles = self._build_articles(feed.entries, source, category)
+                self._articles[(source, category)] = articles
+
+                delta = self._compute_delta(source, category, articles)
+                new_ids.update(article["id"] for article in delta.new)
+                if delta:
+                    self._notify_ingest(delta)
+                published = [article["published_ts"] for article in articles]
+
+            schedule.observe(
+                now, len(new_ids), published=published, ttl=ttl, max_age=max_age
+            )
+            return len(new_ids)
+
     def get_available_sources(self) -> Dict[str, List[str]]:
         """Returns all available news sources and their categories"""
         return {
@@ -125,41 +458,9 @@ class NewsSourceFetcher:
             # Get the RSS feed URL
             feed_url = self.RSS_FEEDS[source_lower][category_lower]
 
-            # Parse the feed
-            print(f"   📡 Fetching from: {feed_url}")
-            feed = feedparser.parse(feed_url)
-
-            # Check for feed errors
-            if hasattr(feed, "bozo_exception"):
-                print(f"   ⚠ Feed warning: {feed.bozo_exception}")
-
-            if not feed.entries:
-                raise NewsSourceFetcherError(
-                    f"No articles found in {source} {category} feed. "
-                    f"The RSS feed might be temporarily unavailable."
-                )
-
-            # Extract article information
-            articles = []
-            for entry in feed.entries[:max_articles]:
-                # Get summary/description
-                summary = entry.get("summary", "")
-                if not summary:
-                    summary = entry.get("description", "")
-                if not summary:
-                    summary = entry.get("content", [{}])[0].get("value", "")
-
-                article = {
-                    "title": entry.get("title", "No title"),
-                    "summary": summary,
-                    "link": entry.get("link", ""),
-                    "published": entry.get("published", entry.get("updated", "")),
-                    "source": source,
-                    "category": category,
-                }
-                articles.append(article)
-
-            return articles
+            # Served from the last fetch until the feed's schedule is due
+            self.refresh_feed(feed_url, force=False)
+            return self._articles[(source_lower, category_lower)][:max_articles]
 
         except NewsSourceFetcherError:
             raise
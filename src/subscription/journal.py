@@ -0,0 +1,105 @@
+"""
+Subscription Journal - Append-only log of subscription record updates
+
+Every line is a JSON object holding the full, latest record of one user, so
+replaying the log on top of a snapshot is idempotent and the last line for a
+user always wins. A torn final line (crash mid-append) is skipped on replay.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionJournalError(Exception):
+    """Gets raised when the journal cannot be written"""
+
+    pass
+
+
+class SubscriptionJournal:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # Segment being folded into a snapshot by an in-progress compaction
+        self.rotated_path = self.path.with_name(self.path.name + ".old")
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        return self._file
+
+    def append(self, user_id: str, record: Optional[Dict]):
+        """Append a user's full record (None marks a deleted user)"""
+        try:
+            line = json.dumps(
+                {"user": user_id, "record": record}, separators=(",", ":")
+            )
+            self._open().write(line + "\n")
+        except OSError as e:
+            raise SubscriptionJournalError(f"Could not append to journal: {e}")
+
+    def sync(self):
+        """Flush buffered appends and fsync them to disk"""
+        if self._file is None:
+            return
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            raise SubscriptionJournalError(f"Could not sync journal: {e}")
+
+    def size(self) -> int:
+        """Size of the active journal segment in bytes"""
+        if self._file is not None:
+            return self._file.tell()
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def has_rotated(self) -> bool:
+        return self.rotated_path.exists()
+
+    def rotate(self):
+        """Move the active segment aside so new appends start a fresh one
+
+        A rotated segment left behind by a compaction that failed is not yet
+        in any snapshot, so it is never overwritten: the active segment then
+        stays where it is, and the next snapshot covers both.
+        """
+        self.sync()
+        if self.has_rotated():
+            logger.warning(
+                f"{self.rotated_path} is left from an unfinished compaction, "
+                "folding it into this one"
+            )
+            return
+        self.close()
+        if self.path.exists():
+            os.replace(self.path, self.rotated_path)
+
+    def discard_rotated(self):
+        """Drop the rotated segment once a snapshot covering it is on disk"""
+        self.rotated_path.unlink(missing_ok=True)
+
+    def replay(self) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Yield (user_id, record) pairs from the rotated then active segment"""
+        for path in (self.rotated_path, self.path):
+            if not path.exists():
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        entry = json.loads(line)
+                        yield entry["user"], entry["record"]
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        logger.warning(
+                            f"Skipping corrupt journal line {path}:{line_no}"
+                        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,294 @@
+"""
+SQLite Subscription Store - Multi-process safe subscription storage
+
+`SubscriptionManager` keeps every user in memory and assumes it is the only
+writer. When several bot workers share the `./data` volume they would clobber
+each other's counters, so this store keeps no state in memory at all: every
+read and write goes to a SQLite database in WAL mode, and quota changes run
+inside `BEGIN IMMEDIATE` transactions so check-and-increment is atomic across
+processes.
+
+Select it with `SUBSCRIPTION_STORE=sqlite`. On first start an existing
+`data/subscriptions.json` (plus its journal) is imported automatically.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.subscription.subscription_manager import SubscriptionManager
+from src.subscription.user_context import UserContext
+
+
+class SqliteSubscriptionManager(SubscriptionManager):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            tier TEXT NOT NULL DEFAULT 'free',
+            daily_count INTEGER NOT NULL DEFAULT 0,
+            last_reset TEXT,
+            upgraded_at TEXT,
+            expires_at TEXT,
+            expires_ts REAL,
+            months INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_premium_expiry
+            ON users (expires_ts) WHERE tier = 'premium';
+    """
+
+    COLUMNS = (
+        "tier",
+        "daily_count",
+        "last_reset",
+        "upgraded_at",
+        "expires_at",
+        "months",
+    )
+
+    def __init__(
+        self,
+        db_path: str = "data/subscriptions.db",
+        busy_timeout: float = 30.0,
+        import_from: Optional[str] = "data/subscriptions.json",
+    ):
+        self.busy_timeout = busy_timeout
+        self.import_from = Path(import_from) if import_from else None
+        super().__init__(db_path)
+
+    def _open_store(self, flush_interval: float, compact_threshold: int):
+        """Create the schema and import the JSON database on first start"""
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+        if self.import_from and self.import_from.exists():
+            with self._transaction() as conn:
+                empty = conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+                if empty:
+                    self._import_json(conn, self.import_from)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block as one write transaction, serialized across processes"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _import_json(self, conn: sqlite3.Connection, json_path: Path):
+        """Copy users from the JSON snapshot + journal into the database"""
+        legacy = SubscriptionManager(str(json_path), flush_interval=0)
+        try:
+            for user_id, record in legacy.subscriptions.items():
+                self._write_record(conn, user_id, record)
+        finally:
+            legacy.journal.close()
+
+    @staticmethod
+    def _expiry_ts(expires_at: Optional[str]) -> Optional[float]:
+        if not expires_at:
+            return None
+        return datetime.fromisoformat(expires_at).timestamp()
+
+    def _write_record(self, conn: sqlite3.Connection, user_id: str, record: Dict):
+        conn.execute(
+            "INSERT OR REPLACE INTO users (user_id, tier, daily_count, last_reset,"
+            " upgraded_at, expires_at, expires_ts, months)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                user_id,
+                record.get("tier", "free"),
+                record.get("daily_count", 0),
+                record.get("last_reset"),
+                record.get("upgraded_at"),
+                record.get("expires_at"),
+                self._expiry_ts(record.get("expires_at")),
+                record.get("months"),
+            ),
+        )
+
+    def _row_to_record(self, row: sqlite3.Row) -> Dict:
+        return {
+            column: row[column] for column in self.COLUMNS if row[column] is not None
+        }
+
+    def _refresh_user(self, conn: sqlite3.Connection, user_id: str) -> sqlite3.Row:
+        """Create the user if needed, apply day rollover and expiry, return row"""
+        today = datetime.now().date().isoformat()
+        conn.execute(
+            "INSERT OR IGNORE INTO users (user_id, tier, daily_count, last_reset)"
+            " VALUES (?, 'free', 0, ?)",
+            (user_id, today),
+        )
+        conn.execute(
+            "UPDATE users SET daily_count = 0, last_reset = ?"
+            " WHERE user_id = ? AND (last_reset IS NULL OR last_reset != ?)",
+            (today, user_id, today),
+        )
+        conn.execute(
+            "UPDATE users SET tier = 'free' WHERE user_id = ? AND tier = 'premium'"
+            " AND (expires_ts IS NULL OR expires_ts <= ?)",
+            (user_id, time.time()),
+        )
+        return conn.execute(
+            "SELECT * FROM users WHERE user_id = ?", (user_id,)
+        ).fetchone()
+
+    @property
+    def subscriptions(self) -> Dict[str, Dict]:
+        """Read-only snapshot of every stored user record"""
+        rows = self._connect().execute("SELECT * FROM users").fetchall()
+        return {row["user_id"]: self._row_to_record(row) for row in rows}
+
+    def expire_due(self) -> int:
+        """Downgrade every premium user whose subscription has expired"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE users SET tier = 'free' WHERE tier = 'premium'"
+                " AND (expires_ts IS NULL OR expires_ts <= ?)",
+                (time.time(),),
+            )
+            return cursor.rowcount
+
+    def get_user_tier(self, user_id: int) -> str:
+        """Get user's subscription tier"""
+        row = (
+            self._connect()
+            .execute(
+                "SELECT 1 FROM users WHERE user_id = ? AND tier = 'premium'"
+                " AND expires_ts > ?",
+                (str(user_id), time.time()),
+            )
+            .fetchone()
+        )
+        return "premium" if row else "free"
+
+    def get_premium_users(self) -> Dict[str, Dict]:
+        """Get records of all users with an active premium subscription"""
+        self.expire_due()
+        rows = (
+            self._connect()
+            .execute("SELECT * FROM users WHERE tier = 'premium' ORDER BY expires_ts")
+            .fetchall()
+        )
+        return {row["user_id"]: self._row_to_record(row) for row in rows}
+
+    def upgrade_to_premium(self, user_id: int, months: int = 1) -> bool:
+        """Upgrade user to premium"""
+        expires_at = datetime.now() + timedelta(days=30 * months)
+
+        with self._transaction() as conn:
+            self._write_record(
+                conn,
+                str(user_id),
+                {
+                    "tier": "premium",
+                    "upgraded_at": datetime.now().isoformat(),
+                    "expires_at": expires_at.isoformat(),
+                    "months": months,
+                },
+            )
+        return True
+
+    def downgrade_to_free(self, user_id: int) -> bool:
+        """Remove premium access. Returns False if the user is unknown"""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE users SET tier = 'free' WHERE user_id = ?", (str(user_id),)
+            )
+            return cursor.rowcount > 0
+
+    def get_user_stats(self, user_id: int) -> Dict:
+        """Get user's usage statistics"""
+        with self._transaction() as conn:
+            return self._row_to_record(self._refresh_user(conn, str(user_id)))
+
+    def increment_usage(self, user_id: int, count: int = 1):
+        """Atomically increment user's daily article count"""
+        with self._transaction() as conn:
+            self._refresh_user(conn, str(user_id))
+            conn.execute(
+                "UPDATE users SET daily_count = daily_count + ? WHERE user_id = ?",
+                (count, str(user_id)),
+            )
+
+    def reserve_usage(self, user_id: int, count: int) -> Tuple[int, int]:
+        """Atomically claim up to `count` articles of the user's daily quota
+
+        Returns (granted, daily_count after the reservation).
+        """
+        with self._transaction() as conn:
+            row = self._refresh_user(conn, str(user_id))
+            limit = self.LIMITS[row["tier"]]["daily_articles"]
+            granted = max(0, min(count, limit - row["daily_count"]))
+            if granted:
+                conn.execute(
+                    "UPDATE users SET daily_count = daily_count + ? WHERE user_id = ?",
+                    (granted, str(user_id)),
+                )
+            return granted, row["daily_count"] + granted
+
+    def get_user_context(self, user_id: int) -> UserContext:
+        """Resolve everything a handler needs to know about a user at once"""
+        with self._transaction() as conn:
+            row = self._refresh_user(conn, str(user_id))
+
+        tier = row["tier"]
+        limits = self.LIMITS[tier]
+        return UserContext(
+            user_id=str(user_id),
+            tier=tier,
+            limits=limits,
+            daily_count=row["daily_count"],
+            sources=self._sources_for_tier(tier),
+            categories=limits["categories"],
+            expires_at=row["expires_at"] if tier == "premium" else None,
+            _manager=self,
+        )
+
+    def flush(self) -> bool:
+        """Every write is already committed - nothing is ever pending"""
+        return False
+
+    def compact(self):
+        self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _save_subscriptions(self):
+        self.compact()
+
+    def close(self):
+        """Close every thread's database connection"""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
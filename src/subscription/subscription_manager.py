@@ -1,19 +1,51 @@
 """
 Subscription Manager - Handles free/premium tiers
+
+Usage counters are write-behind: `increment_usage` only touches memory and
+marks the user dirty, and a background flusher appends dirty records to an
+append-only journal every `flush_interval` seconds (one fsync per batch) and
+again on `close()`. If the process crashes, at most `flush_interval` seconds
+of usage counts are lost (users may get a few extra articles that day). Tier
+changes (`upgrade_to_premium`) are journaled and fsynced immediately.
+
+Tier checks are a dict lookup: active premium users are cached with their
+expiry time, and a min-heap of expiry times lets `expire_due` downgrade every
+lapsed subscription in one sweep (run by the flusher and before tier reads).
+
+Once the journal grows past `compact_threshold` bytes the flusher folds it
+into a new `subscriptions.json` snapshot (written atomically), so startup only
+replays a short journal tail.
 """
 
+import atexit
+import heapq
 import json
+import logging
 import os
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from pathlib import Path
 
+from src.subscription.journal import SubscriptionJournal
+from src.subscription.user_context import UserContext
+
+logger = logging.getLogger(__name__)
+
 
 class SubscriptionManager:
-    def __init__(self, db_path: str = "data/subscriptions.json"):
+    def __init__(
+        self,
+        db_path: str = "data/subscriptions.json",
+        flush_interval: float = 5.0,
+        compact_threshold: int = 1024 * 1024,
+    ):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(exist_ok=True)
-        self.subscriptions = self._load_subscriptions()
+
+        self._open_store(flush_interval, compact_threshold)
+        atexit.register(self.close)
 
         # Feature limits
         self.LIMITS = {
@@ -23,6 +55,8 @@ class SubscriptionManager:
                 "ai_summaries": False,
                 "search_results": 3,
                 "categories": ["general", "world"],
+                "digests": 1,
+                "alerts": 3,
             },
             "premium": {
                 "daily_articles": 100,
@@ -30,137 +64,315 @@ class SubscriptionManager:
                 "ai_summaries": True,
                 "search_results": 10,
                 "categories": "all",
+                "digests": 10,
+                "alerts": 50,
             },
         }
 
+    def _open_store(self, flush_interval: float, compact_threshold: int):
+        """Load state and start background persistence"""
+        # data/subscriptions.json is the latest snapshot; every change since
+        # then lives in the append-only journal next to it.
+        self.journal = SubscriptionJournal(self.db_path.with_suffix(".journal"))
+        self.compact_threshold = compact_threshold
+        self._compact_lock = threading.Lock()
+
+        # Write-behind state: users whose in-memory record changed since the
+        # last flush. Guarded by _lock, which also guards self.subscriptions.
+        self._lock = threading.RLock()
+        self._dirty = set()
+        self.subscriptions = self._load_subscriptions()
+
+        # Tier cache: active premium users -> expiry timestamp, backed by a
+        # min-heap of (expiry, user_id) so expirations are swept in bulk.
+        self._premium_expiry: Dict[str, float] = {}
+        self._expiry_heap = []
+        self._rebuild_indexes()
+
+        # A rotated segment means the last compaction never finished
+        if self.journal.has_rotated():
+            self.compact()
+
+        self.flush_interval = flush_interval
+        self._stop_flusher = threading.Event()
+        self._flusher = None
+        if flush_interval and flush_interval > 0:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, name="subscription-flusher", daemon=True
+            )
+            self._flusher.start()
+
     def _load_subscriptions(self) -> Dict:
-        """Load subscriptions from JSON file"""
+        """Load the latest snapshot and replay the journal tail on top of it"""
+        subscriptions = {}
         if self.db_path.exists():
             try:
                 with open(self.db_path, "r") as f:
-                    return json.load(f)
+                    subscriptions = json.load(f)
             except json.JSONDecodeError:
-                return {}
-        return {}
+                subscriptions = {}
+
+        for user_id, record in self.journal.replay():
+            if record is None:
+                subscriptions.pop(user_id, None)
+            else:
+                subscriptions[user_id] = record
+
+        return subscriptions
 
     def _save_subscriptions(self):
-        """Save subscriptions to JSON file"""
-        with open(self.db_path, "w") as f:
-            json.dump(self.subscriptions, f, indent=2)
+        """Write a full snapshot of all subscriptions and compact the journal"""
+        self.compact()
+
+    def _write_snapshot(self, data: str):
+        """Atomically replace the snapshot file - a crash never truncates it"""
+        tmp_path = self.db_path.with_name(self.db_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.db_path)
+
+    def _mark_dirty(self, user_id: str):
+        """Schedule a user's record for the next background flush"""
+        self._dirty.add(user_id)
+
+    def _append_dirty(self):
+        """Append every dirty user to the journal with a single fsync"""
+        for user_id in self._dirty:
+            self.journal.append(user_id, self.subscriptions.get(user_id))
+        self._dirty.clear()
+        self.journal.sync()
+
+    def flush(self) -> bool:
+        """Persist pending usage changes. Returns True if anything was written"""
+        with self._lock:
+            if not self._dirty:
+                return False
+            self._append_dirty()
+            return True
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and start a new journal
+
+        The journal is rotated under the lock so writers are only blocked for
+        the in-memory copy; the snapshot itself is written outside of it.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self._dirty:
+                    self._append_dirty()
+                data = json.dumps(self.subscriptions, indent=2)
+                self.journal.rotate()
+            self._write_snapshot(data)
+            self.journal.discard_rotated()
+
+    def _flush_loop(self):
+        """Background flusher - persists dirty users every flush_interval"""
+        while not self._stop_flusher.wait(self.flush_interval):
+            try:
+                self.expire_due()
+                self.flush()
+                with self._lock:
+                    journal_size = self.journal.size()
+                if journal_size >= self.compact_threshold:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Error flushing subscriptions: {e}")
+
+    def close(self):
+        """Stop the background flusher and persist any pending changes"""
+        self._stop_flusher.set()
+        if self._flusher and self._flusher is not threading.current_thread():
+            self._flusher.join(timeout=self.flush_interval + 1)
+        with self._lock:
+            self.flush()
+            self.journal.close()
+
+    def _index_user(self, user_id: str, record: Optional[Dict]):
+        """Update the tier cache and expiry heap for one user's record"""
+        self._premium_expiry.pop(user_id, None)
+        if not record or record.get("tier") != "premium":
+            return
+
+        expires_at = datetime.fromisoformat(
+            record.get("expires_at", "2000-01-01")
+        ).timestamp()
+        self._premium_expiry[user_id] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, user_id))
+
+    def _rebuild_indexes(self):
+        """Build the tier cache and expiry heap from scratch"""
+        self._premium_expiry = {}
+        self._expiry_heap = []
+        for user_id, record in self.subscriptions.items():
+            self._index_user(user_id, record)
+
+    def expire_due(self) -> int:
+        """Downgrade every premium user whose subscription has expired
+
+        Expired users are popped off the expiry heap and written to the
+        journal in one batch. Returns the number of users downgraded.
+        """
+        now = time.time()
+        with self._lock:
+            if not self._expiry_heap or self._expiry_heap[0][0] > now:
+                return 0
+
+            expired = 0
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, user_id = heapq.heappop(self._expiry_heap)
+                # Skip stale entries left behind by a renewal or downgrade
+                if self._premium_expiry.get(user_id) != expires_at:
+                    continue
+                del self._premium_expiry[user_id]
+                if user_id in self.subscriptions:
+                    self.subscriptions[user_id]["tier"] = "free"
+                    self._mark_dirty(user_id)
+                expired += 1
+
+            if expired:
+                self._append_dirty()
+            return expired
 
     def get_user_tier(self, user_id: int) -> str:
         """Get user's subscription tier"""
-        user_id = str(user_id)
-
-        if user_id not in self.subscriptions:
-            return "free"
-
-        user_data = self.subscriptions[user_id]
-
-        # Check if premium subscription is still valid
-        if user_data.get("tier") == "premium":
-            expiry = datetime.fromisoformat(user_data.get("expires_at", "2000-01-01"))
-            if datetime.now() < expiry:
-                return "premium"
-            else:
-                # Subscription expired
-                self.subscriptions[user_id]["tier"] = "free"
-                self._save_subscriptions()
-
+        self.expire_due()
+        if str(user_id) in self._premium_expiry:
+            return "premium"
         return "free"
 
+    def get_premium_users(self) -> Dict[str, Dict]:
+        """Get records of all users with an active premium subscription"""
+        self.expire_due()
+        with self._lock:
+            return {
+                user_id: self.subscriptions[user_id]
+                for user_id in sorted(
+                    self._premium_expiry, key=self._premium_expiry.get
+                )
+            }
+
     def upgrade_to_premium(self, user_id: int, months: int = 1) -> bool:
         """Upgrade user to premium"""
         user_id = str(user_id)
 
         expires_at = datetime.now() + timedelta(days=30 * months)
 
-        self.subscriptions[user_id] = {
-            "tier": "premium",
-            "upgraded_at": datetime.now().isoformat(),
-            "expires_at": expires_at.isoformat(),
-            "months": months,
-        }
+        with self._lock:
+            self.subscriptions[user_id] = {
+                "tier": "premium",
+                "upgraded_at": datetime.now().isoformat(),
+                "expires_at": expires_at.isoformat(),
+                "months": months,
+            }
+            self._index_user(user_id, self.subscriptions[user_id])
 
-        self._save_subscriptions()
+            # Tier changes are written through, never left to the flusher
+            self._mark_dirty(user_id)
+            self._append_dirty()
         return True
 
-    def get_user_stats(self, user_id: int) -> Dict:
-        """Get user's usage statistics"""
+    def downgrade_to_free(self, user_id: int) -> bool:
+        """Remove premium access. Returns False if the user is unknown"""
         user_id = str(user_id)
 
-        if user_id not in self.subscriptions:
-            self.subscriptions[user_id] = {
-                "tier": "free",
-                "daily_count": 0,
-                "last_reset": datetime.now().date().isoformat(),
-            }
-            self._save_subscriptions()
-
-        user_data = self.subscriptions[user_id]
+        with self._lock:
+            if user_id not in self.subscriptions:
+                return False
 
-        # Reset daily count if it's a new day
-        last_reset = user_data.get("last_reset", datetime.now().date().isoformat())
-        if last_reset != datetime.now().date().isoformat():
-            user_data["daily_count"] = 0
-            user_data["last_reset"] = datetime.now().date().isoformat()
-            self._save_subscriptions()
+            self.subscriptions[user_id]["tier"] = "free"
+            self._index_user(user_id, self.subscriptions[user_id])
 
-        return user_data
+            self._mark_dirty(user_id)
+            self._append_dirty()
+        return True
 
-    def increment_usage(self, user_id: int):
-        """Increment user's daily article count"""
+    def get_user_stats(self, user_id: int) -> Dict:
+        """Get user's usage statistics"""
         user_id = str(user_id)
-        stats = self.get_user_stats(user_id)
-        stats["daily_count"] = stats.get("daily_count", 0) + 1
-        self.subscriptions[user_id] = stats
-        self._save_subscriptions()
-
-    def can_access_feature(self, user_id: int, feature: str, value: any = None) -> bool:
-        """Check if user can access a feature"""
-        tier = self.get_user_tier(user_id)
-        limits = self.LIMITS[tier]
-
-        if feature == "source":
-            if limits["sources"] == "all":
-                return True
-            return value in limits["sources"]
-
-        elif feature == "ai_summaries":
-            return limits["ai_summaries"]
+        today = datetime.now().date().isoformat()
+
+        with self._lock:
+            if user_id not in self.subscriptions:
+                self.subscriptions[user_id] = {
+                    "tier": "free",
+                    "daily_count": 0,
+                    "last_reset": today,
+                }
+                self._mark_dirty(user_id)
+
+            user_data = self.subscriptions[user_id]
+
+            # Reset daily count if it's a new day
+            last_reset = user_data.get("last_reset", today)
+            if last_reset != today:
+                user_data["daily_count"] = 0
+                user_data["last_reset"] = today
+                self._mark_dirty(user_id)
+
+            return user_data
+
+    def increment_usage(self, user_id: int, count: int = 1):
+        """Increment user's daily article count (in memory, flushed later)"""
+        user_id = str(user_id)
+        with self._lock:
+            stats = self.get_user_stats(user_id)
+            stats["daily_count"] = stats.get("daily_count", 0) + count
+            self.subscriptions[user_id] = stats
+            self._mark_dirty(user_id)
 
-        elif feature == "category":
-            if limits["categories"] == "all":
-                return True
-            return value in limits["categories"]
+    def reserve_usage(self, user_id: int, count: int) -> Tuple[int, int]:
+        """Atomically claim up to `count` articles of the user's daily quota
 
-        elif feature == "daily_limit":
+        Returns (granted, daily_count after the reservation).
+        """
+        user_id = str(user_id)
+        with self._lock:
+            limit = self.LIMITS[self.get_user_tier(user_id)]["daily_articles"]
             stats = self.get_user_stats(user_id)
-            return stats.get("daily_count", 0) < limits["daily_articles"]
-
-        elif feature == "search_results":
-            return limits["search_results"]
+            used = stats.get("daily_count", 0)
+            granted = max(0, min(count, limit - used))
+            if granted:
+                stats["daily_count"] = used + granted
+                self._mark_dirty(user_id)
+            return granted, stats["daily_count"]
+
+    def get_user_context(self, user_id: int) -> UserContext:
+        """Resolve everything a handler needs to know about a user at once"""
+        user_id = str(user_id)
+        with self._lock:
+            tier = self.get_user_tier(user_id)
+            stats = self.get_user_stats(user_id)
+            limits = self.LIMITS[tier]
+            return UserContext(
+                user_id=user_id,
+                tier=tier,
+                limits=limits,
+                daily_count=stats.get("daily_count", 0),
+                sources=self._sources_for_tier(tier),
+                categories=limits["categories"],
+                expires_at=stats.get("expires_at") if tier == "premium" else None,
+                _manager=self,
+            )
 
-        return False
+    def can_access_feature(self, user_id: int, feature: str, value: any = None) -> bool:
+        """Check if user can access a feature"""
+        return self.get_user_context(user_id).can_access_feature(feature, value)
 
     def get_limits(self, user_id: int) -> Dict:
         """Get user's current limits"""
-        tier = self.get_user_tier(user_id)
-        stats = self.get_user_stats(user_id)
-        limits = self.LIMITS[tier].copy()
-        limits["current_usage"] = stats.get("daily_count", 0)
-        limits["tier"] = tier
+        user_context = self.get_user_context(user_id)
+        limits = user_context.limits.copy()
+        limits["current_usage"] = user_context.daily_count
+        limits["tier"] = user_context.tier
 
-        if tier == "premium":
-            user_data = self.subscriptions.get(str(user_id), {})
-            limits["expires_at"] = user_data.get("expires_at", "N/A")
+        if user_context.is_premium:
+            limits["expires_at"] = user_context.expires_at or "N/A"
 
         return limits
 
-    def get_available_sources(self, user_id: int) -> list:
-        """Get list of sources user can access"""
-        tier = self.get_user_tier(user_id)
-
+    def _sources_for_tier(self, tier: str) -> list:
         if self.LIMITS[tier]["sources"] == "all":
             return [
                 "bbc",
@@ -175,6 +387,17 @@ class SubscriptionManager:
 
         return self.LIMITS[tier]["sources"]
 
+    def tier_allows(self, tier: str, source: str, category: str) -> bool:
+        """Whether a tier may read a feed; touches no user record"""
+        categories = self.LIMITS[tier]["categories"]
+        if source not in self._sources_for_tier(tier):
+            return False
+        return categories == "all" or category in categories
+
+    def get_available_sources(self, user_id: int) -> list:
+        """Get list of sources user can access"""
+        return self._sources_for_tier(self.get_user_tier(user_id))
+
     def get_available_categories(self, user_id: int) -> list:
         """Get list of categories user can access"""
         tier = self.get_user_tier(user_id)
@@ -0,0 +1,74 @@
+"""
+User Context - A user's subscription state resolved once per Telegram update
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+
+@dataclass
+class UserContext:
+    """Tier, limits and quota for one user, looked up once per update
+
+    Handlers resolve this with `SubscriptionManager.get_user_context` and then
+    answer every feature check from it without touching the manager again.
+    Quota is claimed in one call with `reserve`, however many articles are
+    about to be sent.
+    """
+
+    user_id: str
+    tier: str
+    limits: Dict
+    daily_count: int
+    sources: List[str]
+    categories: Union[List[str], str]
+    expires_at: Optional[str] = None
+    reserved: int = 0
+    _manager: object = field(default=None, repr=False, compare=False)
+
+    @property
+    def is_premium(self) -> bool:
+        return self.tier == "premium"
+
+    @property
+    def remaining(self) -> int:
+        """Articles the user may still receive today"""
+        return max(0, self.limits["daily_articles"] - self.daily_count)
+
+    def can_access_feature(self, feature: str, value: any = None) -> bool:
+        """Check if user can access a feature"""
+        if feature == "source":
+            return value in self.sources
+
+        elif feature == "ai_summaries":
+            return self.limits["ai_summaries"]
+
+        elif feature == "category":
+            if self.categories == "all":
+                return True
+            return value in self.categories
+
+        elif feature == "daily_limit":
+            return self.remaining > 0
+
+        elif feature == "search_results":
+            return self.limits["search_results"]
+
+        elif feature == "digests":
+            return self.limits["digests"]
+
+        elif feature == "alerts":
+            return self.limits["alerts"]
+
+        return False
+
+    def reserve(self, count: int) -> int:
+        """Claim up to `count` articles of today's quota in a single write
+
+        Returns how many articles were granted, which may be fewer than asked
+        for (or 0) when the user is close to their daily limit.
+        """
+        granted, daily_count = self._manager.reserve_usage(self.user_id, count)
+        self.daily_count = daily_count
+        self.reserved += granted
+        return granted
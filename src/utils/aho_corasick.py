@@ -0,0 +1,150 @@
+"""
+Aho-Corasick - Multi-keyword matcher that scans a text once for every keyword
+
+Matching each alert keyword against each article separately costs
+O(keywords x text). The automaton folds all keywords into one trie with
+failure links, so a scan is linear in the text (plus the matches found)
+however many keywords are registered.
+
+Changes are incremental: `add` inserts a keyword's path into the trie and
+`remove` only clears its terminal mark, both O(len(keyword)). Failure links
+are recomputed once, lazily, before the next scan after any change, rather
+than on every edit. Paths of removed keywords are pruned by a full rebuild
+once they outnumber the live ones.
+"""
+
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class AhoCorasick:
+    def __init__(self, keywords: Iterable[str] = ()):
+        self._lock = threading.Lock()
+        self._reset()
+        for keyword in keywords:
+            self.add(keyword)
+
+    def _reset(self):
+        # Node 0 is the root. Per node: child edges, failure link, the keyword
+        # ending there (if any) and the nearest keyword-ending failure ancestor.
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]
+        self._dict_link: List[int] = [0]
+        self._keywords: Dict[str, int] = {}
+        self._removed = 0
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._keywords
+
+    def _insert(self, keyword: str):
+        node = 0
+        for char in keyword:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._dict_link.append(0)
+                self._goto[node][char] = child
+            node = child
+
+        self._output[node] = keyword
+        self._keywords[keyword] = node
+
+    def add(self, keyword: str) -> bool:
+        """Insert a keyword. Returns False if it was already present"""
+        with self._lock:
+            if not keyword or keyword in self._keywords:
+                return False
+
+            self._insert(keyword)
+            self._dirty = True
+            return True
+
+    def remove(self, keyword: str) -> bool:
+        """Unregister a keyword. Returns False if it was not present"""
+        with self._lock:
+            node = self._keywords.pop(keyword, None)
+            if node is None:
+                return False
+
+            self._output[node] = None
+            self._removed += 1
+            self._dirty = True
+            return True
+
+    def _build(self):
+        """Recompute failure and dictionary links breadth-first"""
+        if self._removed > len(self._keywords):
+            keywords = list(self._keywords)
+            self._reset()
+            for keyword in keywords:
+                self._insert(keyword)
+
+        queue = list(self._goto[0].values())
+        for child in queue:
+            self._fail[child] = 0
+            self._dict_link[child] = 0
+
+        for node in queue:
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+
+                self._fail[child] = fail
+                self._dict_link[child] = (
+                    fail if self._output[fail] is not None else self._dict_link[fail]
+                )
+                queue.append(child)
+
+        self._dirty = False
+
+    def _scan(self, text: str) -> Iterator[Tuple[int, str]]:
+        goto, fail, output, dict_link = (
+            self._goto,
+            self._fail,
+            self._output,
+            self._dict_link,
+        )
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            match = node if output[node] is not None else dict_link[node]
+            while match:
+                yield end, output[match]
+                match = dict_link[match]
+
+    def search(self, text: str, whole_words: bool = True) -> Iterator[Tuple[int, str]]:
+        """Yield (start, keyword) for every keyword occurrence in `text`
+
+        `text` should already be normalized the same way as the keywords
+        (e.g. case-folded). With `whole_words`, "ai" does not match "said".
+        """
+        with self._lock:
+            if self._dirty:
+                self._build()
+            matches = list(self._scan(text))
+
+        for end, keyword in matches:
+            start = end - len(keyword) + 1
+            if whole_words:
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if end + 1 < len(text) and _is_word_char(text[end + 1]):
+                    continue
+            yield start, keyword
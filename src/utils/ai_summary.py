@@ -0,0 +1,122 @@
+"""
+AI Summary - Background NewsGetter -> NewsParser -> NewsSummarizer pipeline
+
+Fetching the full article page and running it through the summarization
+model takes seconds, far too long to hold up a reply. Articles are therefore
+sent straight away with their RSS summary, and premium users' messages are
+edited to add the AI summary once `summarize` returns one.
+
+Summaries are cached per article and concurrent requests for the same
+article share one pipeline run, so a story sent to many users is only
+summarized once. A run that outlives `timeout` keeps going in the
+background and fills the cache, but the waiting message is left as is.
+The cache is locked: `ingest` runs on fetcher threads.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, Optional
+
+from src.getter.newsGetter import NewsGetter, NewsGetterError
+from src.parser.newsParser import NewsParser, NewsParserError
+from src.source.newsSourceFetcher import FeedDelta
+from src.summarizer.newsSummarizer import NewsSummarizer, NewsSummarizerError
+
+logger = logging.getLogger(__name__)
+
+# Shorter pages are usually paywalls or cookie banners, not articles
+MIN_ARTICLE_LENGTH = 100
+
+
+class AISummaryService:
+    def __init__(
+        self,
+        summarizer: NewsSummarizer,
+        parser: NewsParser,
+        executor: Optional[Executor] = None,
+        timeout: float = 30.0,
+        max_entries: int = 5_000,
+    ):
+        self.summarizer = summarizer
+        self.parser = parser
+        self.executor = executor
+        self.timeout = timeout
+        self.max_entries = max_entries
+
+        self._cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _run_pipeline(self, link: str) -> Optional[str]:
+        """Fetch, parse and summarize one article page (blocking)"""
+        raw_html = NewsGetter(url=link).fetch_html()
+        full_article = self.parser.parse_article(raw_html)
+
+        if not full_article or len(full_article.strip()) <= MIN_ARTICLE_LENGTH:
+            return None
+        return self.summarizer.summarizer(full_article)
+
+    def _store(self, key: str, summary: Optional[str]):
+        with self._cache_lock:
+            self._cache[key] = summary
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _consume_result(task: asyncio.Future):
+        # Nobody may be waiting on a run that timed out; retrieve its outcome
+        # so a failure is not reported as "exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"AI summary run failed: {task.exception()}")
+
+    async def _summarize(self, key: str, link: str) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        try:
+            summary = await loop.run_in_executor(
+                self.executor, self._run_pipeline, link
+            )
+        except (NewsGetterError, NewsParserError, NewsSummarizerError) as e:
+            logger.warning(f"Could not generate AI summary for {link}: {e}")
+            summary = None
+        except Exception as e:
+            logger.exception(f"AI summary pipeline failed for {link}: {e}")
+            summary = None
+        finally:
+            self._in_flight.pop(key, None)
+
+        self._store(key, summary)
+        return summary
+
+    async def summarize(self, article: Dict) -> Optional[str]:
+        """AI summary of an article, or None if there is none within `timeout`"""
+        link = article.get("link")
+        if not link:
+            return None
+
+        key = article.get("id") or link
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._summarize(key, link))
+            task.add_done_callback(self._consume_result)
+            self._in_flight[key] = task
+
+        try:
+            # Shielded: a timeout gives up waiting, not the shared run
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"AI summary for {link} timed out after {self.timeout}s")
+            return None
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: forget summaries of articles that were edited"""
+        with self._cache_lock:
+            for article in delta.changed:
+                self._cache.pop(article.get("id") or article.get("link"), None)
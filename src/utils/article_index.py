@@ -0,0 +1,193 @@
+"""
+Article Index - In-memory inverted index over every ingested article
+
+Inline queries (`@bot bitcoin`) arrive on every keystroke and must be
+answered from memory, never by fetching feeds. The index is an ingest
+listener: new and edited articles are tokenized once and added to
+token -> article posting sets. A query intersects the posting sets of its
+words (the last word is matched as a prefix, since the user is still typing)
+and filters by the sources and categories the caller may see.
+
+Results are ordered newest ingest first and the index is capped at
+`max_articles`, evicting the articles that were indexed longest ago.
+`QueryCache` keeps recent result lists so paging
+through an inline query or repeating a popular one skips the search.
+"""
+
+import bisect
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Union
+
+from src.source.newsSourceFetcher import FeedDelta
+from src.utils.article_renderer import clean_text
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(clean_text(text).casefold())
+
+
+class ArticleIndex:
+    def __init__(self, max_articles: int = 20_000):
+        self.max_articles = max_articles
+        # article ID -> [sequence, source, category, article, tokens], oldest
+        # ingest first; the sequence orders query results without a full scan
+        self._articles: "OrderedDict[str, list]" = OrderedDict()
+        self._sequence = itertools.count()
+        self._postings: Dict[str, Set[str]] = {}
+        # Sorted vocabulary for prefix lookups, rebuilt lazily after changes
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        # Bumped on every ingest so cached query results never go stale
+        self.version = 0
+        # Ingest runs on fetcher threads, queries on the event loop
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._articles)
+
+    def _remove(self, article_id: str):
+        tokens = self._articles.pop(article_id)[4]
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.discard(article_id)
+                if not posting:
+                    del self._postings[token]
+                    self._vocabulary_dirty = True
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: index new articles and re-index changed ones"""
+        tokenized = []
+        for article in delta.new + delta.changed:
+            if article.get("id"):
+                text = f"{article.get('title', '')} {article.get('summary', '')}"
+                tokenized.append((article, set(tokenize(text))))
+
+        with self._lock:
+            for article in delta.changed:
+                if article.get("id") in self._articles:
+                    self._remove(article["id"])
+
+            # Oldest entries first, so the feed's newest article ends up last
+            for article, tokens in reversed(tokenized):
+                article_id = article["id"]
+                entry = self._articles.get(article_id)
+                if entry is not None:
+                    entry[0] = next(self._sequence)
+                    self._articles.move_to_end(article_id)
+                    continue
+
+                self._articles[article_id] = [
+                    next(self._sequence),
+                    delta.source,
+                    delta.category,
+                    article,
+                    tokens,
+                ]
+                for token in tokens:
+                    posting = self._postings.get(token)
+                    if posting is None:
+                        posting = self._postings[token] = set()
+                        self._vocabulary_dirty = True
+                    posting.add(article_id)
+
+            while len(self._articles) > self.max_articles:
+                self._remove(next(iter(self._articles)))
+            self.version += 1
+
+    def _prefix_matches(self, prefix: str) -> Set[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+
+        matches = set()
+        i = bisect.bisect_left(self._vocabulary, prefix)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(prefix):
+            matches |= self._postings[self._vocabulary[i]]
+            i += 1
+        return matches
+
+    def search(
+        self,
+        query: str,
+        sources: Optional[List[str]] = None,
+        categories: Union[List[str], str] = "all",
+        limit: Optional[int] = None,
+    ) -> List[Dict]:
+        """Articles containing every word of `query`, newest first
+
+        An empty query returns the newest articles. `sources` and
+        `categories` restrict the results ("all" / None for no restriction).
+        """
+        words = tokenize(query)
+        results = []
+
+        with self._lock:
+            candidates: Optional[Set[str]] = None
+            if words:
+                # Rarest posting sets first keeps the intersection small
+                exact = sorted(
+                    (self._postings.get(word, set()) for word in words[:-1]), key=len
+                )
+                for posting in exact + [self._prefix_matches(words[-1])]:
+                    candidates = (
+                        set(posting) if candidates is None else candidates & posting
+                    )
+                    if not candidates:
+                        return []
+
+            if candidates is None:
+                ordered = reversed(self._articles)
+            else:
+                ordered = sorted(
+                    candidates, key=lambda i: self._articles[i][0], reverse=True
+                )
+
+            for article_id in ordered:
+                _, source, category, article, _ = self._articles[article_id]
+                if sources is not None and source not in sources:
+                    continue
+                if categories != "all" and category not in categories:
+                    continue
+
+                results.append(article)
+                if limit is not None and len(results) >= limit:
+                    break
+
+        return results
+
+
+class QueryCache:
+    """Bounded, expiring cache of search results
+
+    Keys should include `ArticleIndex.version`, so an ingest makes earlier
+    results unreachable instead of serving them stale.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+    def get(self, key: tuple) -> Optional[List[Dict]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return results
+
+    def put(self, key: tuple, results: List[Dict]):
+        self._entries[key] = (time.monotonic() + self.ttl, results)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,109 @@
+"""
+Article Renderer - Pre-rendered Markdown message bodies shared across users
+
+Every user who asks for the same article used to pay for string formatting
+and got the raw feed text, whose stray `_`, `*` or `[` broke Telegram's
+Markdown parser. Articles are now rendered once per template variant when a
+feed is ingested, with HTML stripped and Markdown escaped in one place, and
+the send path just prepends its per-message header to the cached body.
+"""
+
+import html
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict
+
+from telegram.helpers import escape_markdown
+
+from src.source.newsSourceFetcher import FeedDelta
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def clean_text(text: str) -> str:
+    """Strip HTML tags and entities and collapse whitespace"""
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", text or ""))).strip()
+
+
+def truncate(text: str, limit: int) -> str:
+    if len(text) > limit:
+        return text[:limit] + "..."
+    return text
+
+
+class ArticleRenderCache:
+    """Markdown bodies keyed by (article ID, template variant)
+
+    Variants differ in how much of the summary they keep:
+    - news: /news messages, 500 character summary, with the publish date
+    - search: /search messages, 400 character summary
+    - compact: blocks of a compact result page, 300 character summary
+    """
+
+    VARIANTS = {"news": 500, "search": 400, "compact": 300}
+    # Titles are cut too, so even fully escaped a body stays far below
+    # Telegram's message limit and is never cut mid-entity when paginated
+    TITLE_LIMIT = 200
+
+    def __init__(self, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[tuple, str]" = OrderedDict()
+        # Ingest runs on fetcher threads, rendering on the event loop
+        self._lock = threading.Lock()
+
+    def _render(self, article: Dict, variant: str) -> str:
+        title = escape_markdown(
+            truncate(clean_text(article.get("title", "")), self.TITLE_LIMIT),
+            version=1,
+        )
+        summary = escape_markdown(
+            truncate(clean_text(article.get("summary", "")), self.VARIANTS[variant]),
+            version=1,
+        )
+        published = escape_markdown(article.get("published", ""), version=1)
+        # A ")" would end the Markdown link early
+        link = article.get("link", "").replace(")", "%29")
+
+        if variant == "compact":
+            text = f"*{title}*\n"
+            if published:
+                text += f"📅 {published}\n"
+            if summary:
+                text += f"{summary}\n"
+            return text + f"[Read more]({link})"
+
+        text = f"*{title}*\n\n"
+        if variant == "news":
+            text += f"📅 {published}\n\n"
+        if summary:
+            text += f"{summary}\n\n"
+        return text + f"[Read more]({link})"
+
+    def render(self, article: Dict, variant: str) -> str:
+        """Cached Markdown body of an article, rendering it on a miss"""
+        key = (article.get("id") or article.get("link", ""), variant)
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+                return text
+
+        text = self._render(article, variant)
+        with self._lock:
+            self._cache[key] = text
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return text
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: pre-render every variant of new and changed articles"""
+        with self._lock:
+            for article in delta.changed:
+                for variant in self.VARIANTS:
+                    self._cache.pop((article.get("id"), variant), None)
+
+        for article in delta.new + delta.changed:
+            for variant in self.VARIANTS:
+                self.render(article, variant)
@@ -0,0 +1,83 @@
+"""
+Compact Delivery - Render a whole result set into as few messages as possible
+
+Instead of one message per article, article blocks are packed into pages of
+at most Telegram's 4096 character limit. The first page is sent right away
+and the rest are kept in `ResultPageCache`, so "next page" buttons are served
+by editing the message from memory rather than fetching feeds again.
+"""
+
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def paginate(
+    blocks: List[str], header: str = "", limit: int = TELEGRAM_MESSAGE_LIMIT
+) -> List[str]:
+    """Pack article blocks into pages, splitting only at the length limit
+
+    A page ends when the next block would push it past `limit`. Room is left
+    for the "Page x/y" footer added by `page_text`. Blocks are never cut
+    mid-line: Markdown entities in rendered articles never span lines, so a
+    block too long for a page loses whole trailing lines instead. Rendered
+    articles are bounded well below a page, so in practice this never fires.
+    """
+    budget = limit - len(header) - 32
+    pages, current, size = [], [], 0
+
+    for block in blocks:
+        if len(block) > budget:
+            lines = block.split("\n")
+            while len(lines) > 1 and len("\n".join(lines)) > budget:
+                lines.pop()
+            block = "\n".join(lines)
+        extra = len(block) + (2 if current else 0)
+        if current and size + extra > budget:
+            pages.append("\n\n".join(current))
+            current, size = [], 0
+            extra = len(block)
+        current.append(block)
+        size += extra
+
+    if current:
+        pages.append("\n\n".join(current))
+
+    return [header + page for page in pages]
+
+
+def page_text(pages: List[str], index: int) -> str:
+    """Text of one page, with a page counter when there is more than one"""
+    if len(pages) == 1:
+        return pages[0]
+    return f"{pages[index]}\n\n📄 Page {index + 1}/{len(pages)}"
+
+
+class ResultPageCache:
+    """Bounded, expiring store of paginated result sets keyed by a token"""
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def put(self, pages: List[str]) -> str:
+        """Store pages and return the token to put in callback data"""
+        token = secrets.token_urlsafe(6)
+        self._entries[token] = (time.monotonic() + self.ttl, pages)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return token
+
+    def get(self, token: str) -> Optional[List[str]]:
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        expires_at, pages = entry
+        if expires_at < time.monotonic():
+            del self._entries[token]
+            return None
+        return pages
@@ -0,0 +1,204 @@
+"""
+Near-Duplicate Detection - MinHash signatures with banded LSH lookup
+
+The same wire story shows up in several feeds with slightly different
+titles and summaries, and a search used to return it once per outlet. Each
+ingested article gets a MinHash signature of its title + summary words: the
+fraction of signature slots two articles share estimates the Jaccard
+similarity of their word sets.
+
+Comparing every new article with every stored one would be quadratic, so
+signatures are cut into `bands` bands and each band is hashed into a bucket
+(locality sensitive hashing). Only articles sharing a bucket in some band
+are compared; with 16 bands of 4 rows, pairs above ~0.5 similarity almost
+always share one, and unrelated pairs almost never do.
+
+Matching articles join one cluster. Result lists are collapsed to one
+representative per cluster, with the other outlets as "also covered by".
+"""
+
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from src.source.newsSourceFetcher import FeedDelta
+from src.utils.article_renderer import clean_text
+
+NUM_PERMUTATIONS = 64
+
+# Too little text and unrelated headlines collide
+MIN_TOKENS = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_RE = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "their this to was were will with".split()
+)
+
+# Fixed seed: signatures must stay comparable across restarts and processes
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+@lru_cache(maxsize=100_000)
+def _token_hash(token: str) -> int:
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def minhash(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of a text's word set, or None if it is too short"""
+    tokens = {
+        token
+        for token in _TOKEN_RE.findall(clean_text(text).casefold())
+        if token not in _STOPWORDS
+    }
+    if len(tokens) < MIN_TOKENS:
+        return None
+
+    hashes = [_token_hash(token) for token in tokens]
+    return tuple(
+        min((a * value + b) % _MERSENNE_PRIME for value in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def similarity(signature: Tuple[int, ...], other: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the word sets behind two signatures"""
+    return sum(x == y for x, y in zip(signature, other)) / len(signature)
+
+
+class NearDuplicateIndex:
+    def __init__(
+        self, threshold: float = 0.5, bands: int = 16, max_articles: int = 50_000
+    ):
+        if NUM_PERMUTATIONS % bands:
+            raise ValueError(f"bands must divide {NUM_PERMUTATIONS}")
+
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_PERMUTATIONS // bands
+        self.max_articles = max_articles
+
+        # article ID -> (source, article, signature, cluster ID)
+        self._articles: "OrderedDict[str, tuple]" = OrderedDict()
+        # (band number, band rows) -> article IDs
+        self._buckets: Dict[Tuple[int, tuple], set] = {}
+        # cluster ID -> member article IDs, in ingest order
+        self._clusters: Dict[str, List[str]] = {}
+        # Ingest runs on fetcher threads, lookups on the event loop
+        self._lock = threading.Lock()
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, tuple]]:
+        return [
+            (band, signature[band * self.rows : (band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    def _nearest(self, signature: Tuple[int, ...]) -> Optional[str]:
+        """Most similar stored article at or above the threshold, if any"""
+        best, best_similarity = None, self.threshold
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+
+        for article_id in candidates:
+            score = similarity(signature, self._articles[article_id][2])
+            if score >= best_similarity:
+                best, best_similarity = article_id, score
+        return best
+
+    def _remove(self, article_id: str):
+        _, _, signature, cluster_id = self._articles.pop(article_id)
+        if signature is not None:
+            for key in self._band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(article_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+        members = self._clusters.get(cluster_id)
+        if members is not None:
+            members.remove(article_id)
+            if not members:
+                del self._clusters[cluster_id]
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: sign new and changed articles and cluster them"""
+        signatures = []
+        for article in delta.new + delta.changed:
+            if article.get("id"):
+                text = f"{article.get('title', '')} {article.get('summary', '')}"
+                signatures.append((article, minhash(text)))
+
+        with self._lock:
+            # Edited articles are re-clustered from scratch
+            for article in delta.changed:
+                if article.get("id") in self._articles:
+                    self._remove(article["id"])
+
+            for article, signature in signatures:
+                article_id = article["id"]
+                if article_id in self._articles:
+                    self._articles.move_to_end(article_id)
+                    continue
+
+                cluster_id = article_id
+                if signature is not None:
+                    nearest = self._nearest(signature)
+                    if nearest is not None:
+                        cluster_id = self._articles[nearest][3]
+                    for key in self._band_keys(signature):
+                        self._buckets.setdefault(key, set()).add(article_id)
+
+                self._articles[article_id] = (
+                    delta.source,
+                    article,
+                    signature,
+                    cluster_id,
+                )
+                self._clusters.setdefault(cluster_id, []).append(article_id)
+
+            while len(self._articles) > self.max_articles:
+                self._remove(next(iter(self._articles)))
+
+    def cluster_of(self, article: Dict) -> str:
+        """Cluster ID of an article (its own ID if it has no duplicates)"""
+        article_id = article.get("id") or article.get("link", "")
+        with self._lock:
+            entry = self._articles.get(article_id)
+            return entry[3] if entry is not None else article_id
+
+    def collapse(
+        self, results: List[Tuple[str, Dict]]
+    ) -> List[Tuple[str, Dict, List[Tuple[str, Dict]]]]:
+        """Keep the first (source, article) of each cluster, in order
+
+        Returns (source, article, also_covered) where `also_covered` lists
+        one (source, article) per other outlet that ran the same story.
+        """
+        collapsed, seen = [], set()
+        for source, article in results:
+            cluster_id = self.cluster_of(article)
+            if cluster_id in seen:
+                continue
+            seen.add(cluster_id)
+
+            also_covered, sources = [], {source}
+            with self._lock:
+                for member_id in self._clusters.get(cluster_id, ()):
+                    member_source, member, _, _ = self._articles[member_id]
+                    if member_source not in sources:
+                        sources.add(member_source)
+                        also_covered.append((member_source, member))
+            collapsed.append((source, article, also_covered))
+        return collapsed
@@ -0,0 +1,91 @@
+"""
+Feed Poller - Keeps every feed fresh on its own adaptive schedule
+
+Feeds used to be fetched whenever a user asked for them, so busy feeds were
+re-read for every request while quiet ones served whatever was last read.
+The poller refreshes each distinct feed URL in the background when its
+`FeedSchedule` says it is due: fast feeds every few minutes, slow ones a
+few times a day. Reads between polls are served from the fetcher's cache.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Dict, Optional
+
+from src.source.newsSourceFetcher import NewsSourceFetcher, NewsSourceFetcherError
+
+logger = logging.getLogger(__name__)
+
+
+class FeedPoller:
+    def __init__(
+        self,
+        source_fetcher: NewsSourceFetcher,
+        executor: Optional[Executor] = None,
+        concurrency: int = 8,
+        max_sleep: float = 60.0,
+    ):
+        self.source_fetcher = source_fetcher
+        self.executor = executor
+        self.concurrency = concurrency
+        # Upper bound on one sleep, so the loop notices feeds fetched on demand
+        self.max_sleep = max_sleep
+
+        self._task: Optional[asyncio.Task] = None
+        self._polls: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for task in list(self._polls.values()):
+            task.cancel()
+        await asyncio.gather(*self._polls.values(), return_exceptions=True)
+
+    async def _poll(self, url: str):
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            try:
+                new_items = await loop.run_in_executor(
+                    self.executor, self.source_fetcher.refresh_feed, url
+                )
+            except NewsSourceFetcherError as e:
+                # The fetcher has already backed the schedule off
+                logger.warning(f"Polling {url} failed: {e}")
+                return
+            except Exception as e:
+                # Anything else would leave the feed due and re-polled at once
+                logger.exception(f"Polling {url} failed unexpectedly: {e}")
+                self.source_fetcher.schedule(url).failed(time.time())
+                return
+
+        interval = self.source_fetcher.schedule(url).interval
+        logger.debug(f"Polled {url}: {new_items} new, next in {interval:.0f}s")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # A hanging feed must not hold up the others
+            for url in self.source_fetcher.due_feeds():
+                if url not in self._polls:
+                    task = loop.create_task(self._poll(url))
+                    self._polls[url] = task
+                    task.add_done_callback(
+                        lambda _, url=url: self._polls.pop(url, None)
+                    )
+
+            delay = self.source_fetcher.next_poll_time() - time.time()
+            await asyncio.sleep(min(max(delay, 1.0), self.max_sleep))
@@ -0,0 +1,83 @@
+"""
+Event Loop Lag Monitor - Measures how long the asyncio loop is blocked
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopLagMonitor:
+    """Sleeps for `interval` in a loop and records how late each wake-up is
+
+    If a handler runs blocking code on the event loop, every other coroutine -
+    including this one - wakes up late by roughly that long. The lag samples
+    are kept in a bounded window so `stats()` can report p50/p99/max, and any
+    single stall above `warn_threshold` seconds is logged.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        warn_threshold: float = 0.05,
+        window: int = 3000,
+        report_every: float = 300.0,
+    ):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.report_every = report_every
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_report = loop.time()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            lag = max(0.0, now - expected)
+
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.warn_threshold:
+                logger.warning(f"Event loop blocked for {lag * 1000:.1f} ms")
+
+            if self.report_every and now - last_report >= self.report_every:
+                last_report = now
+                logger.info(f"Event loop lag: {self.stats()}")
+
+    def start(self):
+        """Start sampling on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        """Lag percentiles in milliseconds over the sample window"""
+        if not self.samples:
+            return {"samples": 0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        ordered = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+        return {
+            "samples": len(ordered),
+            "p50_ms": round(percentile(0.50), 3),
+            "p99_ms": round(percentile(0.99), 3),
+            "max_ms": round(self.max_lag * 1000, 3),
+        }
@@ -0,0 +1,228 @@
+"""
+Message Scheduler - Outbound send queue that respects Telegram flood limits
+
+Telegram allows roughly 30 messages per second per bot and about one message
+per second per chat (with short bursts). Sending articles back-to-back from
+every handler blows through both and earns 429s. Handlers instead hand their
+sends to this scheduler, which paces them globally and per chat, lets premium
+users jump the queue, and retries 429s after the `retry_after` Telegram asks
+for.
+"""
+
+import asyncio
+import itertools
+import logging
+from collections import OrderedDict, deque
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional
+
+from telegram.error import RetryAfter
+
+from src.utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_PREMIUM = 0
+PRIORITY_FREE = 1
+
+
+class MessageSchedulerError(Exception):
+    """Gets raised when a message could not be delivered"""
+
+    pass
+
+
+class _SendJob:
+    __slots__ = ("chat_id", "send_func", "future", "attempts")
+
+    def __init__(self, chat_id: int, send_func: Callable[[], Awaitable], future):
+        self.chat_id = chat_id
+        self.send_func = send_func
+        self.future = future
+        self.attempts = 0
+
+
+class MessageScheduler:
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_retries: int = 3,
+        max_chats: int = 50_000,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        # Only the head message of each chat sits in the priority queue; the
+        # rest wait here in FIFO order so a chat's messages never overtake.
+        self._chat_backlog = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._paused_until = 0.0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._in_flight = set()
+        # Jobs waiting on their chat's pace, with the timer that re-queues them
+        self._parked = {}
+
+    def start(self):
+        """Start the dispatcher on the running event loop"""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._queue = asyncio.PriorityQueue()
+            self._chat_backlog = {}
+            self._parked = {}
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def stop(self):
+        """Stop dispatching and fail every message not yet delivered
+
+        Sends in flight are cancelled; whoever awaits a queued, parked or
+        cancelled message gets a MessageSchedulerError instead of waiting
+        forever.
+        """
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+        in_flight = list(self._in_flight)
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+
+        pending = []
+        for handle, job in self._parked.values():
+            handle.cancel()
+            pending.append(job)
+        self._parked.clear()
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait()[2])
+        for backlog in self._chat_backlog.values():
+            pending.extend(job for _, _, job in backlog)
+        self._chat_backlog.clear()
+
+        for job in pending:
+            if not job.future.done():
+                job.future.set_exception(MessageSchedulerError("Scheduler stopped"))
+
+    def send(
+        self,
+        chat_id: int,
+        send_func: Callable[[], Awaitable],
+        priority: int = PRIORITY_FREE,
+    ) -> "asyncio.Future":
+        """Queue `send_func` (e.g. a reply_text call) for paced delivery
+
+        Returns a future resolving to whatever `send_func` returns. Messages
+        to the same chat are delivered in the order they were queued.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._sequence), _SendJob(chat_id, send_func, future))
+
+        backlog = self._chat_backlog.get(chat_id)
+        if backlog is None:
+            self._chat_backlog[chat_id] = deque()
+            self._put(*entry)
+        else:
+            backlog.append(entry)
+        return future
+
+    def _advance(self, chat_id: int):
+        """Promote the chat's next waiting message into the priority queue"""
+        backlog = self._chat_backlog.get(chat_id)
+        if backlog:
+            self._put(*backlog.popleft())
+        else:
+            self._chat_backlog.pop(chat_id, None)
+
+    def _put(self, priority: int, sequence: int, job: _SendJob):
+        self._queue.put_nowait((priority, sequence, job))
+
+    def _park(self, delay: float, priority: int, sequence: int, job: _SendJob):
+        """Re-queue the job after `delay` seconds, tracked so stop() sees it"""
+
+        def unpark():
+            del self._parked[sequence]
+            self._put(priority, sequence, job)
+
+        handle = asyncio.get_running_loop().call_later(delay, unpark)
+        self._parked[sequence] = (handle, job)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+            if len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            priority, sequence, job = await self._queue.get()
+
+            # Telegram told us to back off - hold everything until then
+            if self._paused_until > loop.time():
+                await asyncio.sleep(self._paused_until - loop.time())
+
+            # Chat is over its pace: park the job without holding up others
+            bucket = self._chat_bucket(job.chat_id)
+            if not bucket.consume(1):
+                self._park(bucket.retry_after(1), priority, sequence, job)
+                continue
+
+            while not self.global_bucket.consume(1):
+                await asyncio.sleep(self.global_bucket.retry_after(1))
+
+            # The chat's next message is promoted by _deliver once this one
+            # is delivered or given up on, so a chat has one send in flight
+            task = loop.create_task(self._deliver(priority, sequence, job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _deliver(self, priority: int, sequence: int, job: _SendJob):
+        job.attempts += 1
+        retrying = False
+        try:
+            result = await job.send_func()
+        except RetryAfter as e:
+            delay = e.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+
+            if job.attempts <= self.max_retries:
+                logger.warning(f"Flood limit hit, retrying in {delay}s")
+                loop = asyncio.get_running_loop()
+                self._paused_until = max(self._paused_until, loop.time() + delay)
+                # Still the head of its chat: the rest of the chat waits
+                self._put(priority, sequence, job)
+                retrying = True
+                return
+
+            if not job.future.done():
+                job.future.set_exception(
+                    MessageSchedulerError(f"Gave up after {job.attempts} attempts: {e}")
+                )
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            # Also runs when the send is cancelled, so the chat never wedges
+            if not retrying:
+                if not job.future.done():
+                    job.future.set_exception(MessageSchedulerError("Send cancelled"))
+                self._advance(job.chat_id)
@@ -0,0 +1,684 @@
+"""
+Notifications - Scheduled digests and keyword alerts pushed to subscribers
+
+Users subscribe to a source/category digest at an hour of the day (UTC) with
+/digest. Subscriptions live in `DigestStore`, which keeps them indexed by
+(source, category, hour) group as well as by user.
+
+Once an hour `DigestDispatcher` takes every group due at that hour, fetches
+and renders its feed once - plus AI summaries once, if any subscriber is
+premium - and fans the finished message out to the group's subscribers
+through the flood-limit aware `MessageScheduler`. Delivering to 50k users
+therefore costs one feed read per distinct group, not one per user.
+
+Keyword alerts (/alert bitcoin) live in `AlertStore`, which compiles every
+registered keyword into one Aho-Corasick automaton. `KeywordAlertEngine` is
+an ingest listener: each batch of newly seen articles goes through the
+automaton in a single pass, and matches are queued per user and sent as one
+message per user every `flush_interval` seconds.
+"""
+
+import asyncio
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from telegram.error import Forbidden
+from telegram.helpers import escape_markdown
+
+from src.source.newsSourceFetcher import FeedDelta
+from src.subscription.journal import SubscriptionJournal
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.article_renderer import clean_text, truncate
+from src.utils.compact_delivery import paginate
+from src.utils.message_scheduler import PRIORITY_FREE, PRIORITY_PREMIUM
+
+logger = logging.getLogger(__name__)
+
+DigestGroup = Tuple[str, str, int]
+
+
+class DigestError(Exception):
+    """Gets raised when a digest subscription is invalid"""
+
+    pass
+
+
+class AlertError(Exception):
+    """Gets raised when an alert keyword is invalid"""
+
+    pass
+
+
+MIN_KEYWORD_LENGTH = 2
+MAX_KEYWORD_LENGTH = 50
+
+
+def normalize_keyword(keyword: str) -> str:
+    """Case-fold and collapse whitespace, as article text is before matching"""
+    return " ".join(keyword.casefold().split())
+
+
+class _RecordStore:
+    """Per-user records, persisted as a snapshot plus append-only journal
+
+    Changes are rare next to deliveries, so they are written through: each
+    one appends the user's full record to the journal and fsyncs it. The
+    journal is folded into the snapshot once it grows past
+    `compact_threshold` bytes. Subclasses keep their lookup indexes in step
+    through `_index_user` / `_unindex_user`.
+    """
+
+    def __init__(self, db_path: str, compact_threshold: int = 1024 * 1024):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True)
+        self.compact_threshold = compact_threshold
+        self.journal = SubscriptionJournal(self.db_path.with_suffix(".journal"))
+        self._lock = threading.Lock()
+        # One compaction at a time: they share the rotated segment and tmp file
+        self._compact_lock = threading.Lock()
+
+        self.records: Dict[str, Dict] = self._load()
+        for user_id, record in self.records.items():
+            self._index_user(user_id, record)
+
+        if self.journal.has_rotated():
+            self.compact()
+
+    def _load(self) -> Dict:
+        records = {}
+        if self.db_path.exists():
+            try:
+                with open(self.db_path, "r") as f:
+                    records = json.load(f)
+            except json.JSONDecodeError:
+                records = {}
+
+        for user_id, record in self.journal.replay():
+            if record is None:
+                records.pop(user_id, None)
+            else:
+                records[user_id] = record
+        return records
+
+    def _index_user(self, user_id: str, record: Dict):
+        pass
+
+    def _unindex_user(self, user_id: str, record: Dict):
+        pass
+
+    def _is_empty(self, record: Dict) -> bool:
+        return False
+
+    def _write(self, user_id: str, record: Optional[Dict]):
+        """Replace a user's record in memory, the indexes and the journal"""
+        old_record = self.records.get(user_id)
+        if old_record is not None:
+            self._unindex_user(user_id, old_record)
+
+        if record is None or self._is_empty(record):
+            record = None
+            self.records.pop(user_id, None)
+        else:
+            self.records[user_id] = record
+            self._index_user(user_id, record)
+
+        self.journal.append(user_id, record)
+        self.journal.sync()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and start a new journal"""
+        with self._compact_lock:
+            with self._lock:
+                data = json.dumps(self.records)
+                self.journal.rotate()
+
+            tmp_path = self.db_path.with_name(self.db_path.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.db_path)
+            self.journal.discard_rotated()
+
+    def _maybe_compact(self):
+        with self._lock:
+            journal_size = self.journal.size()
+        if journal_size >= self.compact_threshold:
+            self.compact()
+
+    def close(self):
+        with self._lock:
+            self.journal.close()
+
+
+class DigestStore(_RecordStore):
+    """Digest subscriptions, indexed by (source, category, hour) group
+
+    Records look like {"chat_id": int, "digests": [[source, category, hour]]}.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data/digests.json",
+        compact_threshold: int = 1024 * 1024,
+    ):
+        # (source, category, hour) -> {user_id: chat_id}
+        self._groups: Dict[DigestGroup, Dict[str, int]] = {}
+        super().__init__(db_path, compact_threshold)
+
+    def _index_user(self, user_id: str, record: Dict):
+        for source, category, hour in record["digests"]:
+            group = self._groups.setdefault((source, category, hour), {})
+            group[user_id] = record["chat_id"]
+
+    def _unindex_user(self, user_id: str, record: Dict):
+        for source, category, hour in record["digests"]:
+            group = self._groups.get((source, category, hour))
+            if group is not None:
+                group.pop(user_id, None)
+                if not group:
+                    del self._groups[(source, category, hour)]
+
+    def _is_empty(self, record: Dict) -> bool:
+        return not record["digests"]
+
+    def subscribe(
+        self, user_id: int, chat_id: int, source: str, category: str, hour: int
+    ) -> bool:
+        """Add a digest. Returns False if the user already has it"""
+        if not 0 <= hour <= 23:
+            raise DigestError("Hour must be between 0 and 23")
+
+        user_id = str(user_id)
+        digest = [source.lower(), category.lower(), hour]
+        with self._lock:
+            record = self.records.get(user_id)
+            digests = list(record["digests"]) if record else []
+            if digest in digests:
+                return False
+            self._write(user_id, {"chat_id": chat_id, "digests": digests + [digest]})
+        self._maybe_compact()
+        return True
+
+    def unsubscribe(
+        self,
+        user_id: int,
+        source: Optional[str] = None,
+        category: Optional[str] = None,
+    ) -> int:
+        """Remove a user's digests matching source/category (all if omitted)
+
+        Returns how many digests were removed.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            record = self.records.get(user_id)
+            if record is None:
+                return 0
+
+            kept = [
+                digest
+                for digest in record["digests"]
+                if (source and digest[0] != source.lower())
+                or (category and digest[1] != category.lower())
+            ]
+            removed = len(record["digests"]) - len(kept)
+            if removed:
+                self._write(user_id, {"chat_id": record["chat_id"], "digests": kept})
+        self._maybe_compact()
+        return removed
+
+    def get_user_digests(self, user_id: int) -> List[DigestGroup]:
+        with self._lock:
+            record = self.records.get(str(user_id))
+            if record is None:
+                return []
+            return [tuple(digest) for digest in record["digests"]]
+
+    def groups_for_hour(self, hour: int) -> Dict[DigestGroup, Dict[str, int]]:
+        """Snapshot of the groups due at `hour`, with their subscribers"""
+        with self._lock:
+            return {
+                group: dict(subscribers)
+                for group, subscribers in self._groups.items()
+                if group[2] == hour
+            }
+
+
+class DigestDispatcher:
+    def __init__(
+        self,
+        store: DigestStore,
+        subscription_manager,
+        source_fetcher,
+        render_cache,
+        message_scheduler,
+        ai_summaries=None,
+        executor=None,
+        max_articles: int = 5,
+        group_concurrency: int = 8,
+    ):
+        self.store = store
+        self.subscription_manager = subscription_manager
+        self.source_fetcher = source_fetcher
+        self.render_cache = render_cache
+        self.message_scheduler = message_scheduler
+        self.ai_summaries = ai_summaries
+        self.executor = executor
+        self.max_articles = max_articles
+        self.group_concurrency = group_concurrency
+
+        self.bot = None
+        self._task: Optional[asyncio.Task] = None
+        self._dispatches: Set[asyncio.Task] = set()
+
+    def start(self, bot):
+        """Start the hourly loop; `bot` is the telegram.Bot to send with"""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for task in list(self._dispatches):
+            task.cancel()
+        await asyncio.gather(*self._dispatches, return_exceptions=True)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = time.time()
+            next_hour = (int(now // 3600) + 1) * 3600
+            await asyncio.sleep(next_hour - now)
+
+            # A slow dispatch must not make the loop miss the next hour
+            task = loop.create_task(self.dispatch(time.gmtime(next_hour).tm_hour))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    def _recipients(
+        self,
+        source: str,
+        category: str,
+        subscribers: Dict[str, int],
+        premium: Set[str],
+    ):
+        """(user_id, chat_id, tier) of subscribers whose tier allows the feed
+
+        Tiers come from `premium`, the users with an active subscription, so
+        no per-subscriber store lookup (which would create missing records)
+        is made.
+        """
+        allowed = {
+            tier: self.subscription_manager.tier_allows(tier, source, category)
+            for tier in ("free", "premium")
+        }
+        recipients = []
+        for user_id, chat_id in subscribers.items():
+            tier = "premium" if user_id in premium else "free"
+            if allowed[tier]:
+                recipients.append((user_id, chat_id, tier))
+        return recipients
+
+    async def _render(self, source: str, category: str, articles: List[Dict], ai):
+        """Digest message for a group, with AI summaries if `ai` is set"""
+        summaries = [None] * len(articles)
+        if ai and self.ai_summaries is not None:
+            summaries = await asyncio.gather(
+                *(self.ai_summaries.summarize(article) for article in articles)
+            )
+
+        blocks = []
+        for i, (article, summary) in enumerate(zip(articles, summaries), 1):
+            block = f"{i}. " + self.render_cache.render(article, "compact")
+            if summary:
+                summary = escape_markdown(truncate(clean_text(summary), 300), version=1)
+                block += f"\n🤖 {summary}"
+            blocks.append(block)
+
+        header = f"🗞 *{source.upper()} - {category} digest*\n\n"
+        return paginate(blocks, header)[0]
+
+    async def _dispatch_group(
+        self, group: DigestGroup, subscribers: Dict[str, int], premium: Set[str]
+    ):
+        source, category, hour = group
+
+        recipients = self._recipients(source, category, subscribers, premium)
+        if not recipients:
+            return 0, 0
+
+        loop = asyncio.get_running_loop()
+        articles = await loop.run_in_executor(
+            self.executor,
+            functools.partial(
+                self.source_fetcher.fetch_news_articles,
+                source,
+                category,
+                max_articles=self.max_articles,
+            ),
+        )
+        if not articles:
+            return 0, 0
+
+        texts = {"free": await self._render(source, category, articles, ai=False)}
+        premium = any(tier == "premium" for _, _, tier in recipients)
+        if premium:
+            texts["premium"] = await self._render(source, category, articles, ai=True)
+
+        sends = []
+        for user_id, chat_id, tier in recipients:
+            send = functools.partial(
+                self.bot.send_message,
+                chat_id,
+                texts.get(tier, texts["free"]),
+                parse_mode="Markdown",
+                disable_web_page_preview=True,
+            )
+            priority = PRIORITY_PREMIUM if tier == "premium" else PRIORITY_FREE
+            sends.append(self.message_scheduler.send(chat_id, send, priority))
+
+        failed = 0
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for (user_id, _, _), result in zip(recipients, results):
+            if isinstance(result, Forbidden):
+                # The user blocked the bot - stop sending them digests
+                await asyncio.to_thread(self.store.unsubscribe, user_id)
+            if isinstance(result, Exception):
+                failed += 1
+
+        return len(recipients) - failed, failed
+
+    async def dispatch(self, hour: int) -> Dict[str, int]:
+        """Deliver every digest due at `hour`; returns delivery counts"""
+        groups = self.store.groups_for_hour(hour)
+        semaphore = asyncio.Semaphore(self.group_concurrency)
+        # Tier checks happen at delivery: a subscription may have lapsed
+        premium = set(
+            await asyncio.to_thread(self.subscription_manager.get_premium_users)
+        )
+
+        async def run(group, subscribers):
+            async with semaphore:
+                try:
+                    return await self._dispatch_group(group, subscribers, premium)
+                except Exception as e:
+                    logger.error(f"Error dispatching digest {group}: {e}")
+                    return 0, len(subscribers)
+
+        results = await asyncio.gather(
+            *(run(group, subscribers) for group, subscribers in groups.items())
+        )
+        stats = {
+            "groups": len(groups),
+            "delivered": sum(delivered for delivered, _ in results),
+            "failed": sum(failed for _, failed in results),
+        }
+        logger.info(f"Digests for {hour:02d}:00 UTC: {stats}")
+        return stats
+
+
+class AlertStore(_RecordStore):
+    """Keyword alerts, indexed by keyword and compiled into one automaton
+
+    Records look like {"chat_id": int, "keywords": [keyword]}. A keyword is
+    added to the automaton when its first subscriber registers it and
+    removed when its last one drops it.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "data/alerts.json",
+        compact_threshold: int = 1024 * 1024,
+    ):
+        self.automaton = AhoCorasick()
+        # keyword -> {user_id: chat_id}
+        self._subscribers: Dict[str, Dict[str, int]] = {}
+        super().__init__(db_path, compact_threshold)
+
+    def _index_user(self, user_id: str, record: Dict):
+        for keyword in record["keywords"]:
+            subscribers = self._subscribers.get(keyword)
+            if subscribers is None:
+                subscribers = self._subscribers[keyword] = {}
+                self.automaton.add(keyword)
+            subscribers[user_id] = record["chat_id"]
+
+    def _unindex_user(self, user_id: str, record: Dict):
+        for keyword in record["keywords"]:
+            subscribers = self._subscribers.get(keyword)
+            if subscribers is not None:
+                subscribers.pop(user_id, None)
+                if not subscribers:
+                    del self._subscribers[keyword]
+                    self.automaton.remove(keyword)
+
+    def _is_empty(self, record: Dict) -> bool:
+        return not record["keywords"]
+
+    def add(self, user_id: int, chat_id: int, keyword: str) -> bool:
+        """Register a keyword. Returns False if the user already has it"""
+        keyword = normalize_keyword(keyword)
+        if not MIN_KEYWORD_LENGTH <= len(keyword) <= MAX_KEYWORD_LENGTH:
+            raise AlertError(
+                f"Keywords must be {MIN_KEYWORD_LENGTH}-{MAX_KEYWORD_LENGTH} "
+                "characters long"
+            )
+
+        user_id = str(user_id)
+        with self._lock:
+            record = self.records.get(user_id)
+            keywords = list(record["keywords"]) if record else []
+            if keyword in keywords:
+                return False
+            self._write(user_id, {"chat_id": chat_id, "keywords": keywords + [keyword]})
+        self._maybe_compact()
+        return True
+
+    def remove(self, user_id: int, keyword: Optional[str] = None) -> int:
+        """Drop one of a user's keywords, or all of them. Returns how many"""
+        user_id = str(user_id)
+        with self._lock:
+            record = self.records.get(user_id)
+            if record is None:
+                return 0
+
+            if keyword is None:
+                kept = []
+            else:
+                keyword = normalize_keyword(keyword)
+                kept = [k for k in record["keywords"] if k != keyword]
+            removed = len(record["keywords"]) - len(kept)
+            if removed:
+                self._write(user_id, {"chat_id": record["chat_id"], "keywords": kept})
+        self._maybe_compact()
+        return removed
+
+    def get_user_alerts(self, user_id: int) -> List[str]:
+        with self._lock:
+            record = self.records.get(str(user_id))
+            return list(record["keywords"]) if record else []
+
+    def match(self, texts: List[str]) -> List[Dict[str, Tuple[int, List[str]]]]:
+        """Match normalized texts in one automaton pass
+
+        Returns, per text, {user_id: (chat_id, [matched keywords])}.
+        """
+        # Newlines never occur in keywords and count as word boundaries
+        offsets, position = [], 0
+        for text in texts:
+            offsets.append(position)
+            position += len(text) + 1
+
+        found = [set() for _ in texts]
+        for start, keyword in self.automaton.search("\n".join(texts)):
+            found[bisect.bisect_right(offsets, start) - 1].add(keyword)
+
+        results = []
+        with self._lock:
+            for keywords in found:
+                matches = {}
+                for keyword in sorted(keywords):
+                    for user_id, chat_id in self._subscribers.get(keyword, {}).items():
+                        matches.setdefault(user_id, (chat_id, []))[1].append(keyword)
+                results.append(matches)
+        return results
+
+
+class KeywordAlertEngine:
+    def __init__(
+        self,
+        store: AlertStore,
+        subscription_manager,
+        render_cache,
+        message_scheduler,
+        flush_interval: float = 60.0,
+        max_seen: int = 100_000,
+        max_articles_per_message: int = 5,
+    ):
+        self.store = store
+        self.subscription_manager = subscription_manager
+        self.render_cache = render_cache
+        self.message_scheduler = message_scheduler
+        self.flush_interval = flush_interval
+        self.max_seen = max_seen
+        self.max_articles_per_message = max_articles_per_message
+
+        # An article new to one feed may already be known from another one
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        # user_id -> (chat_id, {article_id: (source, keywords, article)})
+        self._pending: Dict[str, Tuple[int, Dict]] = {}
+        # Ingest runs on fetcher threads, delivery on the event loop
+        self._lock = threading.Lock()
+
+        self.bot = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _unseen(self, articles: List[Dict]) -> List[Dict]:
+        fresh = []
+        with self._lock:
+            for article in articles:
+                article_id = article.get("id") or article.get("link")
+                if not article_id or article_id in self._seen:
+                    continue
+                self._seen[article_id] = None
+                fresh.append(article)
+            while len(self._seen) > self.max_seen:
+                self._seen.popitem(last=False)
+        return fresh
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: match new articles and queue per-user alerts"""
+        if not len(self.store.automaton):
+            return
+        articles = self._unseen(delta.new)
+        # The first read of a feed is its backlog, not news
+        if delta.initial or not articles:
+            return
+
+        texts = [
+            clean_text(f"{a.get('title', '')} {a.get('summary', '')}").casefold()
+            for a in articles
+        ]
+        matches = self.store.match(texts)
+
+        with self._lock:
+            for article, article_matches in zip(articles, matches):
+                article_id = article.get("id") or article.get("link")
+                for user_id, (chat_id, keywords) in article_matches.items():
+                    pending = self._pending.setdefault(user_id, (chat_id, {}))[1]
+                    pending.setdefault(article_id, (delta.source, keywords, article))
+
+    def start(self, bot):
+        """Start sending queued alerts; `bot` is the telegram.Bot to send with"""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error sending keyword alerts: {e}")
+
+    def _render(self, matches: List[Tuple[str, List[str], Dict]]) -> str:
+        blocks = []
+        for source, keywords, article in matches[: self.max_articles_per_message]:
+            tags = escape_markdown(", ".join(keywords), version=1)
+            blocks.append(
+                f"🔑 {tags} · 📰 {source.upper()}\n"
+                + self.render_cache.render(article, "compact")
+            )
+        if len(matches) > self.max_articles_per_message:
+            blocks.append(f"...and {len(matches) - self.max_articles_per_message} more")
+        return paginate(blocks, "🔔 *News Alert*\n\n")[0]
+
+    def _allowed_matches(self, pending: Dict[str, Tuple[int, Dict]]):
+        """(user_id, chat_id, tier, matches) for the sources each tier allows"""
+        deliveries = []
+        for user_id, (chat_id, articles) in pending.items():
+            user_context = self.subscription_manager.get_user_context(user_id)
+            matches = [
+                match
+                for match in articles.values()
+                if user_context.can_access_feature("source", match[0])
+            ]
+            if matches:
+                deliveries.append((user_id, chat_id, user_context.tier, matches))
+        return deliveries
+
+    async def flush(self) -> int:
+        """Send every queued alert, one message per user. Returns how many"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        deliveries = await asyncio.to_thread(self._allowed_matches, pending)
+        sends = []
+        for user_id, chat_id, tier, matches in deliveries:
+            send = functools.partial(
+                self.bot.send_message,
+                chat_id,
+                self._render(matches),
+                parse_mode="Markdown",
+                disable_web_page_preview=True,
+            )
+            priority = PRIORITY_PREMIUM if tier == "premium" else PRIORITY_FREE
+            sends.append(self.message_scheduler.send(chat_id, send, priority))
+
+        delivered = 0
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        for (user_id, _, _, _), result in zip(deliveries, results):
+            if isinstance(result, Forbidden):
+                # The user blocked the bot - drop their alerts
+                await asyncio.to_thread(self.store.remove, user_id)
+            elif not isinstance(result, Exception):
+                delivered += 1
+        return delivered
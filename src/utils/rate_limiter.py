@@ -0,0 +1,151 @@
+"""
+Rate Limiter - Per-user and global token buckets in front of bot handlers
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second refill, up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def consume(self, cost: float = 1, now: Optional[float] = None) -> bool:
+        """Take `cost` tokens if available. Returns False if rate limited"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def refund(self, cost: float = 1):
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+    def retry_after(self, cost: float = 1) -> float:
+        """Seconds until `cost` tokens will be available"""
+        missing = cost - self.tokens
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+
+class RateLimiter:
+    """Tier-aware per-user token buckets plus one global bucket
+
+    Each handler call costs some tokens (a `/search` fans out to every feed,
+    so it costs more than a button tap) and must pass the user's bucket.
+    Calls that reach the upstream feeds must also pass the global bucket,
+    which caps total upstream work no matter how many users are active;
+    cached reads and plain button taps do not spend it. Per-user buckets are
+    kept in an LRU bounded by `max_users` so memory stays flat under abuse
+    from many accounts.
+
+    A limited user is told to slow down at most once per `notice_interval`
+    seconds, so spam does not turn into one outbound message per update.
+
+    The bucket is checked before the user's record is looked up, so a
+    limited update never reaches the store. Until `set_tier` says otherwise
+    a user is charged on the free tier.
+    """
+
+    # tier -> (tokens per second, burst capacity)
+    DEFAULT_TIER_LIMITS: Dict[str, Tuple[float, float]] = {
+        "free": (0.5, 10),
+        "premium": (1.0, 20),
+    }
+
+    def __init__(
+        self,
+        tier_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+        global_rate: float = 20.0,
+        global_burst: float = 40.0,
+        max_users: int = 100_000,
+        notice_interval: float = 10.0,
+    ):
+        self.tier_limits = tier_limits or self.DEFAULT_TIER_LIMITS
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.max_users = max_users
+        self.notice_interval = notice_interval
+        self._buckets: "OrderedDict[str, Tuple[str, TokenBucket]]" = OrderedDict()
+        # user -> when they were last told to slow down
+        self._notified: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _user_bucket(self, user_id: str, tier: Optional[str] = None) -> TokenBucket:
+        entry = self._buckets.get(user_id)
+        if entry is None or (tier is not None and entry[0] != tier):
+            tier = tier or "free"
+            rate, capacity = self.tier_limits.get(tier, self.tier_limits["free"])
+            entry = (tier, TokenBucket(rate, capacity))
+            self._buckets[user_id] = entry
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return entry[1]
+
+    def allow(
+        self,
+        user_id: int,
+        tier: Optional[str] = None,
+        cost: float = 1,
+        upstream: bool = False,
+    ) -> bool:
+        """Check and consume `cost` tokens for a user. False means slow down
+
+        `upstream` calls fetch feeds and also spend the global budget. Without
+        a `tier` the user's last known tier is used.
+        """
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._user_bucket(str(user_id), tier)
+            if not bucket.consume(cost, now):
+                return False
+            if upstream and not self.global_bucket.consume(cost, now):
+                bucket.refund(cost)
+                return False
+            return True
+
+    def retry_after(
+        self,
+        user_id: int,
+        tier: Optional[str] = None,
+        cost: float = 1,
+        upstream: bool = False,
+    ) -> float:
+        """Seconds until the user could make a call of `cost` again"""
+        with self._lock:
+            wait = self._user_bucket(str(user_id), tier).retry_after(cost)
+            if upstream:
+                wait = max(wait, self.global_bucket.retry_after(cost))
+            return wait
+
+    def set_tier(self, user_id: int, tier: str):
+        """Charge the user on `tier` from now on, once their record is known"""
+        with self._lock:
+            self._user_bucket(str(user_id), tier)
+
+    def should_notify(self, user_id: int) -> bool:
+        """Whether a limited user should be told, at most once per interval"""
+        with self._lock:
+            now = time.monotonic()
+            key = str(user_id)
+            last = self._notified.get(key)
+            if last is not None and now - last < self.notice_interval:
+                return False
+            self._notified[key] = now
+            self._notified.move_to_end(key)
+            if len(self._notified) > self.max_users:
+                self._notified.popitem(last=False)
+            return True
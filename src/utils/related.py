@@ -0,0 +1,252 @@
+"""
+Related Articles - TF-IDF vectors over stored articles, cosine top-k lookup
+
+Each new article's title + summary words are hashed into a fixed
+`n_features`-wide sparse vector (the hashing trick, so there is no
+vocabulary to grow). Document frequencies are kept per hashed feature and
+updated as articles come and go, so IDF weights follow the stored corpus.
+
+An ingest only vectorizes its delta: the new and changed articles become one
+small block of binary CSR rows, and the rows they replace (earlier versions,
+or the oldest articles once `max_articles` is reached) are marked dead in
+their block. Blocks are compacted into one once there are more than
+`max_blocks` of them. IDF weights are never baked into the rows; they are
+applied lazily, once per ingest, by the first lookup that needs them. The
+finished block list replaces the previous one in a single assignment, so
+lookups never wait for an ingest.
+
+A "Related" lookup is then one sparse matrix-vector product per block
+(cosine similarity against every stored article) plus an argpartition for
+the top k, a few milliseconds for tens of thousands of articles.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from src.source.newsSourceFetcher import FeedDelta
+from src.utils.trending import terms
+
+
+class _Block:
+    """Rows added by one ingest (or a compaction); only `alive` changes later"""
+
+    __slots__ = ("matrix", "entries", "sources", "categories", "alive")
+
+    def __init__(
+        self,
+        matrix: sparse.csr_matrix,
+        entries: List[Tuple[str, str, Dict]],
+        sources: np.ndarray,
+        categories: np.ndarray,
+    ):
+        self.matrix = matrix
+        self.entries = entries
+        self.sources = sources
+        self.categories = categories
+        self.alive = np.ones(len(entries), dtype=bool)
+
+    def features(self, row: int) -> np.ndarray:
+        return self.matrix.indices[
+            self.matrix.indptr[row] : self.matrix.indptr[row + 1]
+        ]
+
+
+class RelatedArticles:
+    def __init__(
+        self,
+        n_features: int = 1 << 18,
+        max_articles: int = 20_000,
+        min_similarity: float = 0.1,
+        max_blocks: int = 32,
+    ):
+        self.n_features = n_features
+        self.max_articles = max_articles
+        self.min_similarity = min_similarity
+        self.max_blocks = max_blocks
+
+        self._blocks: List[_Block] = []
+        self._row_of: Dict[str, Tuple[_Block, int]] = {}
+        # Stored article ids, oldest first, for eviction
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+        self._document_frequency = np.zeros(n_features, dtype=np.int32)
+
+        # (blocks, row_of, document frequencies) as of the last ingest.
+        # Lookups read only this reference, never the state above
+        self._snapshot: Tuple[Tuple[_Block, ...], Dict, np.ndarray] = (
+            (),
+            {},
+            self._document_frequency.copy(),
+        )
+        # Weights, norms and per-row arrays derived from one snapshot
+        self._view: Optional[Tuple[tuple, tuple]] = None
+        # Serializes ingests, which run on fetcher threads; lookups on the
+        # event loop never take it
+        self._lock = threading.Lock()
+
+    def _hash_features(self, article: Dict) -> np.ndarray:
+        text = f"{article.get('title', '')} {article.get('summary', '')}"
+        return np.unique(
+            np.fromiter(
+                (zlib.crc32(term.encode("utf-8")) for term in terms(text)),
+                dtype=np.int64,
+            )
+            % self.n_features
+        ).astype(np.int32)
+
+    def _release(self, article_id: str):
+        """Mark an article's row dead; it no longer counts in the frequencies"""
+        block, row = self._row_of.pop(article_id)
+        block.alive[row] = False
+        self._document_frequency[block.features(row)] -= 1
+
+    def _add_block(self, source: str, category: str, articles: List[Dict]):
+        features = [self._hash_features(article) for article in articles]
+        lengths = np.fromiter((len(f) for f in features), dtype=np.int64)
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        indices = np.concatenate(features)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=np.float32), indices, indptr),
+            shape=(len(articles), self.n_features),
+        )
+        block = _Block(
+            matrix,
+            [(source, category, article) for article in articles],
+            np.full(len(articles), source, dtype=object),
+            np.full(len(articles), category, dtype=object),
+        )
+        self._blocks.append(block)
+
+        for row, article in enumerate(articles):
+            # An edited article keeps its place in the eviction order
+            self._order.setdefault(article["id"])
+            self._row_of[article["id"]] = (block, row)
+        self._document_frequency[indices] += 1
+
+    def _compact(self):
+        """Merge every block's live rows into one"""
+        live = [(block, np.flatnonzero(block.alive)) for block in self._blocks]
+        block = _Block(
+            sparse.vstack([b.matrix[rows] for b, rows in live], format="csr"),
+            [b.entries[i] for b, rows in live for i in rows],
+            np.concatenate([b.sources[rows] for b, rows in live]),
+            np.concatenate([b.categories[rows] for b, rows in live]),
+        )
+        self._blocks = [block]
+        for row, (_, _, article) in enumerate(block.entries):
+            self._row_of[article["id"]] = (block, row)
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: vectorize new and changed articles"""
+        articles = {a["id"]: a for a in delta.new + delta.changed if a.get("id")}
+        if not articles:
+            return
+
+        with self._lock:
+            # Whatever an article replaces, an earlier version of itself or
+            # (below) the oldest articles, no longer counts
+            for article_id in articles:
+                if article_id in self._row_of:
+                    self._release(article_id)
+            self._add_block(delta.source, delta.category, list(articles.values()))
+            while len(self._order) > self.max_articles:
+                article_id, _ = self._order.popitem(last=False)
+                self._release(article_id)
+
+            if len(self._blocks) > self.max_blocks:
+                self._compact()
+            self._snapshot = (
+                tuple(self._blocks),
+                dict(self._row_of),
+                self._document_frequency.copy(),
+            )
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._snapshot[1]
+
+    def _weighted(self, snapshot: tuple) -> tuple:
+        """Squared IDF weights, row norms and per-row arrays of a snapshot
+
+        Computed by the first lookup after an ingest and reused until the
+        next one.
+        """
+        view = self._view
+        if view is not None and view[0] is snapshot:
+            return view[1]
+
+        blocks, row_of, document_frequency = snapshot
+        idf = np.log((1 + len(row_of)) / (1 + document_frequency)) + 1.0
+        weights = (idf * idf).astype(np.float32)
+        norms = np.sqrt(np.concatenate([b.matrix @ weights for b in blocks]))
+        norms[norms == 0] = 1.0
+        offsets = {
+            id(block): offset
+            for block, offset in zip(
+                blocks, np.cumsum([0] + [len(b.entries) for b in blocks])
+            )
+        }
+        weighted = (
+            weights,
+            norms,
+            offsets,
+            [entry for block in blocks for entry in block.entries],
+            np.concatenate([block.sources for block in blocks]),
+            np.concatenate([block.categories for block in blocks]),
+        )
+        self._view = (snapshot, weighted)
+        return weighted
+
+    def related(
+        self,
+        article_id: str,
+        k: int = 5,
+        sources: Optional[List[str]] = None,
+        categories: Optional[List[str]] = None,
+    ) -> Optional[List[Tuple[str, Dict, float]]]:
+        """Up to k (source, article, similarity) most similar to an article
+
+        Returns None if the article is not stored (never seen or evicted).
+        `sources` and `categories` restrict the results to those feeds.
+        """
+        snapshot = self._snapshot
+        blocks, row_of, _ = snapshot
+        location = row_of.get(article_id)
+        if location is None:
+            return None
+        block, row = location
+        weights, norms, offsets, entries, row_sources, row_categories = self._weighted(
+            snapshot
+        )
+
+        features = block.features(row)
+        query = np.zeros(self.n_features, dtype=np.float32)
+        query[features] = weights[features]
+        query_norm = float(np.sqrt(query.sum())) or 1.0
+
+        scores = np.concatenate([b.matrix @ query for b in blocks]) / (
+            norms * query_norm
+        )
+        scores[~np.concatenate([b.alive for b in blocks])] = 0.0
+        scores[offsets[id(block)] + row] = 0.0
+        if sources is not None:
+            scores[~np.isin(row_sources, sources)] = 0.0
+        if categories is not None:
+            scores[~np.isin(row_categories, categories)] = 0.0
+
+        count = min(k, len(scores))
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for i in top:
+            if scores[i] < self.min_similarity:
+                break
+            source, _, article = entries[i]
+            results.append((source, article, float(scores[i])))
+        return results
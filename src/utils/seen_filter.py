@@ -0,0 +1,95 @@
+"""
+Seen Filter - Which articles each user has already been sent
+
+Pressing the same source/category button twice used to send the same
+articles again, each counted against the daily quota. Remembering exact
+(user, article) pairs grows with every user; instead all pairs go into one
+Bloom filter per day window, whose size is fixed by its capacity however
+many users there are (~1.2 bytes per pair at a 1% error rate).
+
+`windows` filters are kept and the oldest is dropped when a new day starts
+or the current one is full, so an article counts as seen for one to
+`windows` days. A false positive only means one article is skipped.
+"""
+
+import hashlib
+import math
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        # Optimal bit count and number of hashes for the target error rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class SeenArticles:
+    def __init__(
+        self,
+        capacity: int = 2_000_000,
+        error_rate: float = 0.01,
+        windows: int = 2,
+        window_seconds: int = 86_400,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window_seconds = window_seconds
+        # Newest window last
+        self._filters: "deque[BloomFilter]" = deque(maxlen=windows)
+        self._window: Optional[int] = None
+
+    def _current(self, now: Optional[float] = None) -> BloomFilter:
+        window = int((time.time() if now is None else now) // self.window_seconds)
+        if window != self._window or self._filters[-1].full:
+            self._filters.append(BloomFilter(self.capacity, self.error_rate))
+            self._window = window
+        return self._filters[-1]
+
+    def mark(
+        self, user_id: str, article_ids: Iterable[str], now: Optional[float] = None
+    ):
+        """Record articles as sent to a user"""
+        current = self._current(now)
+        for article_id in article_ids:
+            current.add(f"{user_id}:{article_id}")
+
+    def seen(self, user_id: str, article_id: str) -> bool:
+        key = f"{user_id}:{article_id}"
+        return any(key in bloom for bloom in self._filters)
+
+    def unseen(self, user_id: str, articles: List[Dict]) -> List[Dict]:
+        """The articles a user has not been sent yet, in order"""
+        return [
+            article for article in articles if not self.seen(user_id, article["id"])
+        ]
+
+    def memory_bytes(self) -> int:
+        return sum((bloom.size + 7) // 8 for bloom in self._filters)
@@ -0,0 +1,96 @@
+"""
+Top Stories - Latest articles across many feeds, merged from cached lists
+
+`FeedTimeline` is an ingest listener that keeps the current articles of
+every feed sorted newest first by `published_ts` (parsed once at ingest),
+applying each feed delta rather than re-sorting whole feeds on every poll.
+`top` then k-way merges the feeds a user may read with a heap holding one
+cursor per feed: building it costs O(n) for n feeds and every article taken
+O(log n), so the top k cost O(n + k log n) and never touch the network.
+"""
+
+import heapq
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.source.newsSourceFetcher import FeedDelta
+
+Feed = Tuple[str, str]
+
+
+class FeedTimeline:
+    def __init__(self):
+        # (source, category) -> articles, newest first
+        self._feeds: Dict[Feed, List[Dict]] = {}
+        # (source, category) -> {article ID: article}
+        self._articles: Dict[Feed, Dict[str, Dict]] = {}
+        # Ingest runs on fetcher threads, merges on the event loop
+        self._lock = threading.Lock()
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: apply a feed delta and re-sort that feed"""
+        feed = (delta.source, delta.category)
+        with self._lock:
+            articles = self._articles.setdefault(feed, {})
+            for article_id in delta.removed:
+                articles.pop(article_id, None)
+            for article in delta.new + delta.changed:
+                articles[article["id"]] = article
+
+            self._feeds[feed] = sorted(
+                articles.values(),
+                key=lambda article: article.get("published_ts", 0.0),
+                reverse=True,
+            )
+
+    def feeds(self) -> List[Feed]:
+        """Feeds with cached articles"""
+        with self._lock:
+            return list(self._feeds)
+
+    def top(
+        self,
+        k: int,
+        feeds: Iterable[Feed],
+        dedupe_key: Optional[Callable[[Dict], str]] = None,
+    ) -> List[Tuple[str, Dict]]:
+        """Newest k (source, article) pairs across `feeds`
+
+        The same article is often in several feeds of one source (e.g. a
+        "general" and a "world" feed); only its first occurrence is kept.
+        `dedupe_key` widens that to, for instance, near-duplicate clusters.
+        """
+        with self._lock:
+            lists = [
+                (source, self._feeds[(source, category)])
+                for source, category in feeds
+                if self._feeds.get((source, category))
+            ]
+
+        # Max-heap on publish time via negated keys; the feed number breaks
+        # ties so articles themselves are never compared
+        heap = [
+            (-articles[0].get("published_ts", 0.0), feed, 0)
+            for feed, (_, articles) in enumerate(lists)
+        ]
+        heapq.heapify(heap)
+
+        results, seen = [], set()
+        while heap and len(results) < k:
+            _, feed, position = heapq.heappop(heap)
+            source, articles = lists[feed]
+            article = articles[position]
+
+            if position + 1 < len(articles):
+                following = articles[position + 1]
+                heapq.heappush(
+                    heap, (-following.get("published_ts", 0.0), feed, position + 1)
+                )
+
+            key = dedupe_key(article) if dedupe_key else article.get("id")
+            if key in seen:
+                continue
+            seen.add(key)
+            results.append((source, article))
+
+        return results
@@ -0,0 +1,172 @@
+"""
+Trending - Time-decayed term counts over the stream of ingested articles
+
+Counting terms over every cached article on each /trending would cost
+O(articles) per request. Instead every new article's terms are counted once,
+at ingest, in a count-min sketch: `depth` rows of `width` counters, where a
+term adds to one counter per row and its count is estimated by the smallest
+of them. The sketch never grows, however many distinct terms arrive.
+
+Counts decay with a half-life, so a term that was everywhere yesterday
+fades. Rather than decaying every counter over time, each article adds
+2 ** ((published - origin) / half_life) (forward decay); dividing by the
+same factor for "now" at query time gives the decayed count.
+
+The sketch cannot list its terms, so a small heavy-hitters table per scope
+(overall and per source) keeps the `candidates` terms with the highest
+estimates seen so far. /trending sorts one of those tables: its cost does
+not depend on how many articles were ingested.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.source.newsSourceFetcher import FeedDelta
+from src.utils.article_renderer import clean_text
+
+_TERM_RE = re.compile(r"[^\W\d_][\w'-]{2,}")
+_STOPWORDS = frozenset(
+    """
+    about after again against all also amid and any are back been before being
+    between but can could did does doing down during each even first for from
+    further had has have having her here hers him his how into its just last
+    latest live make more most new news not now off once one only other our out
+    over own people said same say says she should since some such than that the
+    their them then there these they this those three through too two under
+    until update very was watch way were what when where which while who whom
+    why will with would year years you your
+    """.split()
+)
+
+# Forward-decay weights are rescaled before they can overflow a float
+_MAX_EXPONENT = 60.0
+
+
+def terms(text: str) -> List[str]:
+    """Distinct lower-case words of a text, minus stopwords, in order"""
+    words = (word.strip("'-") for word in _TERM_RE.findall(clean_text(text).casefold()))
+    return list(dict.fromkeys(word for word in words if word not in _STOPWORDS))
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self._counters = array("d", bytes(8 * width * depth))
+
+    def _cells(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth)
+        digest = digest.digest()
+        return [
+            row * self.width
+            + int.from_bytes(digest[8 * row : 8 * row + 8], "big") % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, key: str, weight: float) -> float:
+        """Add `weight` to a key; returns its new estimate
+
+        Conservative update: counters already above the new estimate are
+        left alone, which keeps collisions from inflating other keys.
+        """
+        cells = self._cells(key)
+        estimate = min(self._counters[cell] for cell in cells) + weight
+        for cell in cells:
+            if self._counters[cell] < estimate:
+                self._counters[cell] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> float:
+        return min(self._counters[cell] for cell in self._cells(key))
+
+    def scale(self, factor: float):
+        for i in range(len(self._counters)):
+            self._counters[i] *= factor
+
+
+class TrendingTerms:
+    def __init__(
+        self,
+        half_life: float = 6 * 3600,
+        candidates: int = 100,
+        width: int = 4096,
+        depth: int = 4,
+        max_seen: int = 50_000,
+    ):
+        self.half_life = half_life
+        self.candidates = candidates
+        self.max_seen = max_seen
+
+        self._sketch = CountMinSketch(width, depth)
+        self._origin = time.time()
+        # scope (None = overall, else source) -> {term: forward-decayed count}
+        self._heavy_hitters: Dict[Optional[str], Dict[str, float]] = {}
+        # One story is often in several feeds of a source; count it once
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        # Ingest runs on fetcher threads, queries on the event loop
+        self._lock = threading.Lock()
+
+    def _weight(self, timestamp: float) -> float:
+        return 2.0 ** ((timestamp - self._origin) / self.half_life)
+
+    def _rescale(self, timestamp: float):
+        """Move the decay origin forward so weights stay small"""
+        factor = 1.0 / self._weight(timestamp)
+        self._sketch.scale(factor)
+        for table in self._heavy_hitters.values():
+            for term in table:
+                table[term] *= factor
+        self._origin = timestamp
+
+    def _offer(self, scope: Optional[str], term: str, estimate: float):
+        table = self._heavy_hitters.setdefault(scope, {})
+        if term in table or len(table) < self.candidates:
+            table[term] = estimate
+            return
+
+        weakest = min(table, key=table.get)
+        if estimate > table[weakest]:
+            del table[weakest]
+            table[term] = estimate
+
+    def ingest(self, delta: FeedDelta):
+        """Ingest listener: count the terms of new articles"""
+        now = time.time()
+        with self._lock:
+            if (now - self._origin) / self.half_life > _MAX_EXPONENT:
+                self._rescale(now)
+
+            for article in delta.new:
+                article_id = article.get("id")
+                if article_id in self._seen:
+                    continue
+                self._seen[article_id] = None
+                if len(self._seen) > self.max_seen:
+                    self._seen.popitem(last=False)
+
+                # Weighted by publish time, so a feed's backlog counts as old
+                published = article.get("published_ts") or now
+                weight = self._weight(min(published, now))
+                text = f"{article.get('title', '')} {article.get('summary', '')}"
+                for term in terms(text):
+                    overall = self._sketch.add(term, weight)
+                    self._offer(None, term, overall)
+                    in_source = self._sketch.add(f"{delta.source}\x1f{term}", weight)
+                    self._offer(delta.source, term, in_source)
+
+    def top(self, k: int = 10, source: Optional[str] = None) -> List[Tuple[str, float]]:
+        """The k most frequent recent terms, overall or in one source
+
+        Counts are decayed article counts: an article published one
+        half-life ago counts 0.5.
+        """
+        with self._lock:
+            table = self._heavy_hitters.get(source, {})
+            ranked = sorted(table.items(), key=lambda item: item[1], reverse=True)
+            now_weight = self._weight(time.time())
+        return [(term, count / now_weight) for term, count in ranked[:k]]
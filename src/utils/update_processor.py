@@ -0,0 +1,83 @@
+"""
+Update Processor - Concurrent update handling that keeps each chat in order
+
+By default PTB handles updates one at a time, so one slow feed fetch stalls
+every other user. Plain `concurrent_updates(True)` fixes that but lets a
+user's second tap race their first: a callback can be answered before the
+/news command that produced its keyboard, or two sends interleave.
+
+`PerChatUpdateProcessor` runs updates of different chats concurrently, up to
+`max_concurrent_updates`, while updates of the same chat run strictly one
+after the other in arrival order. A chat's waiting updates are queued rather
+than parked on a lock, so a user hammering a button occupies one slot, not
+all of them.
+"""
+
+import logging
+from collections import deque
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def ordering_key(update: object) -> Optional[Hashable]:
+    """Chat (or, failing that, user) whose updates must stay in order"""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return ("user", update.effective_user.id)
+    return None
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = 64):
+        super().__init__(max_concurrent_updates)
+        # Chats with an update in progress, mapped to the updates behind it
+        self._backlog: Dict[Hashable, deque] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]):
+        key = ordering_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        backlog = self._backlog.get(key)
+        if backlog is not None:
+            # The chat's current update drains this one when it is done
+            backlog.append(coroutine)
+            return
+
+        backlog = self._backlog[key] = deque([coroutine])
+        try:
+            while backlog:
+                try:
+                    await backlog[0]
+                except Exception as e:
+                    # Application.process_update handles handler errors
+                    # itself; this only guards the rest of the backlog.
+                    logger.error(f"Error processing update for {key}: {e}")
+                finally:
+                    backlog.popleft()
+        finally:
+            del self._backlog[key]
+            # Only left over if the drain was cancelled
+            for pending in backlog:
+                pending.close()
+
+    @property
+    def busy_chats(self) -> int:
+        """Number of chats with an update in progress"""
+        return len(self._backlog)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        # Application.stop() waits for the update tasks, which drain their
+        # chat's backlog before finishing
+        pass
@@ -0,0 +1,186 @@
+"""
+Webhook Server - Minimal HTTP listener that feeds Telegram webhook updates
+into the bot
+
+Long polling adds a round trip to every update and allows only one consumer
+per token. In webhook mode Telegram POSTs each update to us instead. This
+server accepts those POSTs, checks the secret token Telegram echoes back in
+`X-Telegram-Bot-Api-Secret-Token` (it will not start without one, since it
+listens on every interface), and pushes updates onto a queue. Like
+`Application.update_queue`, a dispatcher hands each update to the update
+processor as its own task without waiting for it, so concurrency and
+per-chat ordering are the processor's alone and one slow chat holds up
+nobody else. Once `queue_size` updates are queued or being processed it
+answers 503, and Telegram retries the update later.
+
+Because it is plain HTTP, it can be tested locally by POSTing recorded
+updates:
+
+    curl -X POST localhost:8443/telegram \\
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+         -H "Content-Type: application/json" -d @update.json
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+from typing import Optional, Set
+
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookServerError(Exception):
+    """Gets raised when the webhook server is misconfigured"""
+
+    pass
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        application: Application,
+        secret_token: str,
+        host: str = "0.0.0.0",
+        port: int = 8443,
+        path: str = "/telegram",
+        queue_size: int = 1000,
+    ):
+        if not secret_token:
+            raise WebhookServerError(
+                "A secret token is required, or anyone could post updates"
+            )
+        self.application = application
+        self.secret_token = secret_token.encode("utf-8")
+        self.host = host
+        self.port = port
+        self.path = path
+        self.queue_size = queue_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start listening and dispatching updates"""
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self._dispatcher = asyncio.create_task(
+            self._dispatch(), name="webhook-dispatcher"
+        )
+        logger.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        """Stop accepting updates, finish queued ones and stop dispatching"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        # task_done is called once an update is processed, not dispatched
+        await self.queue.join()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+
+    async def _dispatch(self):
+        while True:
+            update = await self.queue.get()
+            task = asyncio.create_task(self._process(update))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _process(self, update: Update):
+        try:
+            # Go through the update processor so the concurrency cap
+            # and per-chat ordering apply in webhook mode as well
+            await self.application.update_processor.process_update(
+                update, self.application.process_update(update)
+            )
+        except Exception as e:
+            logger.error(f"Error processing webhook update: {e}")
+        finally:
+            self.queue.task_done()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            try:
+                status, body = await self._handle_request(reader)
+            except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                status, body = 400, "Bad Request"
+            except Exception as e:
+                logger.error(f"Error handling webhook request: {e}")
+                status, body = 500, "Internal Server Error"
+
+            payload = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {body}\r\n"
+                "Content-Type: text/plain\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n".encode("ascii")
+                + payload
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader):
+        """Parse one HTTP request and return (status, reason)"""
+        request_line = (await reader.readline()).decode("latin-1").split()
+        if len(request_line) != 3:
+            return 400, "Bad Request"
+        method, target, _ = request_line
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if method == "GET" and target == "/healthz":
+            return 200, "OK"
+        if target != self.path:
+            return 404, "Not Found"
+        if method != "POST":
+            return 405, "Method Not Allowed"
+
+        # Headers were decoded as latin-1, so this round-trips any bytes
+        received = headers.get(SECRET_HEADER, "").encode("latin-1")
+        if not hmac.compare_digest(received, self.secret_token):
+            return 403, "Forbidden"
+
+        length = int(headers.get("content-length", "0"))
+        if length <= 0 or length > MAX_BODY_SIZE:
+            return 400, "Bad Request"
+        data = json.loads(await reader.readexactly(length))
+
+        # Anything that is not a well-formed update is the sender's fault
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (TypeError, AttributeError, KeyError, ValueError):
+            update = None
+        if not isinstance(update, Update) or not isinstance(update.update_id, int):
+            return 400, "Bad Request"
+        try:
+            if len(self._in_flight) + self.queue.qsize() >= self.queue_size:
+                raise asyncio.QueueFull
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logger.warning("Webhook update queue full, asking Telegram to retry")
+            return 503, "Service Unavailable"
+        return 200, "OK"
@@ -2,13 +2,25 @@
 Telegram News Bot with Subscription System
 """
 
+import asyncio
+import functools
 import os
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
+from telegram.helpers import escape_markdown
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
     ContextTypes,
@@ -20,6 +32,36 @@ from src.summarizer.newsSummarizer import NewsSummarizer, NewsSummarizerError
 from src.getter.newsGetter import NewsGetter, NewsGetterError
 from src.parser.newsParser import NewsParser, NewsParserError
 from src.subscription.subscription_manager import SubscriptionManager
+from src.subscription.sqlite_store import SqliteSubscriptionManager
+from src.subscription.user_context import UserContext
+from src.utils.ai_summary import AISummaryService
+from src.utils.article_index import ArticleIndex, QueryCache
+from src.utils.article_renderer import ArticleRenderCache, clean_text, truncate
+from src.utils.compact_delivery import ResultPageCache, paginate, page_text
+from src.utils.dedup import NearDuplicateIndex
+from src.utils.feed_poller import FeedPoller
+from src.utils.loop_monitor import EventLoopLagMonitor
+from src.utils.message_scheduler import (
+    MessageScheduler,
+    PRIORITY_FREE,
+    PRIORITY_PREMIUM,
+)
+from src.utils.notifications import (
+    AlertError,
+    AlertStore,
+    DigestDispatcher,
+    DigestError,
+    DigestStore,
+    KeywordAlertEngine,
+    normalize_keyword,
+)
+from src.utils.rate_limiter import RateLimiter
+from src.utils.related import RelatedArticles
+from src.utils.seen_filter import SeenArticles
+from src.utils.top_stories import FeedTimeline
+from src.utils.trending import TrendingTerms
+from src.utils.update_processor import PerChatUpdateProcessor
+from src.utils.webhook_server import WebhookServer
 
 # Load environment variables
 load_dotenv()
@@ -32,11 +74,108 @@ logger = logging.getLogger(__name__)
 
 
 class TelegramNewsBot:
+    # Inline query answers: results per page and per query
+    INLINE_PAGE_SIZE = 20
+    INLINE_MAX_RESULTS = 100
+
     def __init__(self):
-        self.source_fetcher = NewsSourceFetcher()
+        # Each feed is polled in the background at the rate it changes, within
+        # these bounds (seconds); reads in between are served from cache
+        self.source_fetcher = NewsSourceFetcher(
+            min_poll_interval=float(os.getenv("FEED_MIN_INTERVAL", "120")),
+            max_poll_interval=float(os.getenv("FEED_MAX_INTERVAL", "3600")),
+        )
         self.summarizer = NewsSummarizer()
         self.parser = NewsParser()
-        self.subscription_manager = SubscriptionManager()
+        # Use the SQLite store when several bot workers share ./data
+        if os.getenv("SUBSCRIPTION_STORE", "json") == "sqlite":
+            self.subscription_manager = SqliteSubscriptionManager()
+        else:
+            self.subscription_manager = SubscriptionManager()
+
+        # Article messages are rendered once per feed ingest, not per user
+        self.render_cache = ArticleRenderCache()
+        self.source_fetcher.add_ingest_listener(self.render_cache.ingest)
+
+        # The same story from several outlets is shown once, with the others
+        # listed as "also covered by"
+        self.duplicates = NearDuplicateIndex()
+        self.source_fetcher.add_ingest_listener(self.duplicates.ingest)
+
+        self.rate_limiter = RateLimiter()
+
+        # Feed fetching and parsing block, so it runs on its own thread pool
+        # and never on the event loop; the lag monitor proves it.
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("IO_WORKERS", "16")),
+            thread_name_prefix="news-io",
+        )
+        self.loop_monitor = EventLoopLagMonitor()
+        self.message_scheduler = MessageScheduler()
+        self.feed_poller = FeedPoller(self.source_fetcher, executor=self.io_executor)
+
+        # Premium messages are sent with the RSS summary and edited once the
+        # AI summary is ready
+        self.ai_summaries = AISummaryService(
+            self.summarizer,
+            self.parser,
+            executor=self.io_executor,
+            timeout=float(os.getenv("AI_SUMMARY_TIMEOUT", "30")),
+        )
+        # Edited articles get a fresh summary
+        self.source_fetcher.add_ingest_listener(self.ai_summaries.ingest)
+        self._background_tasks = set()
+
+        # Scheduled digests: one feed read per (source, category, hour) group
+        self.digest_store = DigestStore()
+        self.digest_dispatcher = DigestDispatcher(
+            self.digest_store,
+            self.subscription_manager,
+            self.source_fetcher,
+            self.render_cache,
+            self.message_scheduler,
+            ai_summaries=self.ai_summaries,
+            executor=self.io_executor,
+        )
+
+        # Keyword alerts: new articles are matched against every keyword in
+        # one automaton pass as feeds are ingested
+        self.alert_store = AlertStore()
+        self.alert_engine = KeywordAlertEngine(
+            self.alert_store,
+            self.subscription_manager,
+            self.render_cache,
+            self.message_scheduler,
+        )
+        self.source_fetcher.add_ingest_listener(self.alert_engine.ingest)
+
+        # Inline queries (@bot keyword) are answered from this index only
+        self.article_index = ArticleIndex()
+        self.source_fetcher.add_ingest_listener(self.article_index.ingest)
+        self.inline_results = QueryCache()
+
+        # /top merges the cached, time-sorted feeds instead of fetching them
+        self.timeline = FeedTimeline()
+        self.source_fetcher.add_ingest_listener(self.timeline.ingest)
+
+        # "Related" buttons are answered from TF-IDF vectors built at ingest
+        self.related_articles = RelatedArticles()
+        self.source_fetcher.add_ingest_listener(self.related_articles.ingest)
+
+        # /trending reads term counts kept up to date at ingest time
+        self.trending = TrendingTerms()
+        self.source_fetcher.add_ingest_listener(self.trending.ingest)
+
+        # Articles already sent to a user are skipped when the same feed is
+        # opened again; memory is fixed by the capacity, not the user count
+        self.seen_articles = SeenArticles(
+            capacity=int(os.getenv("SEEN_FILTER_CAPACITY", "2000000"))
+        )
+
+        # "compact" renders a whole result set into one paged message
+        # instead of one message per article
+        self.delivery_mode = os.getenv("DELIVERY_MODE", "single")
+        self.result_pages = ResultPageCache()
 
         # Buy Me a Coffee link
         self.PAYMENT_LINK = "https://buymeacoffee.com/mrlunatic"
@@ -44,7 +183,7 @@ class TelegramNewsBot:
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start command - show welcome message"""
         user_id = update.effective_user.id
-        tier = self.subscription_manager.get_user_tier(user_id)
+        tier = (await self._get_user_context(user_id)).tier
 
         welcome_text = (
             "📰 *Welcome to News Bot!*\n\n"
@@ -52,7 +191,11 @@ class TelegramNewsBot:
             f"Current Plan: *{tier.upper()}* {'🌟' if tier == 'premium' else '📱'}\n\n"
             "*Commands:*\n"
             "/news - Browse news by source\n"
+            "/top - Latest stories from all your sources\n"
+            "/trending - What the news is talking about\n"
             "/search - Search for specific topics\n"
+            "/digest - Get a daily digest pushed to you\n"
+            "/alert - Get notified about a keyword\n"
             "/sources - View available sources\n"
             "/premium - Upgrade to Premium\n"
             "/status - Check your subscription\n"
@@ -73,7 +216,7 @@ class TelegramNewsBot:
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show user's subscription status"""
         user_id = update.effective_user.id
-        limits = self.subscription_manager.get_limits(user_id)
+        limits = await asyncio.to_thread(self.subscription_manager.get_limits, user_id)
         tier = limits["tier"]
 
         status_text = f"📊 *Your Subscription Status*\n\n"
@@ -163,7 +306,11 @@ class TelegramNewsBot:
             "📰 *News Bot Help*\n\n"
             "*Commands:*\n"
             "• /news - Browse news by source and category\n"
+            "• /top - Latest stories from all your sources\n"
+            "• /trending [source] - Trending topics, overall or for a source\n"
             "• /search <keyword> - Search for specific topics\n"
+            "• /digest <source> <category> <hour> - Daily digest at hour (UTC)\n"
+            "• /alert <keyword> - Alert when new articles mention it\n"
             "• /sources - View available news sources\n"
             "• /premium - Upgrade to Premium\n"
             "• /status - Check subscription status\n"
@@ -171,6 +318,8 @@ class TelegramNewsBot:
             "*Examples:*\n"
             "• /search artificial intelligence\n"
             "• /search bitcoin\n"
+            "• /digest bbc world 8\n"
+            "• /alert bitcoin\n"
             "• /news (then select source)\n\n"
             "*Premium Features:*\n"
             "Upgrade with /premium for unlimited access!"
@@ -180,8 +329,9 @@ class TelegramNewsBot:
     async def sources_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show available sources"""
         user_id = update.effective_user.id
-        available_sources = self.subscription_manager.get_available_sources(user_id)
-        tier = self.subscription_manager.get_user_tier(user_id)
+        user_context = await self._get_user_context(user_id)
+        available_sources = user_context.sources
+        tier = user_context.tier
 
         all_sources = self.source_fetcher.get_available_sources()
 
@@ -203,13 +353,370 @@ class TelegramNewsBot:
 
         await update.message.reply_text(text, parse_mode="Markdown")
 
+    async def digest_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Subscribe to, list or cancel scheduled digests"""
+        user_id = update.effective_user.id
+        args = [arg.lower() for arg in context.args or []]
+
+        if not args:
+            digests = await asyncio.to_thread(
+                self.digest_store.get_user_digests, user_id
+            )
+            if not digests:
+                await update.message.reply_text(
+                    "You have no digests yet.\n\n"
+                    "Example: /digest bbc world 8 - BBC World every day at 08:00 UTC"
+                )
+                return
+
+            text = "🗞 *Your Digests*\n\n"
+            for source, category, hour in digests:
+                text += f"• {source.upper()} - {category} at {hour:02d}:00 UTC\n"
+            text += "\nCancel with /digest off [source category]"
+            await update.message.reply_text(text, parse_mode="Markdown")
+            return
+
+        if args[0] == "off":
+            source = args[1] if len(args) > 1 else None
+            category = args[2] if len(args) > 2 else None
+            removed = await asyncio.to_thread(
+                self.digest_store.unsubscribe, user_id, source, category
+            )
+            await update.message.reply_text(f"✅ Cancelled {removed} digest(s).")
+            return
+
+        if len(args) != 3 or not args[2].isdigit():
+            await update.message.reply_text(
+                "Usage: /digest <source> <category> <hour>\n\n"
+                "Example: /digest bbc world 8"
+            )
+            return
+
+        source, category, hour = args[0], args[1], int(args[2])
+        if hour > 23:
+            await update.message.reply_text("❌ Hour must be between 0 and 23 (UTC).")
+            return
+
+        user_context = await self._get_user_context(user_id)
+
+        if category not in self.source_fetcher.get_available_sources().get(source, []):
+            await update.message.reply_text(
+                f"❌ Unknown feed {source} - {category}. See /sources."
+            )
+            return
+
+        allowed = user_context.can_access_feature("source", source)
+        if allowed:
+            allowed = user_context.can_access_feature("category", category)
+        if not allowed:
+            await update.message.reply_text(
+                f"🔒 {source.upper()} - {category} requires Premium. See /premium."
+            )
+            return
+
+        digests = await asyncio.to_thread(self.digest_store.get_user_digests, user_id)
+        if (source, category, hour) in digests:
+            await update.message.reply_text("You already have this digest.")
+            return
+
+        max_digests = user_context.can_access_feature("digests")
+        if len(digests) >= max_digests:
+            await update.message.reply_text(
+                f"❌ Your plan allows {max_digests} digest(s).\n\n"
+                "Cancel one with /digest off, or upgrade with /premium."
+            )
+            return
+
+        try:
+            added = await asyncio.to_thread(
+                self.digest_store.subscribe,
+                user_id,
+                update.effective_chat.id,
+                source,
+                category,
+                hour,
+            )
+        except DigestError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
+        if added:
+            await update.message.reply_text(
+                f"✅ You'll get {source.upper()} - {category} every day "
+                f"at {hour:02d}:00 UTC."
+            )
+        else:
+            await update.message.reply_text("You already have this digest.")
+
+    async def alert_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Register, list or cancel keyword alerts"""
+        user_id = update.effective_user.id
+        args = context.args or []
+
+        if not args:
+            keywords = await asyncio.to_thread(
+                self.alert_store.get_user_alerts, user_id
+            )
+            if not keywords:
+                await update.message.reply_text(
+                    "You have no alerts yet.\n\n"
+                    "Example: /alert bitcoin - get notified about new articles "
+                    "mentioning bitcoin"
+                )
+                return
+
+            text = "🔔 *Your Alerts*\n\n"
+            for keyword in keywords:
+                text += f"• {escape_markdown(keyword, version=1)}\n"
+            text += "\nCancel with /alert off [keyword]"
+            await update.message.reply_text(text, parse_mode="Markdown")
+            return
+
+        if args[0].lower() == "off":
+            keyword = " ".join(args[1:]) or None
+            removed = await asyncio.to_thread(self.alert_store.remove, user_id, keyword)
+            await update.message.reply_text(f"✅ Cancelled {removed} alert(s).")
+            return
+
+        keyword = " ".join(args)
+        user_context = await self._get_user_context(user_id)
+        keywords = await asyncio.to_thread(self.alert_store.get_user_alerts, user_id)
+        if normalize_keyword(keyword) in keywords:
+            await update.message.reply_text("You already have this alert.")
+            return
+
+        max_alerts = user_context.can_access_feature("alerts")
+        if len(keywords) >= max_alerts:
+            await update.message.reply_text(
+                f"❌ Your plan allows {max_alerts} alert(s).\n\n"
+                "Cancel one with /alert off <keyword>, or upgrade with /premium."
+            )
+            return
+
+        try:
+            added = await asyncio.to_thread(
+                self.alert_store.add, user_id, update.effective_chat.id, keyword
+            )
+        except AlertError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+
+        if added:
+            await update.message.reply_text(
+                f"✅ You'll be notified when new articles mention '{keyword}'."
+            )
+        else:
+            await update.message.reply_text("You already have this alert.")
+
+    def _inline_result(self, article: dict) -> InlineQueryResultArticle:
+        source = article.get("source", "").upper()
+        text = f"📰 *{source}*\n\n" + self.render_cache.render(article, "search")
+        return InlineQueryResultArticle(
+            id=article["id"],
+            title=truncate(clean_text(article.get("title", "")), 200),
+            description=truncate(clean_text(article.get("summary", "")), 200),
+            url=article.get("link") or None,
+            input_message_content=InputTextMessageContent(
+                text, parse_mode="Markdown", disable_web_page_preview=True
+            ),
+        )
+
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Answer @bot <keyword> from the in-memory article index"""
+        inline_query = update.inline_query
+        user_context = await self._get_user_context(inline_query.from_user.id)
+        query = " ".join(inline_query.query.casefold().split())
+
+        # Results only depend on the query and the tier's sources
+        key = (self.article_index.version, user_context.tier, query)
+        articles = self.inline_results.get(key)
+        if articles is None:
+            articles = self.article_index.search(
+                query,
+                sources=user_context.sources,
+                categories=user_context.categories,
+                limit=self.INLINE_MAX_RESULTS,
+            )
+            articles = [
+                article
+                for _, article, _ in self.duplicates.collapse(
+                    [(article.get("source", ""), article) for article in articles]
+                )
+            ]
+            self.inline_results.put(key, articles)
+
+        offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+        page = articles[offset : offset + self.INLINE_PAGE_SIZE]
+        next_offset = offset + len(page)
+
+        await inline_query.answer(
+            [self._inline_result(article) for article in page],
+            cache_time=60,
+            is_personal=True,
+            next_offset=str(next_offset) if next_offset < len(articles) else "",
+        )
+
+    async def _run_blocking(self, func, *args, **kwargs):
+        """Run blocking fetch/parse/summarize work on the I/O thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.io_executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def _send(
+        self, chat_id: int, user_context: UserContext, send_method, *args, **kwargs
+    ) -> asyncio.Future:
+        """Queue an outbound message on the flood-limit aware scheduler"""
+        priority = PRIORITY_PREMIUM if user_context.is_premium else PRIORITY_FREE
+        return self.message_scheduler.send(
+            chat_id, functools.partial(send_method, *args, **kwargs), priority
+        )
+
+    def _format_compact(
+        self, article: dict, number: int, source: Optional[str] = None
+    ) -> str:
+        """Render one article as a block of a compact result message"""
+        prefix = f"{number}. 📰 {source.upper()} · " if source else f"{number}. "
+        return prefix + self.render_cache.render(article, "compact")
+
+    def _page_keyboard(
+        self, token: str, index: int, count: int
+    ) -> Optional[InlineKeyboardMarkup]:
+        """Prev/next buttons for a cached result set"""
+        if count <= 1:
+            return None
+
+        row = []
+        if index > 0:
+            row.append(
+                InlineKeyboardButton(
+                    "◀️ Prev", callback_data=f"page_{token}_{index - 1}"
+                )
+            )
+        if index < count - 1:
+            row.append(
+                InlineKeyboardButton(
+                    "Next ▶️", callback_data=f"page_{token}_{index + 1}"
+                )
+            )
+        return InlineKeyboardMarkup([row])
+
+    def _related_keyboard(self, article: dict) -> Optional[InlineKeyboardMarkup]:
+        """A "Related" button under an article the related index knows"""
+        if article.get("id") not in self.related_articles:
+            return None
+        return InlineKeyboardMarkup(
+            [
+                [
+                    InlineKeyboardButton(
+                        "🔗 Related", callback_data=f"related_{article['id']}"
+                    )
+                ]
+            ]
+        )
+
+    def _also_covered(self, also_covered: list, sources: list) -> str:
+        """Line linking the other outlets, among `sources`, that ran the story"""
+        also_covered = [
+            (source, article) for source, article in also_covered if source in sources
+        ]
+        if not also_covered:
+            return ""
+        links = ", ".join(
+            f"[{source.upper()}]({article.get('link', '').replace(')', '%29')})"
+            for source, article in also_covered
+        )
+        return f"\n🔁 Also covered by: {links}"
+
+    async def _send_compact(
+        self, message, user_context: UserContext, header: str, blocks: list
+    ):
+        """Send a whole result set as one message, paging if it is too long"""
+        pages = paginate(blocks, header)
+        token = self.result_pages.put(pages) if len(pages) > 1 else ""
+
+        await self._send(
+            message.chat_id,
+            user_context,
+            message.reply_text,
+            page_text(pages, 0),
+            parse_mode="Markdown",
+            disable_web_page_preview=True,
+            reply_markup=self._page_keyboard(token, 0, len(pages)),
+        )
+
+    def _spawn(self, coroutine):
+        """Run a coroutine in the background, keeping a reference until done"""
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def _add_ai_summary(
+        self, message, user_context: UserContext, text: str, article: dict
+    ):
+        """Edit a sent article message to include its AI summary, if one arrives"""
+        try:
+            summary = await self.ai_summaries.summarize(article)
+            if not summary:
+                return
+
+            summary = escape_markdown(truncate(clean_text(summary), 1000), version=1)
+            await self._send(
+                message.chat_id,
+                user_context,
+                message.edit_text,
+                f"{text}\n\n🤖 *AI Summary:*\n{summary}",
+                parse_mode="Markdown",
+                disable_web_page_preview=True,
+                reply_markup=message.reply_markup,
+            )
+        except Exception as e:
+            logger.warning(f"Could not add AI summary: {e}")
+
+    async def _get_user_context(self, user_id: int) -> UserContext:
+        """Resolve a user's context off the loop - the store may touch disk"""
+        return await asyncio.to_thread(
+            self.subscription_manager.get_user_context, user_id
+        )
+
+    async def _check_rate_limit(
+        self, update: Update, cost: float = 1, upstream: bool = False
+    ) -> Optional[UserContext]:
+        """Let the update through, or answer with a cheap "slow down" reply
+
+        `upstream` updates fetch feeds, so they also count against the global
+        budget. The bucket is checked before the store is touched; returns
+        the user's context, resolved once for the whole update, or None if
+        the update was rate limited.
+        """
+        user_id = update.effective_user.id
+        if self.rate_limiter.allow(user_id, cost=cost, upstream=upstream):
+            user_context = await self._get_user_context(user_id)
+            self.rate_limiter.set_tier(user_id, user_context.tier)
+            return user_context
+
+        # Repeat offenders are dropped silently until the notice interval
+        if not self.rate_limiter.should_notify(user_id):
+            return None
+
+        wait = self.rate_limiter.retry_after(user_id, cost=cost, upstream=upstream)
+        text = f"⏳ Slow down! Try again in {max(1, round(wait))}s."
+        if update.callback_query:
+            await update.callback_query.answer(text)
+        else:
+            await update.message.reply_text(text)
+        return None
+
     async def news_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show news source selection"""
-        user_id = update.effective_user.id
+        user_context = await self._check_rate_limit(update)
+        if user_context is None:
+            return
 
         # Check daily limit
-        if not self.subscription_manager.can_access_feature(user_id, "daily_limit"):
-            limits = self.subscription_manager.get_limits(user_id)
+        if not user_context.can_access_feature("daily_limit"):
+            limits = user_context.limits
             await update.message.reply_text(
                 f"❌ Daily limit reached ({limits['daily_articles']} articles)\n\n"
                 "Upgrade to Premium for 100 articles/day!\n"
@@ -220,7 +727,7 @@ class TelegramNewsBot:
             )
             return
 
-        available_sources = self.subscription_manager.get_available_sources(user_id)
+        available_sources = user_context.sources
 
         keyboard = []
         row = []
@@ -251,8 +758,7 @@ class TelegramNewsBot:
             keyboard.append(row)
 
         # Add premium button if free tier
-        tier = self.subscription_manager.get_user_tier(user_id)
-        if tier == "free":
+        if user_context.tier == "free":
             keyboard.append(
                 [
                     InlineKeyboardButton(
@@ -267,13 +773,188 @@ class TelegramNewsBot:
             "Choose a news source:", reply_markup=reply_markup
         )
 
+    def _allowed_feeds(self, user_context: UserContext) -> list:
+        """Cached (source, category) feeds the user's tier can read"""
+        return [
+            (source, category)
+            for source, category in self.timeline.feeds()
+            if user_context.can_access_feature("source", source)
+            and user_context.can_access_feature("category", category)
+        ]
+
+    async def top_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Latest stories merged across every source the user can read"""
+        user_context = await self._check_rate_limit(update)
+        if user_context is None:
+            return
+
+        if not user_context.can_access_feature("daily_limit"):
+            limits = user_context.limits
+            await update.message.reply_text(
+                f"❌ Daily limit reached ({limits['daily_articles']} articles)\n\n"
+                "Upgrade to Premium for 100 articles/day!\n"
+                "Use /premium to learn more."
+            )
+            return
+
+        # Only sources nobody has read since startup are fetched, once
+        cached = {source for source, _ in self.timeline.feeds()}
+        missing = [source for source in user_context.sources if source not in cached]
+        if missing:
+            await asyncio.gather(
+                *(
+                    self._run_blocking(
+                        self.source_fetcher.fetch_news_articles, source, "general"
+                    )
+                    for source in missing
+                ),
+                return_exceptions=True,
+            )
+
+        max_articles = 3 if user_context.tier == "free" else 5
+        stories = self.timeline.top(
+            max_articles,
+            self._allowed_feeds(user_context),
+            dedupe_key=self.duplicates.cluster_of,
+        )
+        if not stories:
+            await update.message.reply_text("❌ No articles available right now.")
+            return
+
+        granted = await asyncio.to_thread(user_context.reserve, len(stories))
+        if not granted:
+            limits = user_context.limits
+            await update.message.reply_text(
+                f"❌ Daily limit reached ({limits['daily_articles']} articles)"
+            )
+            return
+        stories = stories[:granted]
+
+        if self.delivery_mode == "compact":
+            blocks = [
+                self._format_compact(article, i, source)
+                for i, (source, article) in enumerate(stories, 1)
+            ]
+            await self._send_compact(
+                update.message, user_context, "🔥 *Top Stories*\n\n", blocks
+            )
+            return
+
+        await asyncio.gather(
+            *(
+                self._send(
+                    update.message.chat_id,
+                    user_context,
+                    update.message.reply_text,
+                    f"🔥 *{i}. {source.upper()}*\n\n"
+                    + self.render_cache.render(article, "news"),
+                    parse_mode="Markdown",
+                    disable_web_page_preview=True,
+                    reply_markup=self._related_keyboard(article),
+                )
+                for i, (source, article) in enumerate(stories, 1)
+            )
+        )
+
+    async def trending_command(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE
+    ):
+        """Most mentioned terms in recent articles, overall or for one source"""
+        user_context = await self._check_rate_limit(update)
+        if user_context is None:
+            return
+
+        source = context.args[0].lower() if context.args else None
+        if source is not None:
+            if source not in self.source_fetcher.RSS_FEEDS:
+                await update.message.reply_text(
+                    f"❌ Unknown source: {source}\n\nUse /sources to see them all."
+                )
+                return
+
+            if not user_context.can_access_feature("source", source):
+                await update.message.reply_text(
+                    f"🔒 {source.upper()} requires Premium. See /premium."
+                )
+                return
+
+        trending = self.trending.top(10, source)
+        if not trending:
+            await update.message.reply_text(
+                "📈 Nothing is trending yet. Check back in a few minutes."
+            )
+            return
+
+        title = f"Trending on {source.upper()}" if source else "Trending Now"
+        text = f"📈 *{title}*\n\n"
+        for i, (term, count) in enumerate(trending, 1):
+            text += f"{i}. {escape_markdown(term, version=1)} ({count:.0f})\n"
+        text += "\nRead more with /search <term>"
+        await update.message.reply_text(text, parse_mode="Markdown")
+
+    async def send_related(self, query, article_id: str, user_context: UserContext):
+        """Reply to a "Related" button with similar articles from stored feeds"""
+        max_articles = 3 if user_context.tier == "free" else 5
+        categories = user_context.categories
+        related = self.related_articles.related(
+            article_id,
+            max_articles,
+            sources=user_context.sources,
+            categories=None if categories == "all" else categories,
+        )
+        if related is None:
+            await query.message.reply_text(
+                "⌛ This article is too old to find related coverage."
+            )
+            return
+        if not related:
+            await query.message.reply_text("🔗 No related articles found yet.")
+            return
+
+        granted = await asyncio.to_thread(user_context.reserve, len(related))
+        if not granted:
+            limits = user_context.limits
+            await query.message.reply_text(
+                f"❌ Daily limit reached ({limits['daily_articles']} articles)\n\n"
+                "Upgrade to Premium for 100 articles/day!"
+            )
+            return
+
+        blocks = [
+            self._format_compact(article, i, source)
+            for i, (source, article, _) in enumerate(related[:granted], 1)
+        ]
+        await self._send_compact(
+            query.message, user_context, "🔗 *Related coverage*\n\n", blocks
+        )
+
+    @staticmethod
+    def _button_cost(data: str) -> float:
+        """Taps that only move through menus or pages are free"""
+        if data and data.startswith(("category_", "related_")):
+            return 1
+        return 0
+
+    def _fetches_feed(self, data: str) -> bool:
+        """Whether a button would read a feed that is not in the cache"""
+        if not data or not data.startswith("category_"):
+            return False
+        source, _, category = data.replace("category_", "", 1).partition("_")
+        return self.source_fetcher.needs_fetch(source, category)
+
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button callbacks"""
         query = update.callback_query
+        user_context = await self._check_rate_limit(
+            update,
+            cost=self._button_cost(query.data),
+            upstream=self._fetches_feed(query.data),
+        )
+        if user_context is None:
+            return
         await query.answer()
 
         data = query.data
-        user_id = update.effective_user.id
 
         if data == "show_premium":
             await self.show_premium_inline(query)
@@ -296,9 +977,7 @@ class TelegramNewsBot:
             source = data.replace("source_", "")
 
             # Check if user can access this source
-            if not self.subscription_manager.can_access_feature(
-                user_id, "source", source
-            ):
+            if not user_context.can_access_feature("source", source):
                 await query.edit_message_text(
                     f"🔒 *{source.upper()}* is a Premium feature\n\n"
                     "Upgrade to access all news sources!",
@@ -315,7 +994,35 @@ class TelegramNewsBot:
                 )
                 return
 
-            await self.show_categories(query, source)
+            await self.show_categories(query, source, user_context)
+
+        elif data.startswith("page_"):
+            token, _, index = data.replace("page_", "", 1).rpartition("_")
+            try:
+                index = int(index)
+            except ValueError:
+                # Not a button we sent; the query is already answered above
+                return
+
+            pages = self.result_pages.get(token)
+            if pages is None:
+                await query.edit_message_text(
+                    "⌛ These results have expired. Please search again."
+                )
+                return
+
+            index = max(0, min(index, len(pages) - 1))
+            await query.edit_message_text(
+                page_text(pages, index),
+                parse_mode="Markdown",
+                disable_web_page_preview=True,
+                reply_markup=self._page_keyboard(token, index, len(pages)),
+            )
+
+        elif data.startswith("related_"):
+            await self.send_related(
+                query, data.replace("related_", "", 1), user_context
+            )
 
         elif data.startswith("category_"):
             parts = data.replace("category_", "").split("_")
@@ -323,8 +1030,7 @@ class TelegramNewsBot:
             category = "_".join(parts[1:])
 
             # Check category access
-            available_cats = self.subscription_manager.get_available_categories(user_id)
-            if available_cats != "all" and category not in available_cats:
+            if not user_context.can_access_feature("category", category):
                 await query.edit_message_text(
                     f"🔒 *{category.upper()}* category is Premium only\n\n"
                     "Upgrade to access all categories!",
@@ -341,7 +1047,7 @@ class TelegramNewsBot:
                 )
                 return
 
-            await self.fetch_and_send_news(query, source, category)
+            await self.fetch_and_send_news(query, source, category, user_context)
 
     async def show_premium_inline(self, query):
         """Show premium info inline"""
@@ -368,12 +1074,15 @@ class TelegramNewsBot:
             disable_web_page_preview=True,
         )
 
-    async def show_categories(self, query, source: str):
+    async def show_categories(
+        self, query, source: str, user_context: Optional[UserContext] = None
+    ):
         """Show category selection for a source"""
-        user_id = query.from_user.id
+        if user_context is None:
+            user_context = await self._get_user_context(query.from_user.id)
         sources = self.source_fetcher.get_available_sources()
         categories = sources.get(source, {})
-        available_cats = self.subscription_manager.get_available_categories(user_id)
+        available_cats = user_context.categories
 
         keyboard = []
         row = []
@@ -405,9 +1114,16 @@ class TelegramNewsBot:
             parse_mode="Markdown",
         )
 
-    async def fetch_and_send_news(self, query, source: str, category: str):
+    async def fetch_and_send_news(
+        self,
+        query,
+        source: str,
+        category: str,
+        user_context: Optional[UserContext] = None,
+    ):
         """Fetch news and send to user"""
-        user_id = query.from_user.id
+        if user_context is None:
+            user_context = await self._get_user_context(query.from_user.id)
 
         await query.edit_message_text(
             f"🔍 Fetching {source.upper()} - {category} news..."
@@ -415,12 +1131,15 @@ class TelegramNewsBot:
 
         try:
             # Get max articles based on tier
-            max_articles = (
-                3 if self.subscription_manager.get_user_tier(user_id) == "free" else 5
-            )
-
-            articles = self.source_fetcher.fetch_news_articles(
-                source, category, max_articles=max_articles
+            max_articles = 3 if user_context.tier == "free" else 5
+
+            # Read deeper than we send, so articles the user has already
+            # been sent can be skipped
+            articles = await self._run_blocking(
+                self.source_fetcher.fetch_news_articles,
+                source,
+                category,
+                max_articles=50,
             )
 
             if not articles:
@@ -429,32 +1148,87 @@ class TelegramNewsBot:
                 )
                 return
 
+            articles = self.seen_articles.unseen(user_context.user_id, articles)
+            if not articles:
+                await query.edit_message_text(
+                    f"✅ You're all caught up on {source.upper()} - {category}!\n\n"
+                    "No new articles since you last checked."
+                )
+                return
+            articles = articles[:max_articles]
+
+            # Claim quota for the whole batch in one write
+            granted = await asyncio.to_thread(user_context.reserve, len(articles))
+            if not granted:
+                limits = user_context.limits
+                await query.edit_message_text(
+                    f"❌ Daily limit reached ({limits['daily_articles']} articles)\n\n"
+                    "Upgrade to Premium for 100 articles/day!"
+                )
+                return
+            articles = articles[:granted]
+
             await query.edit_message_text(
                 f"✅ Found {len(articles)} articles from {source.upper()}!\n"
                 f"Sending them now..."
             )
 
-            for i, article in enumerate(articles, 1):
-                # Increment usage
-                self.subscription_manager.increment_usage(user_id)
+            if self.delivery_mode == "compact":
+                blocks = [
+                    self._format_compact(article, i)
+                    for i, article in enumerate(articles, 1)
+                ]
+                await self._send_compact(
+                    query.message,
+                    user_context,
+                    f"📰 *{source.upper()} - {category}*\n\n",
+                    blocks,
+                )
+                self.seen_articles.mark(
+                    user_context.user_id, [article["id"] for article in articles]
+                )
+                return
 
-                text = (
-                    f"📰 *Article {i}/{len(articles)}*\n\n"
-                    f"*{article['title']}*\n\n"
-                    f"📅 {article['published']}\n\n"
+            sends, texts = [], []
+            for i, article in enumerate(articles, 1):
+                text = f"📰 *Article {i}/{len(articles)}*\n\n" + (
+                    self.render_cache.render(article, "news")
+                )
+                texts.append(text)
+
+                sends.append(
+                    self._send(
+                        query.message.chat_id,
+                        user_context,
+                        query.message.reply_text,
+                        text,
+                        parse_mode="Markdown",
+                        disable_web_page_preview=True,
+                        reply_markup=self._related_keyboard(article),
+                    )
                 )
 
-                if article["summary"]:
-                    summary = article["summary"][:500]
-                    if len(article["summary"]) > 500:
-                        summary += "..."
-                    text += f"{summary}\n\n"
+            results = await asyncio.gather(*sends, return_exceptions=True)
+            # Only articles that actually reached the user count as seen;
+            # the rest come up again next time
+            delivered = [
+                (message, text, article)
+                for message, text, article in zip(results, texts, articles)
+                if not isinstance(message, BaseException)
+            ]
+            self.seen_articles.mark(
+                user_context.user_id, [article["id"] for _, _, article in delivered]
+            )
 
-                text += f"[Read more]({article['link']})"
+            if user_context.can_access_feature("ai_summaries"):
+                for message, text, article in delivered:
+                    self._spawn(
+                        self._add_ai_summary(message, user_context, text, article)
+                    )
 
-                await query.message.reply_text(
-                    text, parse_mode="Markdown", disable_web_page_preview=True
-                )
+            failed = [r for r in results if isinstance(r, BaseException)]
+            if failed:
+                raise failed[0]
 
         except NewsSourceFetcherError as e:
             await query.edit_message_text(f"❌ Error: {e}")
@@ -464,10 +1238,13 @@ class TelegramNewsBot:
 
     async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Search for news by keyword"""
-        user_id = update.effective_user.id
+        # A search fans out to every feed, so it costs more than a tap
+        user_context = await self._check_rate_limit(update, cost=3, upstream=True)
+        if user_context is None:
+            return
 
         # Check daily limit
-        if not self.subscription_manager.can_access_feature(user_id, "daily_limit"):
+        if not user_context.can_access_feature("daily_limit"):
             await update.message.reply_text(
                 "❌ Daily limit reached!\n\n"
                 "Upgrade to Premium for more articles.\n"
@@ -483,54 +1260,75 @@ class TelegramNewsBot:
             return
 
         keyword = " ".join(context.args)
-        max_results = self.subscription_manager.can_access_feature(
-            user_id, "search_results"
-        )
+        max_results = user_context.can_access_feature("search_results")
 
         await update.message.reply_text(
             f"🔍 Searching for: *{keyword}*...", parse_mode="Markdown"
         )
 
         try:
-            results = self.source_fetcher.search_across_sources(
-                keyword, max_per_source=1
+            results = await self._run_blocking(
+                self.source_fetcher.search_across_sources, keyword, max_per_source=1
             )
 
             if not results:
                 await update.message.reply_text(f"❌ No articles found for '{keyword}'")
                 return
 
-            total = sum(len(articles) for articles in results.values())
-            sent = 0
-
-            for source, articles in results.items():
-                for article in articles:
-                    if sent >= max_results:
-                        break
-
-                    self.subscription_manager.increment_usage(user_id)
-
-                    text = f"📰 *{source.upper()}*\n\n" f"*{article['title']}*\n\n"
+            # One result per story, however many outlets ran it
+            results = self.duplicates.collapse(
+                [
+                    (source, article)
+                    for source, articles in results.items()
+                    for article in articles
+                ]
+            )
+            total = len(results)
 
-                    if article["summary"]:
-                        summary = article["summary"][:400]
-                        if len(article["summary"]) > 400:
-                            summary += "..."
-                        text += f"{summary}\n\n"
+            # Claim quota for every result we are about to send in one write
+            max_results = await asyncio.to_thread(
+                user_context.reserve, min(total, max_results)
+            )
 
-                    text += f"[Read more]({article['link']})"
+            if self.delivery_mode == "compact":
+                blocks = [
+                    self._format_compact(article, i, source)
+                    + self._also_covered(also_covered, user_context.sources)
+                    for i, (source, article, also_covered) in enumerate(
+                        results[:max_results], 1
+                    )
+                ]
+                await self._send_compact(
+                    update.message,
+                    user_context,
+                    f"🔍 *Results for: {escape_markdown(keyword)}*\n\n",
+                    blocks,
+                )
+            else:
+                sends = []
+                for source, article, also_covered in results[:max_results]:
+                    text = (
+                        f"📰 *{source.upper()}*\n\n"
+                        + self.render_cache.render(article, "search")
+                        + self._also_covered(also_covered, user_context.sources)
+                    )
 
-                    await update.message.reply_text(
-                        text, parse_mode="Markdown", disable_web_page_preview=True
+                    sends.append(
+                        self._send(
+                            update.message.chat_id,
+                            user_context,
+                            update.message.reply_text,
+                            text,
+                            parse_mode="Markdown",
+                            disable_web_page_preview=True,
+                            reply_markup=self._related_keyboard(article),
+                        )
                     )
-                    sent += 1
 
-                if sent >= max_results:
-                    break
+                await asyncio.gather(*sends)
 
             if total > max_results:
-                tier = self.subscription_manager.get_user_tier(user_id)
-                if tier == "free":
+                if user_context.tier == "free":
                     await update.message.reply_text(
                         f"📊 Showing {max_results} of {total} results\n\n"
                         "🌟 Upgrade to Premium for 10 results per search!",
@@ -549,6 +1347,30 @@ class TelegramNewsBot:
             logger.error(f"Error searching: {e}")
             await update.message.reply_text(f"❌ Error: {str(e)[:100]}")
 
+    async def post_init(self, application: Application):
+        """Start background services once the event loop is running"""
+        self.loop_monitor.start()
+        self.message_scheduler.start()
+        self.feed_poller.start()
+        self.digest_dispatcher.start(application.bot)
+        self.alert_engine.start(application.bot)
+
+    async def shutdown(self, application: Application):
+        """Persist pending subscription changes on shutdown"""
+        for task in list(self._background_tasks):
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        await self.feed_poller.stop()
+        await self.digest_dispatcher.stop()
+        await self.alert_engine.stop()
+        await self.message_scheduler.stop()
+        await self.loop_monitor.stop()
+        logger.info(f"Event loop lag: {self.loop_monitor.stats()}")
+        self.io_executor.shutdown(wait=False, cancel_futures=True)
+        self.subscription_manager.close()
+        self.digest_store.close()
+        self.alert_store.close()
+
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
         logger.error(f"Update {update} caused error {context.error}")
@@ -559,28 +1381,88 @@ class TelegramNewsBot:
             )
 
 
-def main():
-    """Start the bot"""
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
+async def run_webhook(application: Application, bot: TelegramNewsBot):
+    """Serve updates from the built-in webhook server until interrupted"""
+    secret_token = os.getenv("WEBHOOK_SECRET")
+    server = WebhookServer(
+        application,
+        secret_token=secret_token,
+        port=int(os.getenv("WEBHOOK_PORT", "8443")),
+        path=os.getenv("WEBHOOK_PATH", "/telegram"),
+        queue_size=int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+    )
+
+    async with application:
+        await bot.post_init(application)
+        await application.start()
+        await server.start()
+
+        # Without WEBHOOK_URL the server only takes locally POSTed updates
+        webhook_url = os.getenv("WEBHOOK_URL")
+        if webhook_url:
+            await application.bot.set_webhook(
+                webhook_url,
+                secret_token=secret_token,
+                allowed_updates=Update.ALL_TYPES,
+            )
 
-    if not token:
-        logger.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
-        return
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            await bot.shutdown(application)
 
-    bot = TelegramNewsBot()
-    application = Application.builder().token(token).build()
 
-    # Add handlers
+def add_handlers(application: Application, bot: TelegramNewsBot):
+    """Route every command, button and inline query to the bot"""
     application.add_handler(CommandHandler("start", bot.start))
     application.add_handler(CommandHandler("help", bot.help_command))
     application.add_handler(CommandHandler("news", bot.news_command))
+    application.add_handler(CommandHandler("top", bot.top_command))
+    application.add_handler(CommandHandler("trending", bot.trending_command))
     application.add_handler(CommandHandler("search", bot.search_command))
+    application.add_handler(CommandHandler("digest", bot.digest_command))
+    application.add_handler(CommandHandler("alert", bot.alert_command))
     application.add_handler(CommandHandler("sources", bot.sources_command))
     application.add_handler(CommandHandler("premium", bot.premium_command))
     application.add_handler(CommandHandler("status", bot.status_command))
     application.add_handler(CallbackQueryHandler(bot.button_callback))
+    application.add_handler(InlineQueryHandler(bot.inline_query))
     application.add_error_handler(bot.error_handler)
 
+
+def main():
+    """Start the bot"""
+    token = os.getenv("TELEGRAM_BOT_TOKEN")
+
+    if not token:
+        logger.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
+        return
+
+    bot = TelegramNewsBot()
+    application = (
+        Application.builder()
+        .token(token)
+        # Different chats are served concurrently, each chat in order
+        .concurrent_updates(
+            PerChatUpdateProcessor(int(os.getenv("MAX_CONCURRENT_UPDATES", "64")))
+        )
+        .post_init(bot.post_init)
+        .post_shutdown(bot.shutdown)
+        .build()
+    )
+
+    add_handlers(application, bot)
+
+    if os.getenv("BOT_MODE", "polling") == "webhook":
+        logger.info("Starting News Bot in webhook mode...")
+        try:
+            asyncio.run(run_webhook(application, bot))
+        except KeyboardInterrupt:
+            pass
+        return
+
     logger.info("Starting News Bot with Subscription System...")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
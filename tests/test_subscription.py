@@ -98,6 +98,183 @@ def test_subscription_manager():
         print(f"  ❌ Subscription manager test failed: {e}")
         return False
 
+def test_write_behind_usage():
+    """Test usage counters are buffered in memory and flushed in one write"""
+    print("\n⏱️  Testing write-behind usage counters...")
+
+    import tempfile
+    from src.subscription.subscription_manager import SubscriptionManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "subscriptions.json"
+        manager = SubscriptionManager(str(db_path), flush_interval=0)
+
+        for _ in range(5):
+            manager.increment_usage(777777777)
+        assert manager.journal.size() == 0, "increment_usage should not write"
+        print("  ✅ 5 increments caused no disk writes")
+
+        assert manager.flush() is True
+        assert manager.flush() is False
+        peek = SubscriptionManager(str(db_path), flush_interval=0)
+        assert peek.get_user_stats(777777777)["daily_count"] == 5
+        peek.journal.close()
+        print("  ✅ flush() persisted all pending usage in one write")
+
+        manager.increment_usage(777777777)
+        manager.close()
+        reloaded = SubscriptionManager(str(db_path), flush_interval=0)
+        assert reloaded.get_user_stats(777777777)["daily_count"] == 6
+        print("  ✅ close() flushed pending usage")
+
+    return True
+
+def test_journal_recovery():
+    """Test state is rebuilt from snapshot + journal and compaction works"""
+    print("\n📒 Testing subscription journal...")
+
+    import json
+    import tempfile
+    from src.subscription.subscription_manager import SubscriptionManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "subscriptions.json"
+        journal_path = Path(tmp) / "subscriptions.journal"
+
+        manager = SubscriptionManager(str(db_path), flush_interval=0)
+        manager.upgrade_to_premium(111, 1)
+        manager.increment_usage(222, 3)
+        manager.flush()
+        assert journal_path.exists() and not db_path.exists()
+        print("  ✅ Writes are journal appends, snapshot untouched")
+
+        # Simulate a crash that tore the last journal line
+        with open(journal_path, "a") as f:
+            f.write('{"user": "333", "rec')
+        manager.journal.close()
+
+        recovered = SubscriptionManager(str(db_path), flush_interval=0)
+        assert recovered.get_user_tier(111) == "premium"
+        assert recovered.get_user_stats(222)["daily_count"] == 3
+        assert "333" not in recovered.subscriptions
+        print("  ✅ State rebuilt from journal, torn tail skipped")
+
+        recovered.compact()
+        assert json.loads(db_path.read_text())["222"]["daily_count"] == 3
+        assert recovered.journal.size() == 0
+        recovered.close()
+
+        again = SubscriptionManager(str(db_path), flush_interval=0)
+        assert again.get_user_tier(111) == "premium"
+        print("  ✅ Compaction folded the journal into the snapshot")
+
+        # A compaction that dies after rotating leaves a segment behind; the
+        # next one must not overwrite it before a snapshot covers it
+        again.increment_usage(444, 4)
+        again.flush()
+        again.journal.rotate()
+        again.increment_usage(555, 5)
+        again.flush()
+        again.journal.rotate()
+        again.journal.close()
+
+        survivor = SubscriptionManager(str(db_path), flush_interval=0)
+        assert survivor.get_user_stats(444)["daily_count"] == 4
+        assert survivor.get_user_stats(555)["daily_count"] == 5
+        assert not survivor.journal.has_rotated()
+        survivor.close()
+        print("  ✅ Unfinished compactions lose no journal entries")
+
+    return True
+
+def test_expiry_index():
+    """Test expired premium users are downgraded in one sweep"""
+    print("\n⌛ Testing expiry index...")
+
+    import tempfile
+    from datetime import datetime, timedelta
+    from src.subscription.subscription_manager import SubscriptionManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = SubscriptionManager(
+            str(Path(tmp) / "subscriptions.json"), flush_interval=0
+        )
+        for user_id in (1, 2, 3):
+            manager.upgrade_to_premium(user_id, 1)
+
+        # Backdate two subscriptions and re-index them
+        past = (datetime.now() - timedelta(days=1)).isoformat()
+        for user_id in ("1", "2"):
+            manager.subscriptions[user_id]["expires_at"] = past
+            manager._index_user(user_id, manager.subscriptions[user_id])
+
+        assert set(manager.get_premium_users()) == {"3"}
+        assert manager.get_user_tier(1) == "free"
+        assert manager.subscriptions["2"]["tier"] == "free"
+        assert manager.expire_due() == 0
+        print("  ✅ Expired users downgraded in bulk")
+
+        manager.downgrade_to_free(3)
+        assert manager.get_premium_users() == {}
+        print("  ✅ downgrade_to_free() updates the index")
+        manager.close()
+
+    return True
+
+def test_user_context():
+    """Test UserContext answers checks locally and reserves quota in batches"""
+    print("\n🎫 Testing user context...")
+
+    import tempfile
+    from src.subscription.subscription_manager import SubscriptionManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = SubscriptionManager(
+            str(Path(tmp) / "subscriptions.json"), flush_interval=0
+        )
+        user_context = manager.get_user_context(555)
+        assert user_context.tier == "free"
+        assert user_context.can_access_feature("source", "bbc")
+        assert not user_context.can_access_feature("source", "wired")
+        assert user_context.remaining == 10
+
+        assert user_context.reserve(8) == 8
+        assert user_context.reserve(5) == 2
+        assert user_context.remaining == 0
+        assert not user_context.can_access_feature("daily_limit")
+        assert manager.get_user_stats(555)["daily_count"] == 10
+        print("  ✅ Quota reserved in batches, capped at the daily limit")
+        manager.close()
+
+    return True
+
+def test_sqlite_store():
+    """Test the multi-process SQLite store reserves quota atomically"""
+    print("\n🗄️  Testing SQLite subscription store...")
+
+    import tempfile
+    from src.subscription.sqlite_store import SqliteSubscriptionManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "subscriptions.db")
+        worker_a = SqliteSubscriptionManager(db_path, import_from=None)
+        worker_b = SqliteSubscriptionManager(db_path, import_from=None)
+
+        assert worker_a.reserve_usage(444, 6) == (6, 6)
+        assert worker_b.reserve_usage(444, 6) == (4, 10)
+        assert worker_a.get_user_context(444).remaining == 0
+        print("  ✅ Quota shared and capped across managers")
+
+        worker_b.upgrade_to_premium(444, 1)
+        assert worker_a.get_user_tier(444) == "premium"
+        assert set(worker_a.get_premium_users()) == {"444"}
+        print("  ✅ Upgrades visible to every worker")
+
+        worker_a.close()
+        worker_b.close()
+
+    return True
+
 def test_environment():
     """Test environment variables"""
     print("\n🔐 Testing environment variables...")
@@ -185,6 +362,11 @@ def main():
         "Environment": test_environment(),
         "Subscription Manager": test_subscription_manager(),
         "Database": test_database(),
+        "Write-behind Usage": test_write_behind_usage(),
+        "Journal Recovery": test_journal_recovery(),
+        "Expiry Index": test_expiry_index(),
+        "User Context": test_user_context(),
+        "SQLite Store": test_sqlite_store(),
         "Admin Tool": test_admin_tool(),
     }
     
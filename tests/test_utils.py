@@ -0,0 +1,968 @@
+#!/usr/bin/env python3
+"""
+Tests for the bot's utility modules
+"""
+
+import sys
+import os
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_token_bucket():
+    """Token bucket allows a burst, then refills at its rate"""
+    from src.utils.rate_limiter import TokenBucket
+
+    bucket = TokenBucket(rate=1.0, capacity=3)
+    now = bucket.updated
+    assert all(bucket.consume(1, now) for _ in range(3))
+    assert not bucket.consume(1, now)
+    assert bucket.consume(1, now + 1.0)
+
+
+def test_rate_limiter_tiers():
+    """Premium users get a bigger burst, and the global bucket caps everyone"""
+    from src.utils.rate_limiter import RateLimiter
+
+    limiter = RateLimiter(
+        tier_limits={"free": (0.0, 2), "premium": (0.0, 4)},
+        global_rate=0.0,
+        global_burst=5,
+    )
+    fetch = {"upstream": True}
+    assert [limiter.allow(1, "free", **fetch) for _ in range(3)] == [True, True, False]
+    assert [limiter.allow(2, "premium", **fetch) for _ in range(4)] == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    # Global budget is now spent, even for a fresh user
+    assert not limiter.allow(3, "premium", **fetch)
+    # ... but it only gates feed fetches, not cached reads and button taps
+    assert limiter.allow(3, "premium")
+
+    # Spam gets one "slow down" notice per interval
+    assert limiter.should_notify(1) and not limiter.should_notify(1)
+
+
+def test_loop_lag_monitor():
+    """A blocking call on the event loop shows up as lag"""
+    import asyncio
+    import time
+    from src.utils.loop_monitor import EventLoopLagMonitor
+
+    async def run():
+        monitor = EventLoopLagMonitor(interval=0.01, warn_threshold=1.0)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.1)  # block the loop on purpose
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor.stats()
+
+    stats = asyncio.run(run())
+    assert stats["samples"] > 0
+    assert stats["max_ms"] >= 50
+
+
+def test_message_scheduler_order_and_retry():
+    """Per-chat order is kept, premium goes first, and 429s are retried"""
+    import asyncio
+    from telegram.error import RetryAfter
+    from src.utils.message_scheduler import (
+        MessageScheduler,
+        PRIORITY_FREE,
+        PRIORITY_PREMIUM,
+    )
+
+    delivered = []
+    flood_once = {"hit": False}
+
+    def make_send(label):
+        async def send():
+            if label == "free-1" and not flood_once["hit"]:
+                flood_once["hit"] = True
+                raise RetryAfter(0)
+            delivered.append(label)
+            return label
+
+        return send
+
+    async def run():
+        scheduler = MessageScheduler(global_rate=1000, chat_rate=1000, chat_burst=10)
+        futures = [
+            scheduler.send(1, make_send("free-0"), PRIORITY_FREE),
+            scheduler.send(1, make_send("free-1"), PRIORITY_FREE),
+            scheduler.send(2, make_send("premium-0"), PRIORITY_PREMIUM),
+        ]
+        results = await asyncio.gather(*futures)
+        await scheduler.stop()
+        return results
+
+    assert asyncio.run(run()) == ["free-0", "free-1", "premium-0"]
+    assert delivered[0] == "premium-0"
+    assert delivered.index("free-0") < delivered.index("free-1")
+
+
+def test_message_scheduler_keeps_chat_order_on_retry():
+    """A chat's first message hitting a 429 still arrives before the rest"""
+    import asyncio
+    from telegram.error import RetryAfter
+    from src.utils.message_scheduler import MessageScheduler
+
+    delivered = []
+    flooded = set()
+
+    def make_send(label, delay):
+        async def send():
+            if label == "1/3" and label not in flooded:
+                flooded.add(label)
+                raise RetryAfter(0)
+            # Later messages would finish first if they were in flight together
+            await asyncio.sleep(delay)
+            delivered.append(label)
+
+        return send
+
+    async def run():
+        scheduler = MessageScheduler(global_rate=1000, chat_rate=1000, chat_burst=10)
+        await asyncio.gather(
+            scheduler.send(1, make_send("1/3", 0.03)),
+            scheduler.send(1, make_send("2/3", 0.02)),
+            scheduler.send(1, make_send("3/3", 0.01)),
+        )
+        await scheduler.stop()
+
+    asyncio.run(run())
+    assert delivered == ["1/3", "2/3", "3/3"]
+
+
+def test_message_scheduler_stop_fails_pending_sends():
+    """Stopping with sends in flight, queued and backlogged releases every caller"""
+    import asyncio
+    from src.utils.message_scheduler import MessageScheduler, MessageSchedulerError
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    async def quick():
+        return "sent"
+
+    async def run():
+        scheduler = MessageScheduler(global_rate=1000, chat_rate=0.01, chat_burst=1)
+        futures = [
+            scheduler.send(1, slow),  # in flight
+            scheduler.send(1, slow),  # waiting behind it in the chat's backlog
+            scheduler.send(2, slow),  # in flight
+            scheduler.send(2, slow),
+            scheduler.send(3, quick),
+            scheduler.send(3, slow),  # parked: chat 3 is over its pace
+        ]
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return await asyncio.wait_for(
+            asyncio.gather(*futures, return_exceptions=True), timeout=1
+        )
+
+    results = asyncio.run(run())
+    assert results[4] == "sent"
+    assert all(isinstance(r, MessageSchedulerError) for r in results[:4] + results[5:])
+
+
+def test_paginate_splits_only_at_limit():
+    """Blocks are packed into as few pages as fit under the length limit"""
+    from src.utils.compact_delivery import paginate
+
+    blocks = [f"*{i}. Title*\n" + "x" * 300 for i in range(30)]
+    pages = paginate(blocks, header="📰 *BBC*\n\n")
+
+    assert len(pages) == 3
+    assert all(len(page) <= 4096 for page in pages)
+    assert all(page.startswith("📰 *BBC*") for page in pages)
+    assert sum(page.count(". Title*") for page in pages) == 30
+    assert paginate(blocks[:2]) == ["\n\n".join(blocks[:2])]
+
+    # An oversized block loses whole lines, never half a Markdown entity
+    huge = "*Title*\n" + "y" * 5000 + "\n[Read more](https://example.com)"
+    assert paginate([huge]) == ["*Title*"]
+
+
+def test_article_render_cache():
+    """Feed text is cleaned and escaped once and reused across renders"""
+    from src.source.newsSourceFetcher import FeedDelta
+    from src.utils.article_renderer import ArticleRenderCache
+
+    cache = ArticleRenderCache()
+    article = {
+        "id": "abc",
+        "title": "AI_models &amp; *you*",
+        "summary": "<p>Big [news]</p>" + "x" * 600,
+        "link": "https://example.com/a_(b)",
+        "published": "Mon, 01 Jan 2025",
+    }
+    cache.ingest(FeedDelta("bbc", "general", new=[article]))
+
+    text = cache.render(article, "news")
+    assert text.startswith("*AI\\_models & \\*you\\**")
+    assert "<p>" not in text and "Big \\[news]" in text
+    assert text.endswith("[Read more](https://example.com/a_(b%29)")
+    assert "x" * 489 + "..." in text and "x" * 490 not in text
+
+    article["title"] = "changed"
+    assert cache.render(article, "news") is text
+
+
+def test_webhook_server_validates_and_queues():
+    """Recorded updates POSTed locally are validated, queued and processed"""
+    import asyncio
+    import json
+
+    from src.utils.update_processor import PerChatUpdateProcessor
+    from src.utils.webhook_server import WebhookServer, WebhookServerError
+
+    processed = []
+
+    class FakeApplication:
+        bot = None
+        update_processor = PerChatUpdateProcessor(4)
+
+        async def process_update(self, update):
+            processed.append(update.update_id)
+
+    async def post(port, body, secret):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        payload = json.dumps(body).encode()
+        writer.write(
+            b"POST /telegram HTTP/1.1\r\nHost: localhost\r\n"
+            + f"X-Telegram-Bot-Api-Secret-Token: {secret}\r\n".encode("utf-8")
+            + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+            + payload
+        )
+        status = (await reader.readline()).split()[1]
+        writer.close()
+        return int(status)
+
+    async def run():
+        server = WebhookServer(FakeApplication(), "s3cret", host="127.0.0.1", port=0)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+
+        statuses = [
+            await post(port, {"update_id": 1}, "wrong"),
+            await post(port, {"update_id": 2}, "s3cret"),
+            await post(port, {"update_id": 3}, "sëcret"),
+            await post(port, {}, "s3cret"),
+            await post(port, [1, 2], "s3cret"),
+        ]
+        await server.stop()
+        return statuses
+
+    assert asyncio.run(run()) == [403, 200, 403, 400, 400]
+    assert processed == [2]
+
+    try:
+        WebhookServer(FakeApplication(), None)
+        assert False, "expected a missing secret to be refused"
+    except WebhookServerError:
+        pass
+
+
+def test_webhook_server_slow_chats_do_not_block_others():
+    """Updates are dispatched, not awaited, so slow chats hold up no one else"""
+    import asyncio
+    import json
+
+    from src.utils.update_processor import PerChatUpdateProcessor
+    from src.utils.webhook_server import WebhookServer
+
+    release = None
+    processed = []
+
+    class FakeApplication:
+        bot = None
+        update_processor = PerChatUpdateProcessor(64)
+
+        async def process_update(self, update):
+            if update.effective_chat.id != 99:
+                await release.wait()
+            processed.append(update.effective_chat.id)
+
+    async def post(port, update_id, chat_id):
+        body = {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "text": "hi",
+            },
+        }
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        payload = json.dumps(body).encode()
+        writer.write(
+            b"POST /telegram HTTP/1.1\r\nHost: localhost\r\n"
+            + b"X-Telegram-Bot-Api-Secret-Token: s3cret\r\n"
+            + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+            + payload
+        )
+        await reader.readline()
+        writer.close()
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        server = WebhookServer(FakeApplication(), "s3cret", host="127.0.0.1", port=0)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+
+        # More slow chats than there used to be workers
+        for chat_id in range(1, 21):
+            await post(port, chat_id, chat_id)
+        await post(port, 21, 99)
+        for _ in range(50):
+            if processed:
+                break
+            await asyncio.sleep(0.01)
+        fast_first = processed == [99]
+
+        release.set()
+        await server.stop()
+        return fast_first
+
+    assert asyncio.run(run())
+    assert len(processed) == 21
+
+
+def test_per_chat_update_processor():
+    """Chats run concurrently up to the cap, each chat strictly in order"""
+    import asyncio
+    from telegram import Chat, Message, Update
+    from src.utils.update_processor import PerChatUpdateProcessor
+
+    order = []
+    running = {"now": 0, "peak": 0}
+
+    def make_update(update_id, chat_id):
+        message = Message(update_id, None, Chat(chat_id, Chat.PRIVATE))
+        return Update(update_id, message=message)
+
+    async def handle(update, delay):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(delay)
+        order.append((update.effective_chat.id, update.update_id))
+        running["now"] -= 1
+
+    async def run():
+        processor = PerChatUpdateProcessor(max_concurrent_updates=2)
+        # Chat 1's first update is the slowest, but must still finish first
+        jobs = [(1, 1, 0.05), (2, 1, 0.0), (3, 2, 0.01), (4, 3, 0.01), (5, 3, 0.0)]
+        await asyncio.gather(
+            *(
+                processor.process_update(
+                    make_update(update_id, chat_id),
+                    handle(make_update(update_id, chat_id), delay),
+                )
+                for update_id, chat_id, delay in jobs
+            )
+        )
+        return processor
+
+    processor = asyncio.run(run())
+    assert [u for c, u in order if c == 1] == [1, 2]
+    assert [u for c, u in order if c == 3] == [4, 5]
+    # Chat 2 did not wait for chat 1's slow update
+    assert order.index((2, 3)) < order.index((1, 1))
+    assert running["peak"] == 2
+    assert processor.busy_chats == 0
+
+
+def test_ai_summary_shared_and_timeout():
+    """Concurrent requests share one pipeline run; slow runs time out"""
+    import asyncio
+    import time
+    from src.utils.ai_summary import AISummaryService
+
+    calls = []
+
+    class FakeService(AISummaryService):
+        def _run_pipeline(self, link):
+            calls.append(link)
+            time.sleep(0.2 if "slow" in link else 0.01)
+            return f"summary of {link}"
+
+    async def run():
+        service = FakeService(None, None, timeout=0.1)
+        article = {"id": "a1", "link": "https://example.com/a1"}
+        shared = await asyncio.gather(*(service.summarize(article) for _ in range(5)))
+        slow = await service.summarize({"id": "s", "link": "https://example.com/slow"})
+        # The slow run keeps going and caches its result for the next caller
+        await asyncio.sleep(0.2)
+        cached = await service.summarize({"id": "s", "link": "unused"})
+        return shared, slow, cached
+
+    shared, slow, cached = asyncio.run(run())
+    assert shared == ["summary of https://example.com/a1"] * 5
+    assert slow is None
+    assert cached == "summary of https://example.com/slow"
+    assert calls == ["https://example.com/a1", "https://example.com/slow"]
+
+
+def test_digest_dispatch_groups_feed_reads():
+    """Each (source, category, hour) group is fetched once and fanned out"""
+    import asyncio
+    import tempfile
+    from src.subscription.subscription_manager import SubscriptionManager
+    from src.utils.article_renderer import ArticleRenderCache
+    from src.utils.message_scheduler import MessageScheduler
+    from src.utils.notifications import DigestDispatcher, DigestStore
+
+    tmp = tempfile.mkdtemp()
+    manager = SubscriptionManager(f"{tmp}/subs.json", flush_interval=0)
+    store = DigestStore(f"{tmp}/digests.json")
+    for user_id in range(1, 51):
+        store.subscribe(user_id, user_id, "bbc", "world", 8)
+    store.subscribe(51, 51, "guardian", "general", 8)
+    store.subscribe(52, 52, "bbc", "world", 9)
+    # Free users lose premium-only feeds at delivery time
+    store.subscribe(53, 53, "wired", "general", 8)
+
+    fetches = []
+    sent = {}
+
+    class FakeFetcher:
+        def fetch_news_articles(self, source, category, max_articles=5):
+            fetches.append((source, category))
+            return [{"id": source, "title": source, "summary": "", "link": "l"}]
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            sent[chat_id] = text
+
+    async def run():
+        scheduler = MessageScheduler(global_rate=1000, chat_rate=1000)
+        dispatcher = DigestDispatcher(
+            store, manager, FakeFetcher(), ArticleRenderCache(), scheduler
+        )
+        dispatcher.bot = FakeBot()
+        stats = await dispatcher.dispatch(8)
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(run())
+    assert sorted(fetches) == [("bbc", "world"), ("guardian", "general")]
+    assert stats == {"groups": 3, "delivered": 51, "failed": 0}
+    assert 52 not in sent and 53 not in sent
+    assert "BBC - world digest" in sent[1]
+    # Checking tiers created no user records for the subscribers
+    assert manager.subscriptions == {}
+
+    # Subscriptions survive a restart via the journal
+    store.close()
+    assert DigestStore(f"{tmp}/digests.json").get_user_digests(52) == [
+        ("bbc", "world", 9)
+    ]
+
+
+def test_aho_corasick_incremental():
+    """Keywords added or removed later match like a freshly built automaton"""
+    from src.utils.aho_corasick import AhoCorasick
+
+    automaton = AhoCorasick(["he", "she", "hers", "ai"])
+    text = "ushers said she likes ai"
+    assert sorted(automaton.search(text, whole_words=False)) == [
+        (1, "she"),
+        (2, "he"),
+        (2, "hers"),
+        (8, "ai"),
+        (12, "she"),
+        (13, "he"),
+        (22, "ai"),
+    ]
+    # Whole words only: "ai" no longer matches inside "said"
+    assert sorted(automaton.search(text)) == [(12, "she"), (22, "ai")]
+
+    automaton.remove("she")
+    automaton.add("likes")
+    assert sorted(automaton.search(text)) == [(16, "likes"), (22, "ai")]
+
+
+def test_keyword_alerts_queue_per_user():
+    """New articles are matched once and queued as one message per user"""
+    from src.source.newsSourceFetcher import FeedDelta
+    import asyncio
+    import tempfile
+    from src.subscription.subscription_manager import SubscriptionManager
+    from src.utils.article_renderer import ArticleRenderCache
+    from src.utils.message_scheduler import MessageScheduler
+    from src.utils.notifications import AlertStore, KeywordAlertEngine
+
+    tmp = tempfile.mkdtemp()
+    manager = SubscriptionManager(f"{tmp}/subs.json", flush_interval=0)
+    store = AlertStore(f"{tmp}/alerts.json")
+    store.add(1, 1, "Bitcoin")
+    store.add(1, 1, "ETF")
+    store.add(2, 2, "bitcoin")
+    store.add(3, 3, "ai")
+
+    articles = [
+        {"id": "a", "title": "Bitcoin ETF approved", "summary": "", "link": "l"},
+        {"id": "b", "title": "He said nothing", "summary": "", "link": "l"},
+        {"id": "c", "title": "New AI model", "summary": "", "link": "l"},
+    ]
+    sent = {}
+
+    class FakeBot:
+        async def send_message(self, chat_id, text, **kwargs):
+            sent[chat_id] = text
+
+    engine = KeywordAlertEngine(
+        store, manager, ArticleRenderCache(), MessageScheduler(1000, 1000)
+    )
+    engine.bot = FakeBot()
+    engine.ingest(FeedDelta("bbc", "general", new=articles))
+    # An article already matched from another feed does not alert again
+    engine.ingest(FeedDelta("bbc", "world", new=articles[:1]))
+    # Nor does the backlog of a feed read for the first time
+    engine.ingest(
+        FeedDelta("bbc", "tech", new=[dict(articles[0], id="e")], initial=True)
+    )
+    # Free users only get alerts from sources their tier includes
+    engine.ingest(FeedDelta("wired", "general", new=[dict(articles[2], id="d")]))
+
+    async def run():
+        delivered = await engine.flush()
+        await engine.message_scheduler.stop()
+        return delivered
+
+    assert asyncio.run(run()) == 3
+    assert "bitcoin, etf" in sent[1] and sent[1].count("Read more") == 1
+    assert "BBC" in sent[3] and "WIRED" not in sent[3]
+
+    store.remove(3)
+    assert "ai" not in store.automaton
+
+
+def test_article_index_search():
+    """Queries intersect words, prefix-match the last one and obey tiers"""
+    from src.source.newsSourceFetcher import FeedDelta
+    from src.utils.article_index import ArticleIndex, QueryCache
+
+    index = ArticleIndex(max_articles=4)
+    index.ingest(
+        FeedDelta(
+            "bbc",
+            "general",
+            new=[
+                {
+                    "id": "b1",
+                    "title": "Bitcoin hits record",
+                    "summary": "<b>Markets</b>",
+                },
+                {"id": "b2", "title": "Election results", "summary": "Bitcoin mention"},
+            ],
+        )
+    )
+    index.ingest(
+        FeedDelta(
+            "wired",
+            "security",
+            new=[{"id": "w1", "title": "Bitcoin wallets hacked", "summary": ""}],
+        )
+    )
+
+    assert [a["id"] for a in index.search("bitco")] == ["w1", "b1", "b2"]
+    assert [a["id"] for a in index.search("bitcoin markets")] == ["b1"]
+    assert [a["id"] for a in index.search("bitcoin", sources=["bbc"])] == ["b1", "b2"]
+    assert index.search("bitcoin", categories=["world"]) == []
+    assert [a["id"] for a in index.search("", limit=1)] == ["w1"]
+
+    # An edited article is re-indexed under its new words
+    edited = {"id": "b2", "title": "Election delayed", "summary": ""}
+    index.ingest(FeedDelta("bbc", "general", changed=[edited]))
+    assert [a["id"] for a in index.search("bitcoin")] == ["w1", "b1"]
+    assert [a["id"] for a in index.search("delayed")] == ["b2"]
+
+    # The oldest article is evicted once the index is full
+    version = index.version
+    news = [{"id": f"n{i}", "title": "News"} for i in range(2)]
+    index.ingest(FeedDelta("bbc", "world", new=news))
+    assert index.version > version
+    assert len(index) == 4 and index.search("hits") == []
+
+    cache = QueryCache(ttl=60)
+    cache.put((index.version, "free", "news"), ["n0"])
+    assert cache.get((index.version, "free", "news")) == ["n0"]
+    assert cache.get((index.version + 1, "free", "news")) is None
+
+
+def test_near_duplicates_collapse():
+    """Reworded copies of a story cluster; unrelated stories stay apart"""
+    from src.source.newsSourceFetcher import FeedDelta
+    from src.utils.dedup import NearDuplicateIndex, minhash, similarity
+
+    story = (
+        "Central bank raises interest rates by half a point to fight inflation, "
+        "the biggest increase in two decades, officials said on Wednesday"
+    )
+    copy = story.replace("Central bank", "Fed") + " in a statement"
+    other = "Local football club wins the league after dramatic final day victory"
+
+    assert similarity(minhash(story), minhash(copy)) > 0.6
+    assert similarity(minhash(story), minhash(other)) < 0.2
+    assert minhash("Too short") is None
+
+    index = NearDuplicateIndex()
+    index.ingest(
+        FeedDelta("bbc", "general", new=[{"id": "b1", "title": story, "link": "b"}])
+    )
+    index.ingest(
+        FeedDelta(
+            "guardian",
+            "general",
+            new=[
+                {"id": "g1", "title": copy, "link": "g"},
+                {"id": "g2", "title": other, "link": "g2"},
+            ],
+        )
+    )
+
+    collapsed = index.collapse(
+        [
+            ("bbc", {"id": "b1"}),
+            ("guardian", {"id": "g1"}),
+            ("guardian", {"id": "g2"}),
+        ]
+    )
+    assert [(source, a["id"]) for source, a, _ in collapsed] == [
+        ("bbc", "b1"),
+        ("guardian", "g2"),
+    ]
+    assert [(source, a["id"]) for source, a in collapsed[0][2]] == [("guardian", "g1")]
+    assert collapsed[1][2] == []
+
+
+def test_feed_timeline_top_k_merge():
+    """Top stories come newest first across feeds, each article once"""
+    from src.source.newsSourceFetcher import FeedDelta
+    from src.utils.top_stories import FeedTimeline
+
+    timeline = FeedTimeline()
+    timeline.ingest(
+        FeedDelta(
+            "bbc",
+            "general",
+            new=[{"id": f"b{t}", "published_ts": t} for t in (10, 40, 70, 80)],
+        )
+    )
+    # Articles that dropped out of a feed leave the timeline
+    timeline.ingest(FeedDelta("bbc", "general", removed=["b80"]))
+    # The same story in two feeds of one source
+    timeline.ingest(
+        FeedDelta(
+            "bbc",
+            "world",
+            new=[{"id": "b70", "published_ts": 70}, {"id": "w5", "published_ts": 5}],
+        )
+    )
+    timeline.ingest(
+        FeedDelta(
+            "guardian",
+            "general",
+            new=[{"id": f"g{t}", "published_ts": t} for t in (20, 60, 30)],
+        )
+    )
+
+    top = timeline.top(4, timeline.feeds())
+    assert [article["id"] for _, article in top] == ["b70", "g60", "b40", "g30"]
+    assert top[1][0] == "guardian"
+
+    only_world = timeline.top(10, [("bbc", "world"), ("nytimes", "general")])
+    assert [article["id"] for _, article in only_world] == ["b70", "w5"]
+
+
+def test_feed_delta_by_guid():
+    """Only new, edited and dropped entries of a re-read feed are reported"""
+    from src.source.newsSourceFetcher import NewsSourceFetcher
+
+    def article(article_id, title):
+        return {
+            "id": article_id,
+            "title": title,
+            "summary": "",
+            "link": f"https://example.com/{article_id}",
+            "published": "",
+        }
+
+    fetcher = NewsSourceFetcher()
+    first = fetcher._compute_delta(
+        "bbc", "general", [article("a", "A"), article("b", "B")]
+    )
+    assert first.initial and [a["id"] for a in first.new] == ["a", "b"]
+
+    assert not fetcher._compute_delta(
+        "bbc", "general", [article("a", "A"), article("b", "B")]
+    )
+
+    delta = fetcher._compute_delta(
+        "bbc", "general", [article("c", "C"), article("a", "A, updated")]
+    )
+    assert not delta.initial
+    assert [a["id"] for a in delta.new] == ["c"]
+    assert [a["id"] for a in delta.changed] == ["a"]
+    assert delta.removed == ["b"]
+
+
+def test_feed_schedule_adapts_to_update_rate():
+    """Busy feeds are polled often, quiet ones back off, hints are honored"""
+    from src.source.newsSourceFetcher import FeedSchedule
+
+    schedule = FeedSchedule(min_interval=60, max_interval=3600)
+    # First poll: the gap is estimated from publish times, one every 10 min
+    published = [7600.0, 8200.0, 8800.0, 9400.0, 10000.0]
+    assert schedule.observe(10000.0, 5, published=published) == 600
+    # Six new items in ten minutes speed it up
+    assert schedule.observe(10600.0, 6) == 450
+    # Polls that find nothing back off once the feed is quieter than usual
+    assert schedule.observe(11050.0, 0) == 450
+    assert schedule.observe(11500.0, 0) == 900
+    assert schedule.observe(20000.0, 0) == 3600
+    # The feed's ttl wins over our own bounds
+    assert schedule.observe(23600.0, 0, ttl=7200.0) == 7200
+    assert not schedule.is_due(30000.0) and schedule.is_due(30800.0)
+
+
+def test_feed_poller_backs_off_unexpected_errors():
+    """A poll that blows up pushes the feed's next poll out, not to now"""
+    import asyncio
+    import time
+    from src.source.newsSourceFetcher import FeedSchedule
+    from src.utils.feed_poller import FeedPoller
+
+    class BrokenFetcher:
+        def __init__(self):
+            self.feed_schedule = FeedSchedule(min_interval=120)
+
+        def refresh_feed(self, url):
+            raise ValueError("bad entry")
+
+        def schedule(self, url):
+            return self.feed_schedule
+
+    async def run():
+        poller = FeedPoller(fetcher)
+        poller._semaphore = asyncio.Semaphore(1)
+        await poller._poll("https://example.com/rss")
+
+    fetcher = BrokenFetcher()
+    before = time.time()
+    asyncio.run(run())
+    assert fetcher.feed_schedule.interval == 240
+    assert fetcher.feed_schedule.next_poll >= before + 240
+
+
+def test_fetcher_serves_cache_and_shares_urls(monkeypatch):
+    """A URL shared by two categories is fetched once and then revalidated"""
+    import feedparser
+    from src.source import newsSourceFetcher
+
+    calls = []
+
+    def parse(url, etag=None, modified=None):
+        calls.append((url, etag))
+        if etag:
+            return feedparser.FeedParserDict(status=304, entries=[], feed={})
+        return feedparser.FeedParserDict(
+            status=200,
+            etag='"v1"',
+            headers={"Cache-Control": "public, max-age=300"},
+            feed=feedparser.FeedParserDict(ttl="10"),
+            entries=[{"id": "1", "title": "Story", "link": "https://a/1"}],
+        )
+
+    monkeypatch.setattr(newsSourceFetcher.feedparser, "parse", parse)
+    fetcher = newsSourceFetcher.NewsSourceFetcher()
+
+    general = fetcher.fetch_news_articles("aljazeera", "general")
+    news = fetcher.fetch_news_articles("aljazeera", "news")
+    assert len(calls) == 1 and general[0]["id"] == news[0]["id"]
+
+    url = calls[0][0]
+    assert fetcher.schedule(url).interval == 600
+    assert fetcher.refresh_feed(url) == 0
+    assert calls[1] == (url, '"v1"')
+    assert fetcher.fetch_news_articles("aljazeera", "news")[0]["title"] == "Story"
+
+
+def test_seen_articles_rotate_by_day():
+    """Sent articles are skipped per user until their day window rotates out"""
+    from src.utils.seen_filter import BloomFilter, SeenArticles
+
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"in{i}")
+    assert all(f"in{i}" in bloom for i in range(1000))
+    assert sum(f"out{i}" in bloom for i in range(10000)) < 300
+
+    seen = SeenArticles(capacity=1000, windows=2, window_seconds=100)
+    articles = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    seen.mark("1", ["a", "b"], now=0)
+    assert seen.unseen("1", articles) == [{"id": "c"}]
+    assert seen.unseen("2", articles) == articles
+
+    # Still remembered in the next window, forgotten in the one after
+    seen.mark("1", ["c"], now=150)
+    assert seen.unseen("1", articles) == []
+    seen.mark("1", [], now=250)
+    assert seen.unseen("1", articles) == [{"id": "a"}, {"id": "b"}]
+    assert seen.memory_bytes() == 2 * ((BloomFilter(1000).size + 7) // 8)
+
+
+def test_trending_terms_decay():
+    """Terms are ranked by decayed article counts, overall and per source"""
+    import time
+    from src.source.newsSourceFetcher import FeedDelta
+    from src.utils.trending import TrendingTerms, terms
+
+    assert terms("The <b>Election</b> results: election") == ["election", "results"]
+
+    now = time.time()
+    trending = TrendingTerms(half_life=3600, candidates=3)
+    fresh = [
+        {"id": f"e{i}", "title": "Election results", "published_ts": now}
+        for i in range(4)
+    ]
+    # Old news: twice the articles, but two half-lives ago
+    stale = [
+        {"id": f"s{i}", "title": "Storm warning", "published_ts": now - 7200}
+        for i in range(8)
+    ]
+    trending.ingest(FeedDelta("bbc", "general", new=fresh[:3] + stale))
+    trending.ingest(FeedDelta("guardian", "general", new=fresh[3:]))
+    # The same article from another feed of the source is not counted twice
+    trending.ingest(FeedDelta("bbc", "world", new=fresh[:1]))
+
+    top = trending.top(2)
+    assert [term for term, _ in top] == ["election", "results"]
+    assert round(top[0][1]) == 4
+    assert [term for term, _ in trending.top(1, "guardian")] == ["election"]
+    assert round(dict(trending.top(10, "bbc"))["storm"]) == 2
+    assert trending.top(5, "wired") == []
+
+
+def test_related_articles_cosine_top_k():
+    """Articles sharing rare words rank first; evicted rows are forgotten
+
+    Run with and without blocks being compacted on every ingest.
+    """
+    from src.source.newsSourceFetcher import FeedDelta
+    from src.utils.related import RelatedArticles
+
+    for max_blocks in (1, 32):
+        related = RelatedArticles(
+            n_features=1 << 12, max_articles=4, max_blocks=max_blocks
+        )
+        related.ingest(
+            FeedDelta(
+                "bbc",
+                "general",
+                new=[
+                    {"id": "a", "title": "Volcano erupts in Iceland, flights grounded"},
+                    {"id": "b", "title": "Football final draws record crowd"},
+                ],
+            )
+        )
+        related.ingest(
+            FeedDelta(
+                "guardian",
+                "general",
+                new=[
+                    {"id": "c", "title": "Iceland volcano eruption grounds flights"},
+                    {"id": "d", "title": "Iceland volcano: lava reaches town"},
+                ],
+            )
+        )
+
+        results = related.related("a", k=3)
+        assert [article["id"] for _, article, _ in results] == ["c", "d"]
+        assert results[0][0] == "guardian" and results[0][2] > results[1][2]
+        assert related.related("a", k=3, sources=["bbc"]) == []
+        assert related.related("c", k=3, categories=["world"]) == []
+
+        # A fifth article pushes out the oldest one
+        related.ingest(
+            FeedDelta("bbc", "world", new=[{"id": "e", "title": "Iceland flights"}])
+        )
+        assert "a" not in related and related.related("a") is None
+        assert [article["id"] for _, article, _ in related.related("e", k=1)] == ["c"]
+        assert related.related("c", k=3, categories=["world"])[0][1]["id"] == "e"
+
+
+def test_feed_server_stand_in():
+    """Benchmarks read the fixtures over local HTTP, failing on request"""
+    from benchmarks.feed_server import FeedServer
+    from benchmarks.run import local_fetcher
+    from src.source.newsSourceFetcher import NewsSourceFetcherError
+
+    with FeedServer() as server:
+        fetcher = local_fetcher(server)
+        articles = fetcher.fetch_news_articles("aljazeera", "news", max_articles=50)
+        assert len(articles) == 25 and articles[0]["published_ts"] > 0
+        # Shared with aljazeera/general, so served without another request
+        fetcher.fetch_news_articles("aljazeera", "general")
+        assert server.requests == 1
+
+    with FeedServer(failure_rate=1.0) as server:
+        try:
+            local_fetcher(server).fetch_news_articles("bbc", "general")
+            assert False, "expected the 503 to surface"
+        except NewsSourceFetcherError:
+            pass
+        assert server.failures == 1
+
+
+def test_load_harness_drives_handlers():
+    """Simulated users go through the real handlers against a fake Telegram"""
+    import json
+    import tempfile
+
+    from benchmarks.load import main
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "load.json")
+        argv = ["--users", "3", "--ramp-up", "0", "--think-time", "0"]
+        assert main(argv + ["--api-latency", "0", "--output", output]) == 0
+        with open(output) as f:
+            report = json.load(f)
+
+    overall = report["results"][0]
+    assert report["updates"] == 12 and overall["errors"] == 0
+    assert report["telegram_api"]["errors"] == 0
+    assert report["telegram_api"]["calls"]["answerCallbackQuery"] == 6
+    # The run leaves the real feed URLs alone for everything after it
+    from src.source.newsSourceFetcher import NewsSourceFetcher
+
+    assert "127.0.0.1" not in NewsSourceFetcher.RSS_FEEDS["bbc"]["general"]
+    assert "p99_ms" in report["event_loop_lag"]
+
+
+def test_free_session_fits_rate_limit():
+    """A free user's /news -> source -> category -> /search is never throttled"""
+    import json
+    import tempfile
+
+    from benchmarks.load import main
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "load.json")
+        argv = ["--users", "10", "--ramp-up", "0", "--think-time", "0"]
+        assert main(argv + ["--api-latency", "0", "--output", output]) == 0
+        with open(output) as f:
+            report = json.load(f)
+
+    assert report["updates"] == 40
+    assert report["telegram_api"]["rate_limited"] == 0
+    assert report["throttled_actions"] == []
+    assert all(result["rate_limited"] == 0 for result in report["results"])